@@ -0,0 +1,98 @@
+"""
+Benchmark of the aligners that group the merged lines onto segments, over dense synthetic timelines where the
+lines of every language overlap each other and segments grow long. The previous compat implementation rescanned
+every line of the segment for each new line, so it is kept as reference to show the quadratic growth.
+
+Run with:
+    python -m benchmarks.bench_aligner
+"""
+import argparse
+import time
+from argparse import Namespace
+
+from media_sub_splitter.segments import ALIGNERS, group_segments, merge_subtitle_lines
+
+from .synthetic import dense_subtitles
+
+
+def legacy_group_segments(sorted_lines):
+    # Previous implementation, kept as reference: the repeated sentence check walks the whole segment
+    segments = []
+    segment_start = sorted_lines[0].start - 1
+    segment_end = sorted_lines[0].end + 1
+    segment_sentences = {}
+    for line in sorted_lines:
+        ln = line.language
+        if not (segment_start < line.end and line.start < segment_end) or (
+            (segment_start < line.end and line.start < segment_end)
+            and abs(segment_end - line.start) < 500
+        ):
+            if "ja" in segment_sentences and (
+                "en" in segment_sentences or "es" in segment_sentences
+            ):
+                segments.append((segment_sentences, segment_start, segment_end))
+            segment_sentences = {ln: [line]}
+            segment_start = line.start
+            segment_end = line.end
+        else:
+            segment_sentences[ln] = segment_sentences.get(ln, [])
+            eq_match = False
+            for saved_line in segment_sentences[ln]:
+                if (
+                    saved_line.sentence == line.sentence
+                    and segment_sentences[ln][-1].end == line.start
+                ):
+                    eq_match = True
+            if not eq_match:
+                segment_sentences[ln].append(line)
+            segment_start = min(segment_start, line.start)
+            segment_end = max(segment_end, line.end)
+
+    return segments
+
+
+def time_grouping(group, sorted_lines, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        segments = group(sorted_lines)
+        best = min(best, time.perf_counter() - start)
+
+    return best, len(segments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[3000, 12000, 48000])
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=0.5,
+        help="Fraction of every line overlapped by the next one of the same language",
+    )
+    parser.add_argument(
+        "--legacy-max-size",
+        type=int,
+        default=12000,
+        help="Biggest size also measured with the quadratic legacy implementation",
+    )
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        sorted_lines = merge_subtitle_lines(
+            dense_subtitles(size, overlap=args.overlap), Namespace()
+        )
+        print(f"{size:>7} events:")
+        for aligner in ALIGNERS:
+            elapsed, segments = time_grouping(
+                lambda lines: group_segments(lines, aligner), sorted_lines
+            )
+            print(f"  {aligner:>8}: {elapsed * 1000:9.1f} ms  {segments} segments")
+
+        if size <= args.legacy_max_size:
+            elapsed, segments = time_grouping(legacy_group_segments, sorted_lines, 1)
+            print(f"  {'legacy':>8}: {elapsed * 1000:9.1f} ms  {segments} segments")
+
+
+if __name__ == "__main__":
+    main()
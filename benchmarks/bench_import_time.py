@@ -0,0 +1,105 @@
+"""
+Import time of media_sub_splitter.main, measured with `python -X importtime` on a fresh interpreter. Reports the
+total time and the slowest imported packages, and fails if any of the heavy dependencies that have to be loaded
+lazily is imported, or if the import takes longer than --max-ms.
+
+Run with:
+    python -m benchmarks.bench_import_time
+"""
+import argparse
+import subprocess
+import sys
+
+MODULE = "media_sub_splitter.main"
+
+# Dependencies only needed on some code paths, which must not be imported with the module
+LAZY_DEPENDENCIES = [
+    "moviepy",
+    "deepl",
+    "anilist",
+    "inquirer",
+    "guessit",
+    "langdetect",
+    "babelfish",
+    "ffmpeg",
+    "requests",
+    "PIL",
+    "numpy",
+    "asyncio",
+]
+
+
+def measure_import_time(module=MODULE):
+    """
+    Returns the cumulative import time in microseconds of the module and of every package it imports directly
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+
+        # Every nesting level adds two spaces after the separator space
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            packages[name.strip()] = int(cumulative)
+
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=None,
+        help="Fail if importing the module takes longer than this",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    packages = measure_import_time()
+    total_ms = packages[MODULE] / 1000
+    print(f"{MODULE}: {total_ms:.1f} ms")
+    slowest = sorted(packages.items(), key=lambda x: -x[1])
+    for name, cumulative in [p for p in slowest if p[0] != MODULE][: args.top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {MODULE}; print(' '.join(sorted(sys.modules)))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = set(result.stdout.split())
+    eager = [dependency for dependency in LAZY_DEPENDENCIES if dependency in imported]
+
+    failed = False
+    if eager:
+        print(f"Heavy dependencies imported eagerly: {', '.join(eager)}")
+        failed = True
+    if args.max_ms and total_ms > args.max_ms:
+        print(f"Import time over the limit of {args.max_ms} ms")
+        failed = True
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
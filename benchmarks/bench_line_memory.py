@@ -0,0 +1,76 @@
+"""
+Memory benchmark of the merged subtitle lines: the previous dict per line against the SubtitleLine namedtuple.
+
+Each variant runs on its own process, so the peak RSS of one doesn't hide the other. Besides the peak RSS of the
+process (which includes the parsed subtitle files), it reports the memory retained by the merged lines alone.
+
+Run with:
+    python -m benchmarks.bench_line_memory
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import tracemalloc
+from argparse import Namespace
+
+from media_sub_splitter.segments import merge_subtitle_lines
+
+from .bench_merge_lines import legacy_merge_subtitle_lines
+from .synthetic import synthetic_subtitles
+
+VARIANTS = {
+    "dict": legacy_merge_subtitle_lines,
+    "SubtitleLine": merge_subtitle_lines,
+}
+
+
+def measure(variant, size):
+    subtitles = synthetic_subtitles(size, duplicate_ratio=0)
+
+    tracemalloc.start()
+    lines = VARIANTS[variant](subtitles, Namespace())
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "variant": variant,
+        "lines": len(lines),
+        "retained_mb": retained / 1024**2,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=200000)
+    parser.add_argument("--variant", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(measure(args.variant, args.size)))
+        return
+
+    for variant in VARIANTS:
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.bench_line_memory",
+                "--size",
+                str(args.size),
+                "--variant",
+                variant,
+            ],
+            stderr=subprocess.DEVNULL,
+        )
+        result = json.loads(output)
+        print(
+            f"{result['variant']:>12}: {result['lines']} lines, "
+            f"{result['retained_mb']:7.1f} MB retained, {result['peak_rss_mb']:7.1f} MB peak RSS"
+        )
+
+
+if __name__ == "__main__":
+    main()
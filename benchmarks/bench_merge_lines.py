@@ -0,0 +1,93 @@
+"""
+Benchmark of the line merging front end of split_video_by_subtitles (collect, sort, id, filter empty lines and
+remove duplicates) over synthetic subtitles of increasing size.
+
+Run with:
+    python -m benchmarks.bench_merge_lines
+"""
+import argparse
+import time
+from argparse import Namespace
+
+from media_sub_splitter.normalize import process_subtitle_line
+from media_sub_splitter.segments import merge_subtitle_lines
+
+from .synthetic import synthetic_subtitles
+
+
+def legacy_merge_subtitle_lines(subtitles, args):
+    # Previous implementation, kept as reference: removing each duplicate is a linear scan
+    sorted_lines = []
+    for language, subs in subtitles.items():
+        for line in subs.data:
+            sentence = process_subtitle_line(line, args)
+            sorted_lines.append(
+                {
+                    "start": line.start,
+                    "end": line.end,
+                    "language": language,
+                    "sentence": sentence,
+                    "actor": line.name,
+                }
+            )
+
+    sorted_lines.sort(key=lambda x: x["start"])
+
+    for i, line in enumerate(sorted_lines):
+        line["sub_id"] = i
+        sorted_lines[i] = line
+
+    sorted_lines = list(filter(lambda x: x["sentence"], sorted_lines))
+
+    duplicates_set = set()
+    for line in list(sorted_lines):
+        line_hashkey = (line["start"], line["end"], line["language"], line["sentence"])
+
+        if line_hashkey not in duplicates_set:
+            duplicates_set.add(line_hashkey)
+        else:
+            sorted_lines.remove(line)
+
+    return sorted_lines
+
+
+def time_merge(merge, subtitles):
+    start = time.perf_counter()
+    merge(subtitles, Namespace())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[6250, 12500, 25000, 50000]
+    )
+    parser.add_argument(
+        "--legacy-max-size",
+        type=int,
+        default=12500,
+        help="Biggest size also measured with the quadratic legacy implementation",
+    )
+    args = parser.parse_args()
+
+    previous = None
+    for size in args.sizes:
+        subtitles = synthetic_subtitles(size)
+        elapsed = time_merge(merge_subtitle_lines, subtitles)
+
+        scaling = (
+            f"x{elapsed / previous[1]:.2f} time for x{size / previous[0]:.2f} events"
+            if previous
+            else ""
+        )
+        print(f"{size:>7} events: {elapsed * 1000:9.1f} ms  {scaling}")
+
+        if size <= args.legacy_max_size:
+            legacy_elapsed = time_merge(legacy_merge_subtitle_lines, subtitles)
+            print(f"{'':>7}  legacy: {legacy_elapsed * 1000:9.1f} ms")
+
+        previous = (size, elapsed)
+
+
+if __name__ == "__main__":
+    main()
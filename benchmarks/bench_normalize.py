@@ -0,0 +1,113 @@
+"""
+Micro-benchmark of process_subtitle_line over every subtitle event of the tests/input corpus, reporting lines per
+second for the first pass (empty cache) and for a second pass over the same lines (recurring lines cached).
+
+Run with:
+    python -m benchmarks.bench_normalize
+"""
+import argparse
+import os
+import re
+import time
+from argparse import Namespace
+
+import jaconvV2
+import pysubs2
+
+from media_sub_splitter.normalize import normalize_sentence, process_subtitle_line
+
+CORPUS_FOLDER = os.path.join(os.path.dirname(__file__), "..", "tests", "input")
+
+legacy_emoji = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"
+    "\U0001F300-\U0001F5FF"
+    "\U0001F680-\U0001F6FF"
+    "\U0001F1E0-\U0001F1FF"
+    "]+",
+    re.UNICODE,
+)
+
+
+def legacy_process_subtitle_line(line, args):
+    # Previous implementation, kept as reference: patterns as strings and no caching
+    if line.type != "Dialogue":
+        return ""
+
+    if line.name and re.search(r"sign|[_\-\s]?ed|op[_\-\s]?", line.name.lower()):
+        return ""
+
+    if line.style and re.search(r"top|sign|tipo tv|block|alt|cart", line.style.lower()):
+        return ""
+
+    if re.search(r"pos\(.*?\)|move\(.*?\)", line.text):
+        return ""
+
+    processed_sentence = jaconvV2.normalize(line.plaintext, "NFKC")
+    processed_sentence = re.sub("\r?\n|\t", " ", processed_sentence)
+
+    if hasattr(args, "extra_punctuation") and args.extra_punctuation:
+        processed_sentence = processed_sentence.replace("・", " ")
+
+    nb_rep = 1
+    while nb_rep:
+        (processed_sentence, nb_rep) = re.subn(
+            r"\([^\(\)（）\[\]\{\}《》【】]*\)|\[[^\(\)（）\[\]\{\}《》【】]*\]",
+            "",
+            processed_sentence,
+        )
+
+    special_chars = r"⚟|⚞|<|>|=|●|→|ー?♪ー?|\u202a|\u202c|➡|&lrm;"
+    processed_sentence = re.sub(special_chars, "", processed_sentence)
+    processed_sentence = legacy_emoji.sub("", processed_sentence)
+
+    return processed_sentence.strip()
+
+
+def load_corpus_lines():
+    lines = []
+    for root, _, files in os.walk(CORPUS_FOLDER):
+        for name in sorted(files):
+            if name.endswith(".ass") or name.endswith(".srt"):
+                lines += list(pysubs2.load(os.path.join(root, name)))
+
+    return lines
+
+
+def lines_per_second(process, lines, args):
+    start = time.perf_counter()
+    for line in lines:
+        process(line, args)
+
+    return len(lines) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-x", dest="extra_punctuation", action="store_true")
+    args = parser.parse_args()
+    process_args = Namespace(extra_punctuation=args.extra_punctuation)
+
+    lines = load_corpus_lines()
+    print(f"Corpus: {len(lines)} lines")
+
+    legacy = lines_per_second(legacy_process_subtitle_line, lines, process_args)
+    print(f"{'legacy':>14}: {legacy:12,.0f} lines/s")
+
+    normalize_sentence.cache_clear()
+    first_pass = lines_per_second(process_subtitle_line, lines, process_args)
+    print(f"{'cold cache':>14}: {first_pass:12,.0f} lines/s")
+
+    second_pass = lines_per_second(process_subtitle_line, lines, process_args)
+    print(f"{'warm cache':>14}: {second_pass:12,.0f} lines/s")
+
+    mismatches = sum(
+        process_subtitle_line(line, process_args)
+        != legacy_process_subtitle_line(line, process_args)
+        for line in lines
+    )
+    print(f"Lines different from the legacy implementation: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""
+Benchmark suite of the segmentation pipeline. Times every stage of split_video_by_subtitles separately over the
+tests/input corpus and over synthetic episodes of increasing size:
+
+  * load: parse the subtitle files with pysubs2
+  * process_lines: process_subtitle_line over every event, with empty caches
+  * merge: merge_subtitle_lines (sort, ids and dedupe). Lines are already normalized and cached by the previous
+    stage, so it mostly measures the merge itself
+  * group: group_segments
+  * join: join_sentences_to_segment for every language of every segment
+  * rows: generate_segment and the TSV writer, without media
+
+The media stage renders a few segments with every media engine and screenshot engine from a video generated with
+the ffmpeg lavfi test sources, and is skipped when ffmpeg is not installed. Results are saved as JSON, so runs of
+different commits can be compared with --compare.
+
+Run with:
+    python -m benchmarks
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from argparse import Namespace
+from collections import defaultdict
+from datetime import datetime
+
+import pysubs2
+
+from media_sub_splitter.audio import AUDIO_EXTENSIONS, audio_output
+from media_sub_splitter.main import EpisodeTsvRow, MatchingSubtitle, generate_segment
+from media_sub_splitter.media import MEDIA_ENGINES, SegmentMedia, create_renderer
+from media_sub_splitter.normalize import (
+    is_filtered_actor,
+    is_filtered_style,
+    join_sentences_to_segment,
+    normalize_sentence,
+    process_subtitle_line,
+)
+from media_sub_splitter.rows import SegmentRowWriter
+from media_sub_splitter.segments import (
+    SEGMENT_LANGUAGES,
+    group_segments,
+    merge_subtitle_lines,
+)
+
+from .synthetic import synthetic_subtitles
+
+CORPUS_FOLDER = os.path.join(os.path.dirname(__file__), "..", "tests", "input")
+
+STAGES = ["load", "process_lines", "merge", "group", "join", "rows"]
+
+# Length of the generated video and number of segments rendered from it
+MEDIA_DURATION = 60
+MEDIA_SEGMENTS = 20
+
+# Media options benchmarked, by name
+MEDIA_CONFIGURATIONS = {
+    **{media_engine: {"media_engine": media_engine} for media_engine in MEDIA_ENGINES},
+    "ffmpeg-single-pass": {
+        "media_engine": "ffmpeg",
+        "screenshot_engine": "single-pass",
+    },
+    "ffmpeg-pcm": {"media_engine": "ffmpeg", "audio_engine": "pcm"},
+    "ffmpeg-single-pass-pcm": {
+        "media_engine": "ffmpeg",
+        "screenshot_engine": "single-pass",
+        "audio_engine": "pcm",
+    },
+    "ffmpeg-keyframes": {
+        "media_engine": "ffmpeg",
+        "screenshot_engine": "single-pass",
+        "keyframe_screenshots": True,
+    },
+    "ffmpeg-aac": {"media_engine": "ffmpeg", "audio_format": "aac"},
+    "ffmpeg-copy": {"media_engine": "ffmpeg", "audio_format": "copy"},
+}
+
+
+def corpus_episodes():
+    """
+    Returns the subtitle files of every episode of the corpus, as {episode: {language: filepath}}
+    """
+    episodes = defaultdict(dict)
+    for root, _, files in os.walk(CORPUS_FOLDER):
+        for filename in sorted(files):
+            match = re.fullmatch(r"(.*)\.(\w\w)\.(ass|srt)", filename)
+            if match:
+                episodes[match.group(1)][match.group(2)] = os.path.join(root, filename)
+
+    return dict(sorted(episodes.items()))
+
+
+def time_stage(timings, stage, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    timings[stage] += time.perf_counter() - start
+    return result
+
+
+def run_pipeline(episodes, output_folder):
+    """
+    Runs every stage over the episodes, given as {episode: {language: callable returning the SSAFile}}. Returns the
+    accumulated time of each stage and the number of events and segments
+    """
+    timings = defaultdict(float)
+    args = Namespace()
+    normalize_sentence.cache_clear()
+    is_filtered_actor.cache_clear()
+    is_filtered_style.cache_clear()
+
+    events = 0
+    segments_count = 0
+    for episode, loaders in episodes.items():
+        subtitles = time_stage(
+            timings,
+            "load",
+            lambda: {
+                language: MatchingSubtitle(
+                    origin="external", filepath=language, data=load()
+                )
+                for language, load in loaders.items()
+            },
+        )
+        lines = [line for subs in subtitles.values() for line in subs.data]
+        events += len(lines)
+
+        time_stage(
+            timings,
+            "process_lines",
+            lambda: [process_subtitle_line(line, args) for line in lines],
+        )
+        sorted_lines = time_stage(
+            timings, "merge", merge_subtitle_lines, subtitles, args
+        )
+        segments = time_stage(timings, "group", group_segments, sorted_lines)
+        segments_count += len(segments)
+
+        time_stage(
+            timings,
+            "join",
+            lambda: [
+                join_sentences_to_segment(getattr(segment, language), language)
+                for segment in segments
+                for language in SEGMENT_LANGUAGES
+                if getattr(segment, language)
+            ],
+        )
+
+        def write_rows():
+            with SegmentRowWriter(
+                os.path.join(output_folder, "data.tsv"), EpisodeTsvRow._fields
+            ) as writer:
+                for segment in segments:
+                    generate_segment(
+                        segment,
+                        output_folder,
+                        None,
+                        {},
+                        writer,
+                        args,
+                    )
+
+        time_stage(timings, "rows", write_rows)
+
+    return timings, events, segments_count
+
+
+def benchmark_inputs(sizes, repeat, output_folder):
+    inputs = {
+        "corpus": {
+            episode: {
+                language: lambda filepath=filepath: pysubs2.load(filepath)
+                for language, filepath in languages.items()
+            }
+            for episode, languages in corpus_episodes().items()
+        }
+    }
+    for size in sizes:
+        serialized = {
+            language: subs.data.to_string("ass")
+            for language, subs in synthetic_subtitles(size).items()
+        }
+        inputs[f"synthetic-{size}"] = {
+            "synthetic": {
+                language: lambda text=text: pysubs2.SSAFile.from_string(text)
+                for language, text in serialized.items()
+            }
+        }
+
+    results = {}
+    for name, episodes in inputs.items():
+        best = {}
+        for _ in range(repeat):
+            timings, events, segments = run_pipeline(episodes, output_folder)
+            for stage in STAGES:
+                best[stage] = min(best.get(stage, float("inf")), timings[stage])
+
+        results[name] = {
+            "episodes": len(episodes),
+            "events": events,
+            "segments": segments,
+            "stages": best,
+        }
+        print(f"{name}: {events} events, {segments} segments")
+        for stage in STAGES:
+            print(f"  {stage:>14}: {best[stage] * 1000:9.1f} ms")
+
+    return results
+
+
+def benchmark_media(output_folder):
+    if not shutil.which("ffmpeg"):
+        print("media: skipped, ffmpeg not found")
+        return {"skipped": "ffmpeg not found"}
+
+    video_file = os.path.join(output_folder, "test.mkv")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=size=1280x720:rate=24:duration={MEDIA_DURATION}",
+            "-f",
+            "lavfi",
+            "-i",
+            f"sine=frequency=440:duration={MEDIA_DURATION}",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "ultrafast",
+            "-c:a",
+            "aac",
+            video_file,
+        ],
+        check=True,
+    )
+
+    results = {}
+    for name, media_args in MEDIA_CONFIGURATIONS.items():
+        media_folder = os.path.join(output_folder, name)
+        os.makedirs(media_folder)
+        # The audio of the benchmark video is aac
+        segment_audio = audio_output(media_args.get("audio_format", "mp3"), "aac")
+        renderer = create_renderer(
+            video_file,
+            Namespace(**media_args),
+            tmp_folder=output_folder,
+            audio_output=segment_audio,
+        )
+        step = MEDIA_DURATION / MEDIA_SEGMENTS
+        start = time.perf_counter()
+        for i in range(MEDIA_SEGMENTS):
+            renderer.render(
+                SegmentMedia(
+                    segment_id=i,
+                    start=i * step + 0.2,
+                    end=(i + 1) * step - 0.2,
+                    audio_filename=f"{i}.{AUDIO_EXTENSIONS[segment_audio.codec]}",
+                    screenshot_filename=f"{i}.webp",
+                    video_filename=f"{i}.mp4",
+                ),
+                media_folder,
+            )
+        renderer.close()
+        elapsed = time.perf_counter() - start
+
+        results[name] = {
+            "segments": MEDIA_SEGMENTS,
+            "seconds": elapsed,
+            "segments_per_second": MEDIA_SEGMENTS / elapsed,
+        }
+        print(
+            f"media ({name}): {MEDIA_SEGMENTS} segments in {elapsed:.2f}s "
+            f"({MEDIA_SEGMENTS / elapsed:.1f} segments/s)"
+        )
+
+    return results
+
+
+def compare(results, previous):
+    print(f"\nCompared with {previous.get('commit')} ({previous.get('created')}):")
+    for name, result in results["inputs"].items():
+        previous_result = previous.get("inputs", {}).get(name)
+        if not previous_result:
+            continue
+        for stage in STAGES:
+            if previous_result["stages"].get(stage):
+                ratio = result["stages"][stage] / previous_result["stages"][stage]
+                print(f"  {name} {stage:>14}: x{ratio:.2f}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Times every input is run, keeping the best time of each stage",
+    )
+    parser.add_argument(
+        "--media",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Also benchmark the media generation over a generated test video",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark-results.json",
+        help="Where to save the results",
+    )
+    parser.add_argument("--compare", help="Results of a previous run to compare with")
+    args = parser.parse_args()
+
+    # Segments without a translation are logged on INFO
+    logging.getLogger("media_sub_splitter").setLevel(logging.WARNING)
+
+    output_folder = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        results = {
+            "commit": git_commit(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "inputs": benchmark_inputs(args.sizes, args.repeat, output_folder),
+            "media": benchmark_media(output_folder) if args.media else None,
+        }
+    finally:
+        shutil.rmtree(output_folder, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved in {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(results, json.load(f))
@@ -0,0 +1,89 @@
+import random
+
+import pysubs2
+
+from media_sub_splitter.main import MatchingSubtitle
+
+SAMPLE_SENTENCES = {
+    "ja": ["こんにちは", "ありがとう", "行くぞ!", "何で...?", "そうだね", "待って!"],
+    "en": ["Hello.", "Thank you.", "Let's go!", "Why...?", "Right.", "Wait!"],
+    "es": ["Hola.", "Gracias.", "¡Vamos!", "¿Por qué...?", "Claro.", "¡Espera!"],
+}
+
+
+def synthetic_subtitles(n_events, duplicate_ratio=0.3, seed=0):
+    """
+    Generates `n_events` subtitle events spread over ja/en/es subtitles, mimicking an episode where a fraction of
+    the events are repeated (karaoke, signs or lines duplicated for several actors)
+    """
+    rng = random.Random(seed)
+    languages = list(SAMPLE_SENTENCES)
+    subtitles = {language: pysubs2.SSAFile() for language in languages}
+
+    start = 0
+    events_per_language = n_events // len(languages)
+    for i in range(events_per_language):
+        if i and rng.random() < duplicate_ratio:
+            # Repeat the previous events
+            for language in languages:
+                subtitles[language].append(subtitles[language][-1].copy())
+            continue
+
+        start += rng.randint(500, 4000)
+        end = start + rng.randint(800, 5000)
+        sentence_index = rng.randrange(len(SAMPLE_SENTENCES["ja"]))
+        for language in languages:
+            subtitles[language].append(
+                pysubs2.SSAEvent(
+                    start=start + rng.randint(-200, 200),
+                    end=end + rng.randint(-200, 200),
+                    text=f"{SAMPLE_SENTENCES[language][sentence_index]} {i}",
+                    name="Actor",
+                )
+            )
+
+    return {
+        language: MatchingSubtitle(
+            origin="external", filepath=f"synthetic.{language}.ass", data=data
+        )
+        for language, data in subtitles.items()
+    }
+
+
+def dense_subtitles(n_events, overlap=0.5, repeat_ratio=0.3, pause_ratio=0.05, seed=0):
+    """
+    Generates `n_events` subtitle events spread over ja/en/es subtitles with a dense timeline: lines of the same
+    language overlap each other, so segments keep growing until one of the few pauses, and a fraction of them repeat
+    the previous sentence right when it ends (several characters saying the same line)
+    """
+    rng = random.Random(seed)
+    languages = list(SAMPLE_SENTENCES)
+    subtitles = {language: pysubs2.SSAFile() for language in languages}
+
+    for language in languages:
+        start = 0
+        for i in range(n_events // len(languages)):
+            duration = rng.randint(800, 3000)
+            previous = subtitles[language][-1] if i else None
+            if previous and rng.random() < repeat_ratio:
+                event = previous.copy()
+                event.start, event.end = previous.end, previous.end + duration
+            else:
+                event = pysubs2.SSAEvent(
+                    start=start,
+                    end=start + duration,
+                    text=f"{rng.choice(SAMPLE_SENTENCES[language])} {i}",
+                    name="Actor",
+                )
+            subtitles[language].append(event)
+            if rng.random() < pause_ratio:
+                start = event.end + rng.randint(1000, 3000)
+            else:
+                start = event.start + int(duration * (1 - overlap))
+
+    return {
+        language: MatchingSubtitle(
+            origin="external", filepath=f"dense.{language}.ass", data=data
+        )
+        for language, data in subtitles.items()
+    }
@@ -0,0 +1,272 @@
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+# batch: every ffmpeg extraction call seeks and decodes the audio of its own batch of segments
+# pcm: the audio is decoded once for the whole episode and every segment is encoded from a slice of it
+AUDIO_ENGINES = ["batch", "pcm"]
+
+AUDIO_SAMPLE_RATE = 44100
+
+# The episode is decoded downmixed to stereo, as moviepy did, so 5.1 sources don't triple the size of its pcm
+AUDIO_CHANNELS = 2
+
+# mp3: every segment is encoded to mp3, and to aac again for its mp4. aac/opus: a single encode, muxed as is on the
+# mp4. copy: the packets of the source audio are cut without decoding, if the mp4 can hold its codec
+AUDIO_FORMATS = ["mp3", "aac", "opus", "copy"]
+
+AUDIO_ENCODERS = {"mp3": "libmp3lame", "aac": "aac", "opus": "libopus"}
+AUDIO_EXTENSIONS = {"mp3": "mp3", "aac": "m4a", "opus": "opus"}
+
+# Codec of the audio files of the segments, and whether they are cut from the source packets instead of encoded
+AudioOutput = namedtuple("AudioOutput", ["codec", "copy"])
+
+DEFAULT_AUDIO_OUTPUT = AudioOutput("mp3", copy=False)
+
+# Every segment is encoded by its own short ffmpeg call, fed from memory
+AUDIO_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class EpisodeAudio:
+    """
+    Audio of an episode decoded once to 16 bit PCM on a wav file, mapped in memory so every segment is a view of
+    the samples of its range. Memory use doesn't depend on the length of the episode, only the pages of the segments
+    being encoded are loaded
+
+    Example:
+        * with EpisodeAudio("episode.mkv", tmp_folder) as audio:
+        *     audio.encode(segment, output_path)
+    """
+
+    def __init__(
+        self,
+        video_file,
+        tmp_folder=None,
+        metrics=NULL_METRICS,
+        audio_output=DEFAULT_AUDIO_OUTPUT,
+    ):
+        self.video_file = video_file
+        self.metrics = metrics
+        self.audio_output = audio_output
+        self.folder = tempfile.mkdtemp(prefix="audio-", dir=tmp_folder)
+        self.samples = None
+        self.sample_rate = AUDIO_SAMPLE_RATE
+
+    def __enter__(self):
+        try:
+            self.decode()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def decode(self):
+        import numpy as np
+
+        wav_filepath = os.path.join(self.folder, "audio.wav")
+        with self.metrics.timer("audio_decode"):
+            result = subprocess.run(
+                [
+                    "ffmpeg",
+                    "-y",
+                    "-hide_banner",
+                    "-loglevel",
+                    "error",
+                    "-i",
+                    self.video_file,
+                    "-map",
+                    "0:a:0",
+                    "-vn",
+                    "-c:a",
+                    "pcm_s16le",
+                    "-ar",
+                    str(AUDIO_SAMPLE_RATE),
+                    "-ac",
+                    str(AUDIO_CHANNELS),
+                    "-rf64",
+                    "auto",
+                    wav_filepath,
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+        if result.returncode != 0:
+            raise Exception(
+                f"ffmpeg failed ({result.returncode}): {result.stderr[-2000:]}"
+            )
+
+        channels, self.sample_rate, data_offset, data_size = read_wav_header(
+            wav_filepath
+        )
+        # The data size of a wav written while streaming can be left unknown
+        data_size = min(data_size, os.path.getsize(wav_filepath) - data_offset)
+        self.samples = np.memmap(
+            wav_filepath,
+            dtype="<i2",
+            mode="r",
+            offset=data_offset,
+            shape=(data_size // (2 * channels), channels),
+        )
+
+    def segment_samples(self, segment):
+        start = max(round(segment.start * self.sample_rate), 0)
+        end = max(round(segment.end * self.sample_rate), start)
+        return self.samples[start:end]
+
+    def encode(self, segment, output_path):
+        """
+        Encodes the samples of the segment, piping them to ffmpeg. Returns whether the audio was generated
+        """
+        samples = self.segment_samples(segment)
+        audio_path = os.path.join(output_path, segment.audio_filename)
+        with self.metrics.timer("audio_encode"):
+            result = subprocess.run(
+                [
+                    "ffmpeg",
+                    "-y",
+                    "-hide_banner",
+                    "-loglevel",
+                    "error",
+                    "-f",
+                    "s16le",
+                    "-ar",
+                    str(self.sample_rate),
+                    "-ac",
+                    str(samples.shape[1]),
+                    "-i",
+                    "pipe:0",
+                    *audio_codec_options(self.audio_output),
+                    audio_path,
+                ],
+                input=samples.tobytes(),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        if result.returncode != 0:
+            logger.error(
+                f"Error creating audio '{audio_path}': {result.stderr.decode(errors='replace')[-2000:]}"
+            )
+            return False
+
+        return True
+
+    def close(self):
+        # The memmap has to be released before removing its file
+        self.samples = None
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+def extract_audio(
+    video_file,
+    batch,
+    tmp_folder=None,
+    workers=AUDIO_WORKERS,
+    metrics=NULL_METRICS,
+    audio_output=DEFAULT_AUDIO_OUTPUT,
+):
+    """
+    Writes the audio of every segment in the batch decoding the audio track of the episode a single time. Returns
+    the segments whose audio was generated
+    """
+    logger.info(f"Extracting {len(batch)} audios from '{video_file}'")
+    try:
+        with EpisodeAudio(video_file, tmp_folder, metrics, audio_output) as audio:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                encoded = list(
+                    executor.map(
+                        lambda request: audio.encode(*request),
+                        batch,
+                    )
+                )
+    except Exception:
+        logger.error(f"Error extracting audio from '{video_file}'", exc_info=True)
+        return []
+
+    audios = [request for request, ok in zip(batch, encoded) if ok]
+    metrics.add("audios_extracted", len(audios))
+    return audios
+
+
+def audio_output(audio_format="mp3", source_codec=None):
+    """
+    Returns the AudioOutput of the format. The copy format needs the codec of the source audio, and falls back to
+    a single aac encode when it is unknown or can't be muxed on the mp4
+
+    Example:
+        * audio_output("copy", "flac")
+        * Output: AudioOutput(codec="aac", copy=False)
+    """
+    if audio_format != "copy":
+        return AudioOutput(audio_format, copy=False)
+
+    if source_codec in AUDIO_ENCODERS:
+        return AudioOutput(source_codec, copy=True)
+
+    logger.info(f"Audio codec {source_codec} can't be copied, encoding it to aac")
+    return AudioOutput("aac", copy=False)
+
+
+def audio_codec_options(audio_output):
+    if audio_output.copy:
+        return ["-c:a", "copy"]
+
+    options = ["-c:a", AUDIO_ENCODERS[audio_output.codec]]
+    if audio_output.codec == "mp3":
+        options += ["-ar", str(AUDIO_SAMPLE_RATE)]
+    return options
+
+
+def probe_audio_codec(video_file):
+    """
+    Returns the codec of the first audio stream of the video, or None if it can't be probed
+    """
+    import ffmpeg
+
+    try:
+        audio_streams = ffmpeg.probe(video_file, select_streams="a:0")["streams"]
+    except Exception as err:
+        logger.warning(f"Could not probe the audio of '{video_file}': {err}")
+        return None
+
+    return audio_streams[0]["codec_name"] if audio_streams else None
+
+
+def read_wav_header(wav_filepath):
+    """
+    Returns the channels, sample rate, offset of the samples and their size in bytes of a PCM wav (or rf64) file
+    """
+    with open(wav_filepath, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff not in (b"RIFF", b"RF64") or wave != b"WAVE":
+            raise ValueError(f"Not a wav file: {wav_filepath}")
+
+        channels = sample_rate = data_size64 = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                raise ValueError(f"Missing data on wav file: {wav_filepath}")
+
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"data":
+                if chunk_size == 0xFFFFFFFF and data_size64 is not None:
+                    chunk_size = data_size64
+                return channels, sample_rate, f.tell(), chunk_size
+
+            chunk = f.read(chunk_size + chunk_size % 2)
+            if chunk_id == b"fmt ":
+                channels, sample_rate = struct.unpack("<HI", chunk[2:8])
+            elif chunk_id == b"ds64":
+                data_size64 = struct.unpack("<Q", chunk[8:16])[0]
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import os
+import pathlib
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from .manifest import MANIFEST_FILENAME, EpisodeManifest
+from .media import MP4_WORKERS, SegmentMedia, encode_mp4
+from .rows import read_rows
+from .scheduler import positive_int
+
+logger = logging.getLogger(__name__)
+
+# Number of encoded clips between progress messages
+PROGRESS_INTERVAL = 100
+
+
+def backfill(output_folder, workers=MP4_WORKERS, force=False):
+    """
+    Generates the mp4 of every segment found on the data.tsv files of an output folder from its screenshot and
+    audio. Clips whose mp4 is newer than its sources are skipped unless `force` is set. Returns the list of
+    (episode folder, segment) that failed or have no audio or screenshot
+    """
+    pending = []
+    skipped = 0
+    missing = []
+    for episode_folder, segment in find_segments(output_folder):
+        sources = [
+            os.path.join(episode_folder, segment.audio_filename),
+            os.path.join(episode_folder, segment.screenshot_filename),
+        ]
+        if not all(os.path.exists(source) for source in sources):
+            missing.append((episode_folder, segment))
+            continue
+
+        video_filepath = os.path.join(episode_folder, segment.video_filename)
+        if not force and is_up_to_date(video_filepath, sources):
+            skipped += 1
+            continue
+
+        pending.append((episode_folder, segment))
+
+    logger.info(
+        f"Found {len(pending)} clips to encode ({skipped} up to date, {len(missing)} without audio or screenshot)"
+    )
+    for episode_folder, segment in missing:
+        logger.warning(
+            f"> Missing audio or screenshot: {os.path.join(episode_folder, str(segment.segment_id))}"
+        )
+
+    manifests = {}
+    failed = []
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(encode_mp4, segment, episode_folder): (
+                episode_folder,
+                segment,
+            )
+            for episode_folder, segment in pending
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            episode_folder, segment = futures[future]
+            if future.result():
+                mark_rendered(manifests, episode_folder, segment)
+            else:
+                failed.append((episode_folder, segment))
+
+            if i % PROGRESS_INTERVAL == 0:
+                logger.info(
+                    f"Encoded {i}/{len(pending)} clips ({i / (time.perf_counter() - start_time):.1f} clips/s)"
+                )
+
+    for manifest in manifests.values():
+        manifest.flush()
+
+    elapsed = time.perf_counter() - start_time
+    logger.info(
+        f"Encoded {len(pending) - len(failed)} clips in {elapsed:.1f}s "
+        f"({len(pending) / elapsed if elapsed else 0:.1f} clips/s): "
+        f"{skipped} up to date, {len(missing)} without sources, {len(failed)} failed"
+    )
+    for episode_folder, segment in failed:
+        logger.info(f"> Failed: {os.path.join(episode_folder, segment.video_filename)}")
+
+    return failed + missing
+
+
+def find_segments(output_folder):
+    """
+    Yields (episode folder, SegmentMedia) for every row of every data.tsv under the output folder
+    """
+    for root, dirs, files in os.walk(output_folder):
+        dirs.sort()
+        if "data.tsv" not in files:
+            continue
+
+        for row in read_rows(os.path.join(root, "data.tsv")):
+            yield root, SegmentMedia(
+                segment_id=int(row["ID"]),
+                start=parse_timedelta(row["START_TIME"]).total_seconds(),
+                end=parse_timedelta(row["END_TIME"]).total_seconds(),
+                audio_filename=row["NAME_AUDIO"],
+                screenshot_filename=row["NAME_SCREENSHOT"],
+                video_filename=f"{row['ID']}.mp4",
+            )
+
+
+def parse_timedelta(value):
+    """
+    Parses back the str() of a timedelta, as written on data.tsv
+
+    Example:
+        * Input: 0:00:27.500000
+        * Output: timedelta(seconds=27, microseconds=500000)
+    """
+    hours, minutes, seconds = value.split(":")
+    return timedelta(hours=int(hours), minutes=int(minutes), seconds=float(seconds))
+
+
+def is_up_to_date(filepath, sources):
+    if not os.path.exists(filepath):
+        return False
+
+    return os.path.getmtime(filepath) >= max(map(os.path.getmtime, sources))
+
+
+def mark_rendered(manifests, episode_folder, segment):
+    # Keep the manifest of the episode in sync, so resumed runs don't render the clip again
+    manifest_filepath = os.path.join(episode_folder, MANIFEST_FILENAME)
+    if not os.path.exists(manifest_filepath):
+        return
+
+    if episode_folder not in manifests:
+        manifests[episode_folder] = EpisodeManifest(manifest_filepath)
+    manifests[episode_folder].mark_rendered(segment)
+
+
+def main(argv=None):
+    args = command_args(argv)
+    logging.getLogger("media_sub_splitter").setLevel(
+        logging.DEBUG if args.verbose else logging.INFO
+    )
+
+    failed = backfill(args.output, workers=args.workers, force=args.force)
+    if failed:
+        raise SystemExit(1)
+
+
+def command_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="media_sub_splitter backfill",
+        description="Generate the missing mp4 clips of an output folder from the audio and screenshot of every "
+        "segment",
+    )
+    parser.add_argument(
+        "output",
+        type=pathlib.Path,
+        help="Output folder",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        type=positive_int,
+        default=MP4_WORKERS,
+        help="Number of clips encoded at the same time",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        dest="force",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Encode every clip again, even if its mp4 is up to date",
+    )
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="verbose",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Add extra debug information to the execution",
+    )
+    return parser.parse_args(argv)
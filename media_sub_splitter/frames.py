@@ -0,0 +1,192 @@
+import logging
+import os
+import queue
+import re
+import subprocess
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .metrics import NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+# batch: every ffmpeg extraction call also cuts the screenshots of its segments with a trim filter
+# single-pass: the video is decoded once for the whole episode and the frames are encoded with Pillow
+SCREENSHOT_ENGINES = ["batch", "single-pass"]
+
+# Pillow releases the GIL while encoding, so the webp of several frames are encoded at the same time
+SCREENSHOT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Same default quality as the libwebp encoder of ffmpeg
+WEBP_QUALITY = 75
+
+SHOWINFO_REGEX = re.compile(r"\bpts_time:\s*(\S+).*?\bs:(\d+)x(\d+)")
+
+Frame = namedtuple("Frame", ["time", "size", "data"])
+
+
+def extract_screenshots(video_file, batch, keyframes=False, metrics=NULL_METRICS):
+    """
+    Writes the screenshot of every segment in the batch, taken on the middle of the dialog, decoding the video a
+    single time from start to end. ffmpeg only converts and pipes out the frames that are needed, and they are
+    encoded to webp on a pool of threads while the decoding goes on.
+
+    With keyframes, only the keyframes are decoded and every segment gets the keyframe closest to its middle, which
+    is much cheaper but can be a few seconds off.
+
+    Returns the segments whose screenshot was generated
+    """
+    from PIL import Image
+
+    pending = deque(
+        sorted(
+            [
+                # Rounded as on the ffmpeg select expression
+                (round((segment.start + segment.end) / 2, 3), segment, output_path)
+                for segment, output_path in batch
+            ],
+            key=lambda x: x[0],
+        )
+    )
+    logger.info(f"Extracting {len(pending)} screenshots from '{video_file}'")
+
+    def save(frame, segment, output_path):
+        screenshot_path = os.path.join(output_path, segment.screenshot_filename)
+        with metrics.timer("screenshot_encode"):
+            Image.frombytes("RGB", frame.size, frame.data).save(
+                screenshot_path, "WEBP", quality=WEBP_QUALITY
+            )
+        return segment, output_path
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=SCREENSHOT_WORKERS) as executor:
+
+        def submit(frame, request):
+            _, segment, output_path = request
+            # Bound the decoded frames waiting to be encoded
+            running = [future for future in futures if not future.done()]
+            if len(running) >= 2 * SCREENSHOT_WORKERS:
+                wait(running[:SCREENSHOT_WORKERS])
+            futures.append(executor.submit(save, frame, segment, output_path))
+
+        previous = None
+        for frame in read_frames(
+            video_file, [time for time, _, _ in pending], keyframes
+        ):
+            while pending and pending[0][0] <= frame.time:
+                request = pending.popleft()
+                midpoint = request[0]
+                if (
+                    keyframes
+                    and previous
+                    and midpoint - previous.time < (frame.time - midpoint)
+                ):
+                    submit(previous, request)
+                else:
+                    submit(frame, request)
+            previous = frame
+
+        # Dialogs after the last decoded frame
+        while pending and previous:
+            submit(previous, pending.popleft())
+
+    screenshots = []
+    for future in futures:
+        try:
+            screenshots.append(future.result())
+        except Exception:
+            logger.error("Error saving screenshot", exc_info=True)
+    metrics.add("screenshots_extracted", len(screenshots))
+
+    return screenshots
+
+
+def read_frames(video_file, times, keyframes=False):
+    """
+    Yields the decoded frames that hold the given times, in order. The timestamp and size of every frame are taken
+    from the showinfo filter, printed on stderr right before the frame is written to stdout
+    """
+    process = subprocess.Popen(
+        build_screenshots_command(video_file, times, keyframes),
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+
+    frame_infos = queue.Queue()
+    stderr_tail = deque(maxlen=20)
+
+    def read_stderr():
+        for line in process.stderr:
+            line = line.decode(errors="replace").rstrip()
+            match = SHOWINFO_REGEX.search(line)
+            if match:
+                frame_infos.put(
+                    (float(match.group(1)), (int(match.group(2)), int(match.group(3))))
+                )
+            elif "Parsed_showinfo" not in line:
+                stderr_tail.append(line)
+        frame_infos.put(None)
+
+    stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+    stderr_thread.start()
+
+    try:
+        while True:
+            frame_info = frame_infos.get()
+            if frame_info is None:
+                break
+
+            time, size = frame_info
+            data = process.stdout.read(size[0] * size[1] * 3)
+            if len(data) < size[0] * size[1] * 3:
+                break
+            yield Frame(time, size, data)
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        stderr_thread.join()
+
+    if returncode != 0:
+        stderr = "\n".join(stderr_tail)
+        logger.error(f"ffmpeg failed ({returncode}): {stderr[-2000:]}")
+
+
+def build_screenshots_command(video_file, times, keyframes=False):
+    """
+    Builds the ffmpeg call that decodes the video once and writes the needed frames as raw RGB to stdout. Every time
+    selects the first frame at or after it. With keyframes, every keyframe is written instead, since the closest one
+    can be before the requested time
+    """
+    if keyframes:
+        video_filter = "showinfo"
+    else:
+        # The first frame has no prev_pts, and a comparison against NAN is always false
+        select = "+".join(
+            f"lte({time:.3f},t)*not(lte({time:.3f},prev_pts*TB))"
+            for time in sorted(set(times))
+        )
+        video_filter = f"select='{select}',showinfo"
+
+    return [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        "-loglevel",
+        "info",
+        *(["-skip_frame", "nokey"] if keyframes else []),
+        "-i",
+        video_file,
+        "-map",
+        "0:v:0",
+        "-vf",
+        video_filter,
+        "-vsync",
+        "0",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "pipe:1",
+    ]
@@ -0,0 +1,237 @@
+import argparse
+import json
+import logging
+import os
+import pathlib
+import re
+import sqlite3
+from collections import namedtuple
+
+from .rows import read_rows
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.sqlite3"
+
+# Trigram tokens can't match shorter queries, those are searched with LIKE
+MIN_FTS_QUERY_LENGTH = 3
+
+SearchResult = namedtuple(
+    "SearchResult",
+    [
+        "show",
+        "season",
+        "episode",
+        "segment_id",
+        "start_time",
+        "end_time",
+        "content",
+        "content_spanish",
+        "content_english",
+    ],
+)
+
+
+class OutputIndex:
+    """
+    SQLite database with the segments of every show and episode of an output folder, keyed by
+    (show, season, episode, segment id). The japanese sentence and both translations are indexed with FTS5, using
+    trigrams so japanese text can be searched without a tokenizer
+    """
+
+    def __init__(self, filepath):
+        self.connection = sqlite3.connect(filepath, timeout=30)
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS shows (
+                show TEXT PRIMARY KEY,
+                anilist_id INTEGER,
+                japanese_name TEXT,
+                english_name TEXT,
+                romaji_name TEXT,
+                airing_format TEXT,
+                airing_status TEXT,
+                genres TEXT
+            );
+            CREATE TABLE IF NOT EXISTS segments (
+                show TEXT NOT NULL,
+                season INTEGER NOT NULL,
+                episode INTEGER NOT NULL,
+                segment_id INTEGER NOT NULL,
+                start_time TEXT,
+                end_time TEXT,
+                name_audio TEXT,
+                name_screenshot TEXT,
+                content TEXT,
+                content_spanish TEXT,
+                content_english TEXT,
+                content_spanish_mt TEXT,
+                content_english_mt TEXT,
+                PRIMARY KEY (show, season, episode, segment_id)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5 (
+                content, content_spanish, content_english, tokenize = 'trigram'
+            );
+            """
+        )
+
+    def update_episode(self, anime_folder_fullpath, season, episode, tsv_filepath):
+        """
+        Replaces the segments of an episode with the rows of its data.tsv, and the show with its info.json
+        """
+        show = os.path.basename(os.path.normpath(anime_folder_fullpath))
+        with open(
+            os.path.join(anime_folder_fullpath, "info.json"), encoding="utf-8"
+        ) as f:
+            info_json = json.load(f)
+
+        rows = [
+            (
+                show,
+                season,
+                episode,
+                int(row["ID"]),
+                row["START_TIME"],
+                row["END_TIME"],
+                row["NAME_AUDIO"],
+                row["NAME_SCREENSHOT"],
+                row["CONTENT"],
+                row["CONTENT_TRANSLATION_SPANISH"],
+                row["CONTENT_TRANSLATION_ENGLISH"],
+                row["CONTENT_SPANISH_MT"],
+                row["CONTENT_ENGLISH_MT"],
+            )
+            for row in read_rows(tsv_filepath)
+        ]
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO shows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    show,
+                    info_json.get("id"),
+                    info_json.get("japanese_name"),
+                    info_json.get("english_name"),
+                    info_json.get("romaji_name"),
+                    info_json.get("airing_format"),
+                    info_json.get("airing_status"),
+                    json.dumps(info_json.get("genres"), ensure_ascii=False),
+                ),
+            )
+            self.connection.execute(
+                "DELETE FROM segments_fts WHERE rowid IN "
+                "(SELECT rowid FROM segments WHERE show = ? AND season = ? AND episode = ?)",
+                (show, season, episode),
+            )
+            self.connection.execute(
+                "DELETE FROM segments WHERE show = ? AND season = ? AND episode = ?",
+                (show, season, episode),
+            )
+            self.connection.executemany(
+                "INSERT INTO segments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.connection.execute(
+                "INSERT INTO segments_fts (rowid, content, content_spanish, content_english) "
+                "SELECT rowid, content, content_spanish, content_english FROM segments "
+                "WHERE show = ? AND season = ? AND episode = ?",
+                (show, season, episode),
+            )
+
+        logger.info(
+            f"Indexed {len(rows)} segments of {show} S{season:02d}E{episode:02d}"
+        )
+
+    def search(self, query, limit=20):
+        columns = ", ".join(f"s.{field}" for field in SearchResult._fields)
+        if len(query) >= MIN_FTS_QUERY_LENGTH:
+            results = self.connection.execute(
+                f"SELECT {columns} FROM segments_fts f JOIN segments s ON s.rowid = f.rowid "
+                f"WHERE segments_fts MATCH ? ORDER BY f.rank LIMIT ?",
+                ('"' + query.replace('"', '""') + '"', limit),
+            )
+        else:
+            pattern = f"%{query}%"
+            results = self.connection.execute(
+                f"SELECT {columns} FROM segments s WHERE s.content LIKE ? "
+                f"OR s.content_spanish LIKE ? OR s.content_english LIKE ? LIMIT ?",
+                (pattern, pattern, pattern, limit),
+            )
+
+        return [SearchResult(*row) for row in results]
+
+    def rebuild(self, output_folder):
+        """
+        Indexes every episode of the output folder, for outputs generated before the index existed
+        """
+        for root, dirs, files in os.walk(output_folder):
+            dirs.sort()
+            episode_folder = pathlib.Path(root)
+            season_match = re.fullmatch(r"S(\d+)", episode_folder.parent.name)
+            episode_match = re.fullmatch(r"E(\d+)", episode_folder.name)
+            if "data.tsv" not in files or not season_match or not episode_match:
+                continue
+
+            self.update_episode(
+                episode_folder.parent.parent,
+                int(season_match.group(1)),
+                int(episode_match.group(1)),
+                os.path.join(root, "data.tsv"),
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+def main(argv=None):
+    args = command_args(argv)
+
+    index = OutputIndex(os.path.join(args.output, INDEX_FILENAME))
+    if args.rebuild:
+        index.rebuild(args.output)
+
+    if args.query:
+        for result in index.search(args.query, limit=args.limit):
+            print(
+                f"{result.show} S{result.season:02d}E{result.episode:02d} #{result.segment_id} "
+                f"[{result.start_time} - {result.end_time}]\n"
+                f"  JA: {result.content}\n"
+                f"  ES: {result.content_spanish}\n"
+                f"  EN: {result.content_english}"
+            )
+
+    index.close()
+
+
+def command_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="media_sub_splitter search",
+        description="Search the segments of an output folder by their japanese sentence or translations",
+    )
+    parser.add_argument(
+        "output",
+        type=pathlib.Path,
+        help="Output folder",
+    )
+    parser.add_argument(
+        "query",
+        type=str,
+        nargs="?",
+        help="Text to search",
+    )
+    parser.add_argument(
+        "-n",
+        "--limit",
+        dest="limit",
+        type=int,
+        default=20,
+        help="Maximum number of segments returned",
+    )
+    parser.add_argument(
+        "--rebuild",
+        dest="rebuild",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Index again every episode of the output folder before searching",
+    )
+    return parser.parse_args(argv)
@@ -1,7 +1,4 @@
-import concurrent
 import argparse
-import threading
-import csv
 import json
 import logging
 import os
@@ -10,45 +7,74 @@ import re
 import shutil
 import string
 import subprocess
+import sys
+import tempfile
 from collections import namedtuple
 from datetime import timedelta
-from pathlib import Path
-from multiprocessing.pool import ThreadPool as Pool
-
-import babelfish
-import deepl
-import ffmpeg
-import inquirer
-import jaconvV2
-import moviepy.editor as mp
+
 import pysubs2
-import requests
-from anilist import Client
-from langdetect import detect
 from dotenv import load_dotenv
-from guessit import guessit
 
-logging.getLogger("moviepy").setLevel(logging.ERROR)
+from .backfill import main as backfill_main
+from .index import INDEX_FILENAME, OutputIndex
+from .index import main as search_main
+from .manifest import (
+    MANIFEST_FILENAME,
+    EpisodeManifest,
+    episode_fingerprint,
+    media_fingerprint,
+)
+from .audio import (
+    AUDIO_ENGINES,
+    AUDIO_EXTENSIONS,
+    AUDIO_FORMATS,
+    audio_output,
+    probe_audio_codec,
+)
+from .frames import SCREENSHOT_ENGINES
+from .media import MEDIA_ENGINES, SegmentMedia, create_renderer
+from .metadata import ANILIST_CACHE_FILENAME, ANILIST_CACHE_TTL_DAYS, CachedAnilist
+from .metrics import NULL_METRICS, METRICS_FILENAME, MeteredTranslator, create_metrics
+from .normalize import join_sentences_to_segment
+from .rows import EXPORT_FORMATS, PendingRows, SegmentRowWriter
+from .scheduler import (
+    DEFAULT_WORKERS,
+    EXECUTORS,
+    EpisodePipeline,
+    EpisodeScheduler,
+    Finished,
+    PipelineStage,
+    positive_int,
+)
+from .segments import ALIGNERS, group_segments, merge_subtitle_lines
+from .subtitles import (
+    LANGUAGE_CACHE_FILENAME,
+    LANGUAGE_DETECTION_MODES,
+    SUPPORTED_LANGUAGES,
+    SubtitleIndex,
+)
+from .translation import (
+    TRANSLATION_MEMORY_FILENAME,
+    TRANSLATION_MEMORY_SIZE,
+    TRANSLATION_TARGETS,
+    CachedTranslator,
+    TranslationMemory,
+    translate_sentences,
+)
 
 logger = logging.getLogger(__name__)
-logger.propagate = 0
-if not logger.handlers:
+
+# Heavy dependencies (deepl, guessit, inquirer, moviepy...) are imported on the code paths
+# that use them, so dry runs, --help and the tests start fast
+
+# Configure the package logger so messages from every module share the same handler
+package_logger = logging.getLogger("media_sub_splitter")
+package_logger.propagate = 0
+if not package_logger.handlers:
     handler = logging.StreamHandler()
     formatter = logging.Formatter("%(asctime)-15s %(message)s")
     handler.setFormatter(formatter)
-    logger.addHandler(handler)
-
-emoji = re.compile(
-    "["
-    "\U0001F600-\U0001F64F"  # emoticons
-    "\U0001F300-\U0001F5FF"  # symbols & pictographs
-    "\U0001F680-\U0001F6FF"  # transport & map symbols
-    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
-    "]+",
-    re.UNICODE,
-)
-
-SUPPORTED_LANGUAGES = ["en", "ja", "es"]
+    package_logger.addHandler(handler)
 
 EpisodeTsvRow = namedtuple(
     "Row",
@@ -74,11 +100,44 @@ EpisodeTsvRow = namedtuple(
 
 MatchingSubtitle = namedtuple("MatchingSubtitle", ["origin", "data", "filepath"])
 
+# Result of a processed episode: its metrics (None when disabled) and the hits and misses of the translation memory
+EpisodeResult = namedtuple(
+    "EpisodeResult", ["metrics", "translation_memory_hits", "translation_memory_misses"]
+)
+
+# Episode being processed, passed along the processing stages
+EpisodeJob = namedtuple(
+    "EpisodeJob",
+    [
+        "plan",
+        "anime_folder_fullpath",
+        "output_path",
+        "tmp_folder",
+        "translator",
+        "args",
+        "manifest",
+        "fingerprint",
+        "metrics",
+    ],
+)
+
+# File extension for subtitle codecs whose ffmpeg name is not a valid extension
+SUBTITLE_CODEC_EXTENSIONS = {"subrip": "srt"}
+
+PLAN_FILENAME = "plan.json"
+PLAN_VERSION = 1
+
+# Commands that run instead of splitting episodes, as `media_sub_splitter <command> ...`
+SUBCOMMANDS = {"backfill": backfill_main, "search": search_main}
+
 
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] in SUBCOMMANDS:
+        return SUBCOMMANDS[sys.argv[1]](sys.argv[2:])
+
     load_dotenv()
     args = command_args()
-    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    package_logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
 
     deepl_token = os.getenv("TOKEN") or args.token
     if not deepl_token:
@@ -86,293 +145,316 @@ def main():
             " > IMPORTANT < DEEPL TOKEN has not been detected. Subtitles won't be translated to all supported languages"
         )
 
-    translator = deepl.Translator(deepl_token) if deepl_token else None
+    translator = None
+    if deepl_token:
+        import deepl
+
+        translator = deepl.Translator(deepl_token)
 
     # Input and output folders
     input_folder = args.input
     output_folder = args.output
 
-    episode_filepaths = sorted(
-        [
-            os.path.join(root, name)
-            for root, dirs, files in os.walk(input_folder)
-            for name in files
-            if name.endswith(".mkv")
-        ]
+    translation_memory = None
+    if translator and args.translation_memory:
+        os.makedirs(output_folder, exist_ok=True)
+        translation_memory = TranslationMemory(
+            os.path.join(output_folder, TRANSLATION_MEMORY_FILENAME),
+            max_entries=args.translation_memory_size,
+        )
+        if args.prune_translation_memory:
+            logger.info("Removing all the translations from the translation memory")
+            translation_memory.prune()
+
+        translator = CachedTranslator(translator, translation_memory)
+
+    run_metrics = create_metrics(args)
+
+    anilist = CachedAnilist(
+        cache_filepath=(
+            os.path.join(output_folder, ANILIST_CACHE_FILENAME)
+            if args.anilist_cache
+            else None
+        ),
+        ttl_days=args.anilist_cache_ttl,
+        seed_folder=output_folder,
     )
 
-    if not episode_filepaths:
-        logger.error(f"No .mkv files found in {input_folder}! Nothing else to do.")
-        return
+    if args.from_plan:
+        logger.info(f"Loading execution plan from {args.from_plan}")
+        episode_plans = read_plan(args.from_plan)
+    else:
+        episode_filepaths = sorted(
+            [
+                os.path.join(root, name)
+                for root, dirs, files in os.walk(input_folder)
+                for name in files
+                if name.endswith(".mkv")
+            ]
+        )
 
-    logger.info(f"Found {len(episode_filepaths)} files to process in {input_folder}...")
+        if not episode_filepaths:
+            logger.error(f"No .mkv files found in {input_folder}! Nothing else to do.")
+            return
 
-    anilist = CachedAnilist()
-    subtitles_dict_remembered = {}
+        logger.info(
+            f"Found {len(episode_filepaths)} files to process in {input_folder}..."
+        )
 
-    pool = Pool(6)
+        # All the questions are asked here, processing runs unattended afterwards
+        subtitle_index = SubtitleIndex(
+            language_detection=args.language_detection,
+            cache_filepath=os.path.join(output_folder, LANGUAGE_CACHE_FILENAME),
+        )
+        episode_plans = plan_episodes(
+            episode_filepaths, anilist, subtitle_index, metrics=run_metrics
+        )
+        subtitle_index.save()
 
-    for episode_filepath in episode_filepaths:
-        pool, subtitles_dict_remembered = extract_segments_from_episode(
-            pool,
-            episode_filepath,
-            output_folder,
-            translator,
-            anilist,
-            subtitles_dict_remembered,
-            args,
+        plan_filepath = args.plan or os.path.join(output_folder, PLAN_FILENAME)
+        write_plan(plan_filepath, episode_plans)
+        logger.info(f"Execution plan saved in {plan_filepath}\n")
+
+        if args.plan_only:
+            return
+
+    # Without --parallel episodes are processed inline
+    if args.parallel and args.executor == "async":
+        scheduler = EpisodePipeline(episode_pipeline_stages(args))
+    else:
+        scheduler = EpisodeScheduler(
+            workers=args.workers if args.parallel else 0,
+            executor=args.executor,
+            max_in_flight=args.max_in_flight,
         )
 
-    pool.close()
-    pool.join()
+    anime_folders = {}
+    for episode_plan in episode_plans:
+        try:
+            # Anime folders are created before queuing the episodes, so parallel episodes never write the same
+            # info.json
+            anilist_id = episode_plan["anilist_id"]
+            if anilist_id not in anime_folders:
+                with run_metrics.timer("anime_folder"):
+                    anime_folders[anilist_id] = create_anime_folder(
+                        anilist.get_anime_by_id(anilist_id), output_folder
+                    )
+        except Exception:
+            logger.error(
+                "Something happened processing the anime. Skipping...", exc_info=True
+            )
+            continue
 
+        episode_args = (episode_plan, anime_folders[anilist_id], translator, args)
+        if isinstance(scheduler, EpisodePipeline):
+            scheduler.submit(episode_plan["episode_filepath"], *episode_args)
+        else:
+            scheduler.submit(
+                episode_plan["episode_filepath"], process_episode, *episode_args
+            )
 
-def extract_segments_from_episode(
-    pool,
-    episode_filepath,
-    output_folder,
-    translator,
-    anilist,
-    subtitles_dict_remembered,
-    args,
+    failed_episodes = scheduler.close()
+
+    if translation_memory:
+        # Episodes count their own hits and misses, the ones of other processes never reach this one
+        hits = sum(result.translation_memory_hits for _, result in scheduler.completed)
+        misses = sum(
+            result.translation_memory_misses for _, result in scheduler.completed
+        )
+        logger.info(f"Translation memory: {hits} hits, {misses} misses")
+
+    if run_metrics.enabled:
+        for _, result in scheduler.completed:
+            if result.metrics:
+                run_metrics.update(result.metrics)
+        run_metrics.add("episodes_processed", len(scheduler.completed))
+        run_metrics.add("episodes_failed", len(failed_episodes))
+
+        if args.metrics:
+            run_metrics.write_json(os.path.join(output_folder, METRICS_FILENAME))
+        if args.metrics_prometheus:
+            run_metrics.write_prometheus(args.metrics_prometheus)
+
+    if failed_episodes:
+        raise SystemExit(1)
+
+
+def plan_episodes(
+    episode_filepaths, anilist, subtitle_index=None, metrics=NULL_METRICS
 ):
-    try:
-        logger.info(f"Filepath: {episode_filepath}\n")
+    """
+    Discovery phase: finds the anime, external subtitles and subtitle streams of every episode, asking the user
+    when needed. Returns one plan per episode with everything needed to process it without further questions
+    """
+    if subtitle_index is None:
+        subtitle_index = SubtitleIndex()
 
-        # Guessit
-        guessit_query = extract_anime_title_for_guessit(episode_filepath)
-        logger.info(f"> Query for Guessit: {guessit_query}")
-        episode_info = guessit(guessit_query)
+    # Pre-pass: guess the title of every episode and resolve each distinct title only once
+    episode_infos = {}
+    for episode_filepath in episode_filepaths:
+        try:
+            with metrics.timer("guessit"):
+                episode_infos[episode_filepath] = guess_episode_info(episode_filepath)
+        except Exception:
+            logger.error(
+                f"Could not guess the episode information of {episode_filepath}. Skipping...",
+                exc_info=True,
+            )
 
-        guessed_anime_title = episode_info["title"]
-        season_number_pretty = f"S{episode_info['season']:02d}"
-        episode_number_pretty = f"E{episode_info['episode']:02d}"
-        logger.info(
-            f"Guessed information: {guessed_anime_title} {season_number_pretty}{episode_number_pretty}\n"
+    with metrics.timer("anilist"):
+        animes = anilist.get_anime_many(
+            [anilist_query for _, anilist_query in episode_infos.values()]
         )
 
-        # Anilist
-        anilist_query = extract_anime_title_for_anilist(guessed_anime_title)
-        logger.info(f"Query for Anilist: {anilist_query}")
-        anime_info = anilist.get_anime(anilist_query)
-        name_romaji = anime_info.title.romaji
-        logger.info(f"Anime found: {name_romaji}\n")
-
-        # Create folder for saving info.json and segments
-        anime_folder_name = map_anime_title_to_media_folder(name_romaji)
-        anime_folder_fullpath = os.path.join(output_folder, anime_folder_name)
-        os.makedirs(anime_folder_fullpath, exist_ok=True)
-        logger.info(f"> Base anime folder: {anime_folder_fullpath}")
-
-        info_json_fullpath = os.path.join(anime_folder_fullpath, "info.json")
-        logger.info(f"Filepath for info.json: {info_json_fullpath}\n")
-
-        if not os.path.exists(info_json_fullpath):
-            logger.info("Creating new info.json file...")
-
-            with open(info_json_fullpath, "wb") as f:
-                info_json = {
-                    "id": anime_info.id,
-                    "version": "4",
-                    "folder_media_anime": anime_folder_name,
-                    "japanese_name": anime_info.title.native,
-                    "english_name": anime_info.title.english,
-                    "romaji_name": anime_info.title.romaji,
-                    "airing_format": anime_info.format,
-                    "airing_status": anime_info.status,
-                    "genres": anime_info.genres,
-                }
+    episode_plans = []
+    subtitles_dict_remembered = {}
+    for episode_filepath, (episode_info, anilist_query) in episode_infos.items():
+        if anilist_query not in animes:
+            logger.error(f"No anime found for {episode_filepath}. Skipping...")
+            continue
 
-                if "cover" not in info_json:
-                    cover_data = requests.get(anime_info.cover.extra_large).content
-                    cover_filename = (
-                        f"cover{os.path.splitext(anime_info.cover.extra_large)[1]}"
-                    )
-                    with open(
-                        os.path.join(anime_folder_fullpath, cover_filename), "wb"
-                    ) as handler:
-                        handler.write(cover_data)
-                    info_json["cover"] = os.path.join(anime_folder_name, cover_filename)
-
-                if "banner" not in info_json:
-                    banner_data = requests.get(anime_info.banner).content
-                    banner_filename = (
-                        f"banner{os.path.splitext(anime_info.cover.extra_large)[1]}"
-                    )
-                    with open(
-                        os.path.join(anime_folder_fullpath, banner_filename), "wb"
-                    ) as handler:
-                        handler.write(banner_data)
-                    info_json["banner"] = os.path.join(
-                        anime_folder_name, banner_filename
-                    )
+        try:
+            episode_plan, subtitles_dict_remembered = plan_episode(
+                episode_filepath,
+                episode_info,
+                animes[anilist_query],
+                subtitles_dict_remembered,
+                subtitle_index,
+                metrics,
+            )
+            episode_plans.append(episode_plan)
+        except Exception:
+            logger.error(
+                "Something happened planning the episode. Skipping...", exc_info=True
+            )
 
-                logger.info(f"Json Data: {info_json}\n")
+    return episode_plans
 
-                # Use utf8 for writing Japanese characters correctly
-                json_data = json.dumps(info_json, indent=2, ensure_ascii=False).encode(
-                    "utf8"
-                )
-                f.write(json_data)
-
-        # Get subtitles
-        logger.info("> Finding matching subtitles...")
-        matching_subtitles = {}
-
-        # Part 1: Find subtitle files on same directory as episode, with same episode number
-        input_episode_parent_folder = Path(episode_filepath).parent
-        subtitle_filepaths = [
-            os.path.join(input_episode_parent_folder, filename)
-            for filename in os.listdir(input_episode_parent_folder)
-            if filename.endswith(".ass") or filename.endswith(".srt")
-        ]
-        logger.debug(f"Subtitle filepaths: {subtitle_filepaths}")
 
-        for subtitle_filepath in subtitle_filepaths:
-            subtitle_filename = re.sub(
-                r"\[.*?\]|\(.*?\)", "", os.path.basename(subtitle_filepath)
-            )
-            guessed_subtitle_info = guessit(subtitle_filename)
-            if "episode" in guessed_subtitle_info:
-                subtitle_episode = guessed_subtitle_info["episode"]
-            else:
-                episode_matches = re.search(r"(?!S)(\D\d\d|\D\d)\D", subtitle_filename)
-                if episode_matches:
-                    subtitle_episode = episode_matches.group(1)
-                else:
-                    logger.info(
-                        "> Could not guess Episode number for subtitle: {subtitle_filepath}"
-                    )
+def guess_episode_info(episode_filepath):
+    """
+    Returns the guessit information of the episode and the query used to find its anime on AniList
+    """
+    from guessit import guessit
 
-            if int(subtitle_episode) == int(episode_info["episode"]):
-                logger.info(
-                    f"> (E{subtitle_episode}) Found external subtitle: {subtitle_filepath}"
-                )
+    guessit_query = extract_anime_title_for_guessit(episode_filepath)
+    logger.info(f"> Query for Guessit: {guessit_query}")
+    episode_info = guessit(guessit_query)
 
-                subtitle_language = None
-                if "subtitle_language" in guessed_subtitle_info:
-                    subtitle_language = guessed_subtitle_info[
-                        "subtitle_language"
-                    ].alpha2
-                else:
-                    try:
-                        subtitle_data = pysubs2.load(subtitle_filepath)
-
-                        # Concatenate all the subtitle lines into a single string for better accuracy
-                        subtitle_text = " ".join(
-                            [event.text for event in subtitle_data]
-                        )
-
-                        # Use langdetect to guess the language
-                        subtitle_language = detect(subtitle_text)
-                        logger.info(
-                            f"> External subtitle detected language: {subtitle_language}"
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to detect language for subtitle: {e}")
-                        continue
-
-                if not subtitle_language:
-                    logger.error(
-                        "Impossible to guess the language of the subtitle. Skipping..."
-                    )
-                    continue
+    guessed_anime_title = episode_info["title"]
+    logger.info(
+        f"Guessed information: {guessed_anime_title} S{episode_info['season']:02d}E{episode_info['episode']:02d}"
+    )
 
-                if subtitle_language not in SUPPORTED_LANGUAGES:
-                    logger.info(
-                        f"Language {subtitle_language} is currently not supported. Skipping..."
-                    )
-                    continue
+    anilist_query = extract_anime_title_for_anilist(guessed_anime_title)
+    logger.info(f"Query for Anilist: {anilist_query}\n")
 
-                subtitle_data = pysubs2.load(subtitle_filepath)
-                logger.info(f">Found [{subtitle_language}] subtitles: {subtitle_data}")
+    return episode_info, anilist_query
 
-                if subtitle_language in matching_subtitles and len(subtitle_data) < len(
-                    matching_subtitles[subtitle_language]
-                ):
-                    logger.info(
-                        f"Already found better matching subtitles for this language. Skipping..."
-                    )
-                    continue
 
-                logger.info(f"Saving subtitles: {subtitle_data}\n")
-                matching_subtitles[subtitle_language] = MatchingSubtitle(
-                    origin="external",
-                    filepath=subtitle_filepath,
-                    data=subtitle_data,
-                )
+def plan_episode(
+    episode_filepath,
+    episode_info,
+    anime_info,
+    subtitles_dict_remembered,
+    subtitle_index,
+    metrics=NULL_METRICS,
+):
+    logger.info(f"Filepath: {episode_filepath}\n")
+    logger.info(f"Anime found: {anime_info.title.romaji}\n")
+
+    # Part 1: Find subtitle files on same directory as episode, with same episode number
+    with metrics.timer("external_subtitles"):
+        external_subtitles = subtitle_index.find(
+            episode_filepath, episode_info["episode"]
+        )
+
+    # Part 2: Select the subtitle streams to extract from the mkv
+    with metrics.timer("probe"):
+        import ffmpeg
 
-        # Part 2: extract srt/ass from mkv (WIP)
-        # * Get every subtitle and filter it by using a checkbox select
-        # * Extract to /tmp
-        # * Add subtitles to matching_subtitles
-        tmp_output_folder = os.path.join(anime_folder_fullpath, "tmp")
-        os.makedirs(tmp_output_folder, exist_ok=True)
         file_probe = ffmpeg.probe(episode_filepath)
+    selected_indices, subtitles_dict_remembered = select_subtitle_streams(
+        file_probe, subtitles_dict_remembered
+    )
 
-        # Generate the list of available subs
-        subtitles_dict = {}
-        for stream in file_probe["streams"]:
-            if stream["codec_type"] == "subtitle":
-                index = stream["index"]
-                title = stream.get("tags", {}).get("title")
-                language = stream.get("tags", {}).get("language")
-                title = title if title else language
-                if title and language:
-                    subtitles_dict[index] = {"title": title, "language": language}
-
-        subtitle_choices = [
-            {"name": f"{details['title']} ({details['language']})", "value": index}
-            for index, details in subtitles_dict.items()
-        ]
+    subtitle_streams = [
+        {
+            "index": stream["index"],
+            "codec": stream["codec_name"],
+            "language": stream["tags"]["language"],
+        }
+        for stream in file_probe["streams"]
+        if stream["codec_type"] == "subtitle" and stream["index"] in selected_indices
+    ]
 
-        subtitle_questions = [
-            inquirer.Checkbox(
-                "subtitle_streams",
-                message="What subtitles do you want to use?",
-                choices=subtitle_choices,
+    episode_plan = {
+        "episode_filepath": str(episode_filepath),
+        "anilist_id": anime_info.id,
+        "season": episode_info["season"],
+        "episode": episode_info["episode"],
+        "external_subtitles": external_subtitles,
+        "subtitle_streams": subtitle_streams,
+        # Lets the copy audio format name the audio files without probing the episode again
+        "audio_codec": next(
+            (
+                stream["codec_name"]
+                for stream in file_probe["streams"]
+                if stream["codec_type"] == "audio"
             ),
-        ]
+            None,
+        ),
+    }
+    logger.info(f"Episode plan: {episode_plan}\n")
 
-        # Check if want to remember this selection for future episodes
-        current_subtitles_dict = {
-            index: subtitles_dict[index]
-            for index in subtitles_dict
-            if index in subtitles_dict_remembered
-        }
+    return episode_plan, subtitles_dict_remembered
 
-        # If there was a previous selection
-        if subtitles_dict_remembered:
-            # If the current subtitles dictionary is different from the remembered one
-            if current_subtitles_dict != subtitles_dict_remembered:
-                logger.info(
-                    "Previous subtitles used are different from current episode. Asking for selection again..."
-                )
-                selected_subtitles = inquirer.prompt(subtitle_questions)
-                selected_indices = [
-                    subtitle["value"]
-                    for subtitle in selected_subtitles["subtitle_streams"]
-                ]
-
-                subtitle_remember_question = [
-                    inquirer.Confirm(
-                        "subtitle_remember",
-                        message="Do you want to remember this selection for future episodes?",
-                        default=False,
-                    )
-                ]
-                selected_remember_subtitles = inquirer.prompt(
-                    subtitle_remember_question
-                )
-                if selected_remember_subtitles["subtitle_remember"]:
-                    subtitles_dict_remembered = {
-                        index: subtitles_dict[index] for index in selected_indices
-                    }
-            else:
-                # Previous selection if the current and remembered dictionaries are the same
-                selected_indices = [index for index in subtitles_dict_remembered]
-        else:
-            # If it's the first time or if the remembered selection was cleared, ask for the selection
+
+def select_subtitle_streams(file_probe, subtitles_dict_remembered):
+    """
+    Asks which subtitle streams of the mkv have to be used, unless the same streams were found on a previous episode
+    and the user asked to remember the selection. Returns the selected stream indices and the remembered selection
+    """
+    import inquirer
+
+    # Generate the list of available subs
+    subtitles_dict = {}
+    for stream in file_probe["streams"]:
+        if stream["codec_type"] == "subtitle":
+            index = stream["index"]
+            title = stream.get("tags", {}).get("title")
+            language = stream.get("tags", {}).get("language")
+            title = title if title else language
+            if title and language:
+                subtitles_dict[index] = {"title": title, "language": language}
+
+    subtitle_choices = [
+        {"name": f"{details['title']} ({details['language']})", "value": index}
+        for index, details in subtitles_dict.items()
+    ]
+
+    subtitle_questions = [
+        inquirer.Checkbox(
+            "subtitle_streams",
+            message="What subtitles do you want to use?",
+            choices=subtitle_choices,
+        ),
+    ]
+
+    # Check if want to remember this selection for future episodes
+    current_subtitles_dict = {
+        index: subtitles_dict[index]
+        for index in subtitles_dict
+        if index in subtitles_dict_remembered
+    }
+
+    # If there was a previous selection
+    if subtitles_dict_remembered:
+        # If the current subtitles dictionary is different from the remembered one
+        if current_subtitles_dict != subtitles_dict_remembered:
+            logger.info(
+                "Previous subtitles used are different from current episode. Asking for selection again..."
+            )
             selected_subtitles = inquirer.prompt(subtitle_questions)
             selected_indices = [
                 subtitle["value"] for subtitle in selected_subtitles["subtitle_streams"]
@@ -390,126 +472,543 @@ def extract_segments_from_episode(
                 subtitles_dict_remembered = {
                     index: subtitles_dict[index] for index in selected_indices
                 }
+        else:
+            # Previous selection if the current and remembered dictionaries are the same
+            selected_indices = [index for index in subtitles_dict_remembered]
+    else:
+        # If it's the first time or if the remembered selection was cleared, ask for the selection
+        selected_subtitles = inquirer.prompt(subtitle_questions)
+        selected_indices = [
+            subtitle["value"] for subtitle in selected_subtitles["subtitle_streams"]
+        ]
 
-        subtitle_streams = [
-            stream
-            for stream in file_probe["streams"]
-            if stream["codec_type"] == "subtitle"
-            and stream["index"] in selected_indices
+        subtitle_remember_question = [
+            inquirer.Confirm(
+                "subtitle_remember",
+                message="Do you want to remember this selection for future episodes?",
+                default=False,
+            )
         ]
+        selected_remember_subtitles = inquirer.prompt(subtitle_remember_question)
+        if selected_remember_subtitles["subtitle_remember"]:
+            subtitles_dict_remembered = {
+                index: subtitles_dict[index] for index in selected_indices
+            }
+
+    return selected_indices, subtitles_dict_remembered
 
-        for subtitle_stream in subtitle_streams:
-            index = subtitle_stream["index"]
-            codec = subtitle_stream["codec_name"]
-            tag_language = subtitle_stream["tags"]["language"]
 
-            # Support for non-ISO 639-3 language tags
-            tag_language_normalizer = {"fre": "fra", "ger": "deu"}
+def create_anime_folder(anime_info, output_folder):
+    """
+    Creates the folder for saving info.json and segments of an anime, with its info.json, cover and banner. Returns
+    the full path of the folder
+    """
+    anime_folder_name = map_anime_title_to_media_folder(anime_info.title.romaji)
+    anime_folder_fullpath = os.path.join(output_folder, anime_folder_name)
+    os.makedirs(anime_folder_fullpath, exist_ok=True)
+    logger.info(f"> Base anime folder: {anime_folder_fullpath}")
+
+    info_json_fullpath = os.path.join(anime_folder_fullpath, "info.json")
+    logger.info(f"Filepath for info.json: {info_json_fullpath}\n")
+
+    if not os.path.exists(info_json_fullpath):
+        import requests
+
+        logger.info("Creating new info.json file...")
+
+        with open(info_json_fullpath, "wb") as f:
+            info_json = {
+                "id": anime_info.id,
+                "version": "4",
+                "folder_media_anime": anime_folder_name,
+                "japanese_name": anime_info.title.native,
+                "english_name": anime_info.title.english,
+                "romaji_name": anime_info.title.romaji,
+                "airing_format": anime_info.format,
+                "airing_status": anime_info.status,
+                "genres": anime_info.genres,
+            }
+
+            # Info seeded from a previous info.json has no image urls
+            if "cover" not in info_json and anime_info.cover.extra_large:
+                cover_data = requests.get(anime_info.cover.extra_large).content
+                cover_filename = (
+                    f"cover{os.path.splitext(anime_info.cover.extra_large)[1]}"
+                )
+                with open(
+                    os.path.join(anime_folder_fullpath, cover_filename), "wb"
+                ) as handler:
+                    handler.write(cover_data)
+                info_json["cover"] = os.path.join(anime_folder_name, cover_filename)
+
+            if "banner" not in info_json and anime_info.banner:
+                banner_data = requests.get(anime_info.banner).content
+                banner_filename = (
+                    f"banner{os.path.splitext(anime_info.cover.extra_large)[1]}"
+                )
+                with open(
+                    os.path.join(anime_folder_fullpath, banner_filename), "wb"
+                ) as handler:
+                    handler.write(banner_data)
+                info_json["banner"] = os.path.join(anime_folder_name, banner_filename)
 
-            if tag_language_normalizer.get(tag_language):
-                tag_language = tag_language_normalizer.get(tag_language)
+            logger.info(f"Json Data: {info_json}\n")
 
-            subtitle_language = babelfish.Language(tag_language).alpha2
-            logger.info(
-                f"Found internal subtitle stream. Index: {index}. Codec: {codec}. Language: {subtitle_language}"
+            # Use utf8 for writing Japanese characters correctly
+            json_data = json.dumps(info_json, indent=2, ensure_ascii=False).encode(
+                "utf8"
             )
+            f.write(json_data)
 
-            if subtitle_language not in SUPPORTED_LANGUAGES:
-                logger.info(
-                    f"Language {subtitle_language} is currently not supported. Skipping..."
-                )
-                continue
+    return anime_folder_fullpath
+
+
+def process_episode(episode_plan, anime_folder_fullpath, translator, args):
+    """
+    Processing phase: loads the subtitles chosen on the plan of the episode, extracts the selected subtitle streams
+    and splits the episode. It never asks anything, so it can run on the scheduler. Runs the same stages as the
+    async pipeline, one after the other
+    """
+    job = prepare_episode(episode_plan, anime_folder_fullpath, translator, args)
+    if is_episode_processed(job):
+        return episode_result(job)
+
+    subtitles = load_episode_subtitles(job)
+    segments, translations = translate_segments(
+        job.translator, subtitles, job.args, job.metrics
+    )
+    return write_episode(job, segments, translations)
+
+
+def episode_pipeline_stages(args):
+    """
+    Stages of the async pipeline: subtitles are extracted with async ffmpeg calls, translated on threads (waiting
+    for DeepL) and the media and rows rendered on the executor
+    """
+    return [
+        PipelineStage("extract", extract_stage, args.extract_concurrency),
+        PipelineStage("translate", translate_stage, args.translate_concurrency),
+        PipelineStage("render", render_stage, args.render_concurrency),
+    ]
+
+
+async def extract_stage(episode_plan, anime_folder_fullpath, translator, args):
+    job = prepare_episode(episode_plan, anime_folder_fullpath, translator, args)
+    if is_episode_processed(job):
+        return Finished(episode_result(job))
+
+    return job, await load_episode_subtitles_async(job)
+
+
+async def translate_stage(extracted):
+    import asyncio
+
+    job, subtitles = extracted
+    segments, translations = await asyncio.to_thread(
+        translate_segments, job.translator, subtitles, job.args, job.metrics
+    )
+    return job, segments, translations
+
+
+async def render_stage(translated):
+    import asyncio
+
+    return await asyncio.get_running_loop().run_in_executor(
+        None, write_episode, *translated
+    )
+
+
+def prepare_episode(episode_plan, anime_folder_fullpath, translator, args):
+    """
+    Returns the EpisodeJob of the episode, with its output folders, metrics and manifest
+    """
+    episode_filepath = episode_plan["episode_filepath"]
+    anime_folder_name = os.path.basename(anime_folder_fullpath)
+    season_number_pretty = f"S{episode_plan['season']:02d}"
+    episode_number_pretty = f"E{episode_plan['episode']:02d}"
+    logger.info(
+        f"Processing: {episode_filepath} ({anime_folder_name} {season_number_pretty}{episode_number_pretty})\n"
+    )
+
+    episode_folder_output_path = os.path.join(
+        anime_folder_fullpath, season_number_pretty, episode_number_pretty
+    )
+
+    metrics = create_metrics(args)
+    if isinstance(translator, CachedTranslator):
+        # Every episode counts its own translation memory hits. Only the calls that reach DeepL are metered
+        translator = CachedTranslator(
+            (
+                MeteredTranslator(translator.translator, metrics)
+                if metrics.enabled
+                else translator.translator
+            ),
+            translator.memory,
+        )
+    elif translator and metrics.enabled:
+        translator = MeteredTranslator(translator, metrics)
+
+    manifest = None
+    fingerprint = None
+    if getattr(args, "resume", True):
+        manifest = EpisodeManifest(
+            os.path.join(episode_folder_output_path, MANIFEST_FILENAME)
+        )
+        fingerprint = episode_fingerprint(
+            episode_plan, args, translated=translator is not None
+        )
+
+    # Extract srt/ass from mkv
+    tmp_output_folder = os.path.join(anime_folder_fullpath, "tmp")
+    os.makedirs(tmp_output_folder, exist_ok=True)
+
+    return EpisodeJob(
+        plan=episode_plan,
+        anime_folder_fullpath=anime_folder_fullpath,
+        output_path=episode_folder_output_path,
+        tmp_folder=tmp_output_folder,
+        translator=translator,
+        args=args,
+        manifest=manifest,
+        fingerprint=fingerprint,
+        metrics=metrics,
+    )
+
+
+def is_episode_processed(job):
+    if job.manifest and job.manifest.is_complete(job.fingerprint):
+        logger.info(
+            f"Episode already processed with the same inputs: {job.output_path}. Skipping..."
+        )
+        job.metrics.add("episodes_skipped")
+        return True
+
+    return False
 
-            output_sub_tmp_filepath = os.path.join(tmp_output_folder, f"tmp.{codec}")
-
-            subprocess.call(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-i",
-                    episode_filepath,
-                    "-map",
-                    f"0:{index}",
-                    "-c",
-                    "copy",
-                    output_sub_tmp_filepath,
-                ],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.STDOUT,
+
+def load_episode_subtitles(job):
+    """
+    Returns the subtitles of the episode as {language: MatchingSubtitle}, from the external files chosen on the
+    plan and the selected subtitle streams
+    """
+    matching_subtitles = load_external_subtitles(job)
+    subtitle_streams = internal_subtitle_streams(job.plan)
+
+    episode_tmp_folder = create_episode_tmp_folder(job)
+    try:
+        with job.metrics.timer("subtitle_extraction"):
+            extracted_subtitle_filepaths = extract_subtitle_streams(
+                job.plan["episode_filepath"],
+                [(index, codec) for index, codec, _ in subtitle_streams],
+                episode_tmp_folder,
             )
-            logger.info(f"Exported subtitle to: {output_sub_tmp_filepath}")
+        internal_subtitles = load_internal_subtitles(
+            subtitle_streams, extracted_subtitle_filepaths
+        )
+    finally:
+        shutil.rmtree(episode_tmp_folder, ignore_errors=True)
 
-            subtitle_data = pysubs2.load(output_sub_tmp_filepath)
-            logger.info(f">Found [{subtitle_language}] subtitles: {subtitle_data}")
+    return merge_internal_subtitles(job, matching_subtitles, internal_subtitles)
 
-            if subtitle_language in matching_subtitles:
-                logger.info(f"> Already matched subtitles for this language!!")
 
-                if (
-                    len(subtitle_data) > len(matching_subtitles[subtitle_language])
-                    and matching_subtitles[subtitle_language].origin != "external"
-                ):
-                    logger.info(
-                        ">> Current subtitle internal file is longer than previous selected. Overriding..."
-                    )
-                else:
-                    continue
+async def load_episode_subtitles_async(job):
+    """
+    Same as load_episode_subtitles, waiting for ffmpeg and the subtitle files without blocking the event loop
+    """
+    import asyncio
 
-            logger.info(f"Saving subtitles: {subtitle_data}\n")
-            output_sub_final_filepath = os.path.join(
-                tmp_output_folder,
-                f"{anime_folder_name} {season_number_pretty}{episode_number_pretty}.{subtitle_language}.{codec}",
+    matching_subtitles = await asyncio.to_thread(load_external_subtitles, job)
+    subtitle_streams = internal_subtitle_streams(job.plan)
+
+    episode_tmp_folder = create_episode_tmp_folder(job)
+    try:
+        with job.metrics.timer("subtitle_extraction"):
+            extracted_subtitle_filepaths = await extract_subtitle_streams_async(
+                job.plan["episode_filepath"],
+                [(index, codec) for index, codec, _ in subtitle_streams],
+                episode_tmp_folder,
             )
-            subtitle_data.save(output_sub_final_filepath)
-            matching_subtitles[subtitle_language] = MatchingSubtitle(
-                origin="internal",
-                filepath=output_sub_final_filepath,
-                data=subtitle_data,
+        internal_subtitles = await asyncio.to_thread(
+            load_internal_subtitles, subtitle_streams, extracted_subtitle_filepaths
+        )
+    finally:
+        shutil.rmtree(episode_tmp_folder, ignore_errors=True)
+
+    return await asyncio.to_thread(
+        merge_internal_subtitles, job, matching_subtitles, internal_subtitles
+    )
+
+
+def load_external_subtitles(job):
+    with job.metrics.timer("subtitle_load"):
+        return {
+            language: MatchingSubtitle(
+                origin="external",
+                filepath=subtitle_filepath,
+                data=pysubs2.load(subtitle_filepath),
             )
+            for language, subtitle_filepath in job.plan["external_subtitles"].items()
+        }
 
-        logger.info(f"Matching subtitles: {matching_subtitles}\n")
 
-        # Having matching JP subtitles is required
-        if "ja" not in matching_subtitles:
-            raise Exception("Could not find Japanese subtitles. Skipping...")
+def internal_subtitle_streams(episode_plan):
+    """
+    Returns the (index, codec, language) of the subtitle streams of the plan in a supported language
+    """
+    subtitle_streams = []
+    for subtitle_stream in episode_plan["subtitle_streams"]:
+        index = subtitle_stream["index"]
+        codec = subtitle_stream["codec"]
+        tag_language = subtitle_stream["language"]
 
-        # Start segmenting file
-        logger.info("Start file segmentation...")
+        # Support for non-ISO 639-3 language tags
+        tag_language_normalizer = {"fre": "fra", "ger": "deu"}
 
-        episode_folder_output_path = os.path.join(
-            anime_folder_fullpath, season_number_pretty, episode_number_pretty
+        if tag_language_normalizer.get(tag_language):
+            tag_language = tag_language_normalizer.get(tag_language)
+
+        import babelfish
+
+        subtitle_language = babelfish.Language(tag_language).alpha2
+        logger.info(
+            f"Found internal subtitle stream. Index: {index}. Codec: {codec}. Language: {subtitle_language}"
         )
-        os.makedirs(episode_folder_output_path, exist_ok=True)
-
-        if args.parallel:
-            pool.apply_async(
-                split_video_by_subtitles,
-                (
-                    translator,
-                    episode_filepath,
-                    matching_subtitles,
-                    episode_folder_output_path,
-                    args,
-                ),
-            )
-        else:
-            split_video_by_subtitles(
-                translator,
-                episode_filepath,
-                matching_subtitles,
-                episode_folder_output_path,
-                args,
+
+        if subtitle_language not in SUPPORTED_LANGUAGES:
+            logger.info(
+                f"Language {subtitle_language} is currently not supported. Skipping..."
             )
+            continue
+
+        subtitle_streams.append((index, codec, subtitle_language))
+
+    return subtitle_streams
+
+
+def create_episode_tmp_folder(job):
+    # Unique folder for this episode, so parallel episodes don't overwrite each other's streams
+    return tempfile.mkdtemp(
+        prefix=f"S{job.plan['season']:02d}E{job.plan['episode']:02d}-",
+        dir=job.tmp_folder,
+    )
+
+
+def load_internal_subtitles(subtitle_streams, extracted_subtitle_filepaths):
+    return [
+        (
+            codec,
+            subtitle_language,
+            pysubs2.load(extracted_subtitle_filepaths[index]),
+        )
+        for index, codec, subtitle_language in subtitle_streams
+    ]
+
+
+def merge_internal_subtitles(job, matching_subtitles, internal_subtitles):
+    """
+    Adds the internal subtitles to the external ones, saving them on the tmp folder. An internal subtitle only
+    replaces a shorter internal one of the same language, external subtitles are always kept
+    """
+    anime_folder_name = os.path.basename(job.anime_folder_fullpath)
+    episode_pretty = f"S{job.plan['season']:02d}E{job.plan['episode']:02d}"
+
+    for codec, subtitle_language, subtitle_data in internal_subtitles:
+        logger.info(f">Found [{subtitle_language}] subtitles: {subtitle_data}")
+
+        if subtitle_language in matching_subtitles:
+            logger.info(f"> Already matched subtitles for this language!!")
+
+            if (
+                len(subtitle_data) > len(matching_subtitles[subtitle_language].data)
+                and matching_subtitles[subtitle_language].origin != "external"
+            ):
+                logger.info(
+                    ">> Current subtitle internal file is longer than previous selected. Overriding..."
+                )
+            else:
+                continue
+
+        logger.info(f"Saving subtitles: {subtitle_data}\n")
+        output_sub_final_filepath = os.path.join(
+            job.tmp_folder,
+            f"{anime_folder_name} {episode_pretty}.{subtitle_language}."
+            f"{SUBTITLE_CODEC_EXTENSIONS.get(codec, codec)}",
+        )
+        subtitle_data.save(output_sub_final_filepath)
+        matching_subtitles[subtitle_language] = MatchingSubtitle(
+            origin="internal",
+            filepath=output_sub_final_filepath,
+            data=subtitle_data,
+        )
 
-        # shutil.rmtree(tmp_output_folder, ignore_errors=True)
-        logger.info(f"Finished")
+    logger.info(f"Matching subtitles: {matching_subtitles}\n")
 
+    # Having matching JP subtitles is required
+    if "ja" not in matching_subtitles:
+        raise Exception("Could not find Japanese subtitles. Skipping...")
+
+    return matching_subtitles
+
+
+def write_episode(job, segments, translations):
+    """
+    Writes the rows and media of the segments of the episode, updates the index and marks the episode as finished
+    on its manifest. Returns the metrics of the episode
+    """
+    # Start segmenting file
+    logger.info("Start file segmentation...")
+
+    os.makedirs(job.output_path, exist_ok=True)
+
+    if job.manifest:
+        job.manifest.start(
+            job.fingerprint,
+            media_fingerprint(job.plan["episode_filepath"], job.args),
+        )
+
+    write_segments(
+        job.plan["episode_filepath"],
+        segments,
+        translations,
+        job.output_path,
+        job.args,
+        manifest=job.manifest,
+        metrics=job.metrics,
+        tmp_folder=job.tmp_folder,
+        audio_codec=job.plan.get("audio_codec"),
+    )
+
+    if getattr(job.args, "index", True):
+        update_index(job)
+
+    if job.manifest:
+        # Dry runs don't generate any media
+        job.manifest.finish(
+            []
+            if getattr(job.args, "dryrun", False)
+            else [segment.segment_id for segment in segments]
+        )
+
+    logger.info(f"Finished")
+
+    if job.metrics.enabled:
+        job.metrics.write_json(os.path.join(job.output_path, METRICS_FILENAME))
+
+    return episode_result(job)
+
+
+def update_index(job):
+    """
+    Adds the rows of the episode to the search index. The index is a secondary output, so an error (a locked
+    database, or a SQLite without FTS5 trigram support) is logged without failing the episode. `search --rebuild`
+    recovers it later
+    """
+    try:
+        index = OutputIndex(os.path.join(job.args.output, INDEX_FILENAME))
+        try:
+            with job.metrics.timer("index"):
+                index.update_episode(
+                    job.anime_folder_fullpath,
+                    job.plan["season"],
+                    job.plan["episode"],
+                    os.path.join(job.output_path, "data.tsv"),
+                )
+        finally:
+            index.close()
     except Exception:
         logger.error(
-            "Something happened processing the anime. Skipping...", exc_info=True
+            f"Could not update the search index with {job.output_path}. Run `search --rebuild` to recover it",
+            exc_info=True,
+        )
+        job.metrics.add("index_errors")
+
+
+def episode_result(job):
+    cached = isinstance(job.translator, CachedTranslator)
+    return EpisodeResult(
+        metrics=job.metrics.as_dict(),
+        translation_memory_hits=job.translator.hits if cached else 0,
+        translation_memory_misses=job.translator.misses if cached else 0,
+    )
+
+
+def extract_subtitle_streams(episode_filepath, subtitle_streams, output_folder):
+    """
+    Extracts several subtitle streams of the episode with a single ffmpeg call, so the mkv is only demuxed once.
+    Receives a list of (stream index, codec) and returns the path of the extracted file of each stream index
+    """
+    if not subtitle_streams:
+        return {}
+
+    command, extracted_subtitle_filepaths = build_subtitle_extraction(
+        episode_filepath, subtitle_streams, output_folder
+    )
+    subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    logger.info(f"Exported subtitles to: {list(extracted_subtitle_filepaths.values())}")
+
+    return extracted_subtitle_filepaths
+
+
+async def extract_subtitle_streams_async(
+    episode_filepath, subtitle_streams, output_folder
+):
+    """
+    Same as extract_subtitle_streams, running ffmpeg as an async subprocess
+    """
+    import asyncio
+
+    if not subtitle_streams:
+        return {}
+
+    command, extracted_subtitle_filepaths = build_subtitle_extraction(
+        episode_filepath, subtitle_streams, output_folder
+    )
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    await process.wait()
+    logger.info(f"Exported subtitles to: {list(extracted_subtitle_filepaths.values())}")
+
+    return extracted_subtitle_filepaths
+
+
+def build_subtitle_extraction(episode_filepath, subtitle_streams, output_folder):
+    """
+    Returns the ffmpeg command that extracts the subtitle streams and the path of the file of each stream index
+    """
+    extracted_subtitle_filepaths = {
+        index: os.path.join(
+            output_folder, f"{index}.{SUBTITLE_CODEC_EXTENSIONS.get(codec, codec)}"
+        )
+        for index, codec in subtitle_streams
+    }
+
+    command = ["ffmpeg", "-y", "-i", episode_filepath]
+    for index, output_filepath in extracted_subtitle_filepaths.items():
+        command += ["-map", f"0:{index}", "-c", "copy", output_filepath]
+
+    return command, extracted_subtitle_filepaths
+
+
+def write_plan(plan_filepath, episode_plans):
+    os.makedirs(os.path.dirname(os.path.abspath(plan_filepath)), exist_ok=True)
+    with open(plan_filepath, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": PLAN_VERSION, "episodes": episode_plans},
+            f,
+            indent=2,
+            ensure_ascii=False,
         )
 
-    return pool, subtitles_dict_remembered
+
+def read_plan(plan_filepath):
+    with open(plan_filepath, encoding="utf-8") as f:
+        plan = json.load(f)
+
+    if plan.get("version") != PLAN_VERSION:
+        raise Exception(f"Unsupported execution plan version: {plan.get('version')}")
+
+    return plan["episodes"]
 
 
 def split_video_by_subtitles(
@@ -519,176 +1018,203 @@ def split_video_by_subtitles(
     episode_folder_output_path,
     args,
     output_tsv_name="data.tsv",
+    manifest=None,
+    metrics=NULL_METRICS,
+    tmp_folder=None,
 ):
-    video = mp.VideoFileClip(video_file) if video_file else None
+    """
+    Splits the episode onto segments, writing their rows on the TSV and generating their media. With a manifest,
+    the media of segments that were already rendered is not generated again
+    """
+    segments, translations = translate_segments(translator, subtitles, args, metrics)
+    write_segments(
+        video_file,
+        segments,
+        translations,
+        episode_folder_output_path,
+        args,
+        output_tsv_name=output_tsv_name,
+        manifest=manifest,
+        metrics=metrics,
+        tmp_folder=tmp_folder,
+    )
+
 
+def translate_segments(translator, subtitles, args, metrics=NULL_METRICS):
+    """
+    Groups the subtitles onto segments and translates the missing sentences. Returns the segments and the
+    translations
+    """
     # # TODO: Sync subtitles calling ffsubsync
     # Use first found internal sub as reference for timing since it should be 100% perfect
 
     # > From here on just assume all subtitles are perfectly synced
     synced_subtitles = subtitles
 
-    # Extract all subtitles lines from all subtitle files passed
-    sorted_lines = []
-    for language, subs in synced_subtitles.items():
-        for line in subs.data:
-            sentence = process_subtitle_line(line, args)
-            sorted_lines.append(
-                {
-                    "start": line.start,
-                    "end": line.end,
-                    "language": language,
-                    "sentence": sentence,
-                    "actor": line.name,
-                }
-            )
+    with metrics.timer("merge"):
+        sorted_lines = merge_subtitle_lines(synced_subtitles, args)
+
+    # Group the lines onto segments. Media, translations and rows are generated afterwards
+    # so every stage can work over the whole episode at once
+    with metrics.timer("group"):
+        segments = group_segments(sorted_lines, getattr(args, "aligner", "compat"))
+    metrics.add("segments", len(segments))
+
+    # Translate all the missing sentences of the episode with a few batched calls
+    with metrics.timer("translation"):
+        translations = (
+            translate_sentences(translator, collect_sentences_to_translate(segments))
+            if translator
+            else {}
+        )
 
-    # Sort all subtitle lines by start timestamp
-    sorted_lines.sort(key=lambda x: x["start"])
+    return segments, translations
 
-    # Give an id to each line
-    for i, line in enumerate(sorted_lines):
-        line["sub_id"] = i
-        sorted_lines[i] = line
 
-    # Remove empty lines
-    sorted_lines = list(filter(lambda x: x["sentence"], sorted_lines))
+def write_segments(
+    video_file,
+    segments,
+    translations,
+    episode_folder_output_path,
+    args,
+    output_tsv_name="data.tsv",
+    manifest=None,
+    metrics=NULL_METRICS,
+    tmp_folder=None,
+    audio_codec=None,
+):
+    """
+    Writes the rows of the segments on the TSV and generates their media. `audio_codec` is the codec of the audio
+    of the video, probed when it is needed and not given.
 
-    # Remove duplicate lines (with same start, end, sentence and language)
-    duplicates_set = set()
-    for line in list(sorted_lines):
-        # Ignore the attribute `sub_id` so we can detect duplicates
-        line_hashkey = (line["start"], line["end"], line["language"], line["sentence"])
+    The TSV is only replaced once the media is generated, so an episode whose media fails keeps its previous TSV
+    """
+    audio_format = getattr(args, "audio_format", "mp3")
+    if audio_format == "copy" and not audio_codec and video_file:
+        audio_codec = probe_audio_codec(video_file)
+    segment_audio = audio_output(audio_format, audio_codec)
+
+    renderer = create_renderer(
+        video_file,
+        args,
+        on_rendered=manifest.mark_rendered if manifest else None,
+        metrics=metrics,
+        tmp_folder=tmp_folder,
+        audio_output=segment_audio,
+    )
 
-        if line_hashkey not in duplicates_set:
-            duplicates_set.add(line_hashkey)
-        else:
-            sorted_lines.remove(line)
+    # Rows are kept until the media is generated, so the TSV is only replaced once the media of every row exists
+    rows = PendingRows()
+    for segment in segments:
+        line_logs = [episode_folder_output_path, ""]
+        # Dumping every line is only useful for debugging and expensive on long episodes
+        if logger.isEnabledFor(logging.DEBUG):
+            line_logs += [
+                f"[{line.language}] Line: {line}"
+                for line in sorted(
+                    segment.ja + segment.es + segment.en,
+                    key=lambda line: line.sub_id,
+                )
+            ]
 
-    tsv_filepath = os.path.join(episode_folder_output_path, output_tsv_name)
-    with open(tsv_filepath, "w+", newline="", encoding="utf-8") as tsvfile:
-        writer = csv.DictWriter(
-            tsvfile,
-            fieldnames=EpisodeTsvRow._fields,
-            delimiter="\t",
-            quoting=csv.QUOTE_NONE,
-            escapechar="\\",
+        segment_logs = generate_segment(
+            segment,
+            episode_folder_output_path,
+            renderer,
+            translations,
+            rows,
+            args,
+            manifest,
+            audio_extension=AUDIO_EXTENSIONS[segment_audio.codec],
         )
-        writer.writeheader()
+        if segment_logs:
+            line_logs = line_logs + segment_logs
 
-        segment_start = sorted_lines[0]["start"] - 1
-        segment_end = sorted_lines[0]["end"] + 1
-        segment_sentences = {}
-        line_logs = [episode_folder_output_path, ""]
-        for i, line in enumerate(sorted_lines):
-            ln = line["language"]
-
-            # New line when:
-            #   * No overlap
-            #   * Overlap, but gap is smaller than 500
-            if not (segment_start < line["end"] and line["start"] < segment_end) or (
-                (segment_start < line["end"] and line["start"] < segment_end)
-                and abs(segment_end - line["start"]) < 500
-            ):
-                if "ja" in segment_sentences and (
-                    "en" in segment_sentences or "es" in segment_sentences
-                ):
-                    segment_logs = generate_segment(
-                        i,
-                        segment_sentences,
-                        segment_start,
-                        segment_end,
-                        episode_folder_output_path,
-                        video,
-                        translator,
-                        writer,
-                        args,
-                    )
-                    if segment_logs:
-                        line_logs = line_logs + segment_logs
+        line_logs.append("-------------------------------------------------")
+        logger.info("\n".join(line_logs))
 
-                else:
-                    line_logs.append("No en/es subtitle match. Ignoring...\n")
+    # Batched renderers generate the queued media once every segment is known
+    failed_ids = set()
+    if renderer:
+        try:
+            with metrics.timer("media"):
+                failed_ids = renderer.requested - renderer.close()
+        finally:
+            if manifest:
+                manifest.flush()
 
-                line_logs.append("-------------------------------------------------")
-                logger.info("\n".join(line_logs))
-                line_logs = [episode_folder_output_path, ""]
-                line_logs.append(f"[{ln}] Line: {line}")
+    tsv_filepath = os.path.join(episode_folder_output_path, output_tsv_name)
+    jsonl_filepath = (
+        f"{os.path.splitext(tsv_filepath)[0]}.jsonl"
+        if "jsonl" in (getattr(args, "export", None) or [])
+        else None
+    )
+    with metrics.timer("rows"), SegmentRowWriter(
+        tsv_filepath, EpisodeTsvRow._fields, jsonl_filepath
+    ) as writer:
+        for row in rows:
+            if row["ID"] in failed_ids:
+                logger.error(f"Missing media for segment {row['ID']}. Skipping row...")
+                continue
 
-                segment_sentences = {ln: [line]}
-                segment_start = line["start"]
-                segment_end = line["end"]
+            writer.writerow(row)
+            metrics.add("rows_written")
 
-            else:
-                line_logs.append(f"[{ln}] Line: {line}")
-                segment_sentences[ln] = segment_sentences.get(ln, [])
 
-                # Sometimes when two characters are speaking the same line is repeated several times. Detect that
-                # to avoid duplicating the same sentence
-                eq_match = False
-                for saved_line in segment_sentences[ln]:
-                    if (
-                        saved_line["sentence"] == line["sentence"]
-                        and segment_sentences[ln][-1]["end"] == line["start"]
-                    ):
-                        eq_match = True
-
-                if not eq_match:
-                    segment_sentences[ln].append(line)
+def collect_sentences_to_translate(segments):
+    """
+    Returns, for each translation target language, the joined japanese sentences of the segments that don't have
+    subtitles in that language
+    """
+    sentences_to_translate = {language: [] for language in TRANSLATION_TARGETS}
+    for segment in segments:
+        sentence_japanese = join_sentences_to_segment(segment.ja, "ja")[0]
+        for language in TRANSLATION_TARGETS:
+            lines = getattr(segment, language)
+            if not lines or not join_sentences_to_segment(lines, language)[0]:
+                sentences_to_translate[language].append(sentence_japanese)
 
-                segment_start = min(segment_start, line["start"])
-                segment_end = max(segment_end, line["end"])
+    return sentences_to_translate
 
 
 def generate_segment(
-    i,
-    segment_sentences,
-    segment_start,
-    segment_end,
+    segment,
     output_path,
-    video,
-    translator,
+    renderer,
+    translations,
     writer,
     args,
+    manifest=None,
+    audio_extension="mp3",
 ):
     logs = []
     sentence_japanese, actor_japanese, subs_jp_ids = join_sentences_to_segment(
-        segment_sentences["ja"], "ja"
+        segment.ja, "ja"
     )
     sentence_english, actor_english, subs_en_ids = (
-        join_sentences_to_segment(segment_sentences["en"], "en")
-        if "en" in segment_sentences
-        else (None, None, [])
+        join_sentences_to_segment(segment.en, "en") if segment.en else (None, None, [])
     )
     sentence_spanish, actor_spanish, subs_es_ids = (
-        join_sentences_to_segment(segment_sentences["es"], "es")
-        if "es" in segment_sentences
-        else (None, None, [])
+        join_sentences_to_segment(segment.es, "es") if segment.es else (None, None, [])
     )
-    # Use ID of the japanese sentence to identify the whole segment, since we always
-    # have to include japanese subtitles
-    segment_id = subs_jp_ids[0]
+    segment_id = segment.segment_id
 
     sentence_spanish_is_mt = False if sentence_spanish else None
     sentence_english_is_mt = False if sentence_english else None
 
-    if translator and not sentence_spanish:
-        sentence_spanish = translator.translate_text(
-            sentence_japanese, source_lang="JA", target_lang="ES"
-        ).text
+    if not sentence_spanish and sentence_japanese in translations.get("es", {}):
+        sentence_spanish = translations["es"][sentence_japanese]
         sentence_spanish_is_mt = True
         logs.append(f"[DEEPL - SPANISH]: {sentence_spanish}")
 
-    if translator and not sentence_english:
-        sentence_english = translator.translate_text(
-            sentence_japanese, source_lang="JA", target_lang="EN-US"
-        ).text
+    if not sentence_english and sentence_japanese in translations.get("en", {}):
+        sentence_english = translations["en"][sentence_japanese]
         sentence_english_is_mt = True
         logs.append(f"[DEEPL - ENGLISH]: {sentence_english}")
 
-    start_time_delta = timedelta(milliseconds=segment_start)
+    start_time_delta = timedelta(milliseconds=segment.start)
     start_time_seconds = start_time_delta.total_seconds()
-    end_time_delta = timedelta(milliseconds=segment_end)
+    end_time_delta = timedelta(milliseconds=segment.end)
     end_time_seconds = end_time_delta.total_seconds()
 
     subs_jp_ids_str = ",".join(list(map(str, subs_jp_ids)))
@@ -699,80 +1225,26 @@ def generate_segment(
     logs.append(f"[ES] ({subs_es_ids_str}) {sentence_spanish}")
     logs.append(f"[EN] ({subs_en_ids_str}) {sentence_english}")
 
-    audio_filename = f"{segment_id}.mp3"
+    audio_filename = f"{segment_id}.{audio_extension}"
     screenshot_filename = f"{segment_id}.webp"
     video_filename = f"{segment_id}.mp4"
 
-    # Audio
-    if video and not args.dryrun:
-        try:
-            subclip = video.subclip(start_time_seconds, end_time_seconds)
-            audio = subclip.audio
-            audio_path = os.path.join(output_path, audio_filename)
-
-            audio.write_audiofile(audio_path, codec="mp3", logger=None)
-
-            logs.append(f"> Saved audio in {audio_path}")
-
-        except Exception as err:
-            logger.exception(f"Error creating audio '{audio_filename}'", err)
-            return
-
-        # Screenshot
-        try:
-            screenshot_path = os.path.join(output_path, screenshot_filename)
-
-            # Take a screenshot on the middle of the dialog
-            screenshot_time = (start_time_seconds + end_time_seconds) / 2
-            video.save_frame(screenshot_path, t=screenshot_time)
-
-            logs.append(f"> Saved screenshot in {screenshot_path}")
-
-        except Exception as err:
-            logger.exception(f"Error creating screenshot '{screenshot_filename}'", err)
-            return
-
-        # Video
-        video_path = os.path.join(output_path, video_filename)
-        video_length_delta = end_time_delta - start_time_delta
-
-        try:
-            subprocess.call(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-loop",
-                    "1",
-                    "-framerate",
-                    "10",
-                    "-i",
-                    screenshot_path,
-                    "-i",
-                    audio_path,
-                    "-vf",
-                    "scale=1280:720,setsar=1",
-                    "-c:v",
-                    "libx264",
-                    "-tune",
-                    "stillimage",
-                    "-b:v",
-                    "200k",
-                    "-pix_fmt",
-                    "yuv420p",
-                    "-movflags",
-                    "+faststart",
-                    "-t",
-                    str(video_length_delta),
-                    video_path,
-                ],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-            )
-            logs.append(f"> Saved video in {video_path}")
-
-        except Exception as err:
-            logger.exception(f"Error creating video `{video_path}", err)
-            return
+    if renderer:
+        segment_media = SegmentMedia(
+            segment_id=segment_id,
+            start=start_time_seconds,
+            end=end_time_seconds,
+            audio_filename=audio_filename,
+            screenshot_filename=screenshot_filename,
+            video_filename=video_filename,
+        )
+        if manifest and manifest.is_rendered(segment_media, output_path):
+            logs.append("> Media already generated")
+        else:
+            media_logs = renderer.render(segment_media, output_path)
+            if media_logs is None:
+                return
+            logs += media_logs
 
     writer.writerow(
         EpisodeTsvRow(
@@ -798,93 +1270,6 @@ def generate_segment(
     return logs
 
 
-def join_sentences_to_segment(sentences, ln):
-    join_symbol = "　" if ln == "ja" else " "
-    joined_sentence = join_symbol.join(map(lambda x: x["sentence"].strip(), sentences))
-
-    # Sometimes japanese subs don't use the appropriate " symbol for quotes
-    invalid_quotes = r"``|''"
-    joined_sentence = re.sub(invalid_quotes, '"', joined_sentence)
-
-    # On certain cases it makes sense to not add a - since there is another symbol
-    # Already indicating the end of the sentence
-    remove_redundant_symbols = [
-        r"(?<=\.\.\.)-",
-        r"(?<=\?)-",
-        r"(?<=!)-",
-        r"(?<=\.)-",
-        r"(?<=,)-",
-        r"(?<=ー)-",
-        r"(?<=-)-",
-        r"(?<=。)\s",
-        r"^-",
-        r"(?<=\s)+\s",
-        r"(?<=\.\.\.)。",
-    ]
-
-    actor_sentence = ",".join(
-        sorted(set(map(lambda x: x["actor"].replace("\t", "").strip(), sentences)))
-    )
-
-    # Get all the ids that form the segment
-    subs_ids = list(map(lambda s: s["sub_id"], sentences))
-
-    return (
-        re.sub(rf"{'|'.join(remove_redundant_symbols)}", "", joined_sentence),
-        actor_sentence,
-        subs_ids,
-    )
-
-
-def process_subtitle_line(line, args):
-    if line.type != "Dialogue":
-        return ""
-
-    # Ass subtitles include an actor name that sometimes can be used to filter
-    # non-dialog subtitles
-    if line.name and re.search(r"sign|[_\-\s]?ed|op[_\-\s]?", line.name.lower()):
-        return ""
-
-    # *Top, sign... is usually used for background conversations with an ongoing
-    # dialog
-
-    if line.style and re.search(r"top|sign|tipo tv|block|alt|cart", line.style.lower()):
-        return ""
-
-    # Sometimes .ass subtitles include the signs subs on the main dialog
-    # Skip all lines that have pos() or move() ass method as it is not a real dialog line
-    if re.search(r"pos\(.*?\)|move\(.*?\)", line.text):
-        return ""
-
-    # Normaliza half-width (Hankaku) a full-width (Zenkaku) caracteres
-    processed_sentence = jaconvV2.normalize(line.plaintext, "NFKC")
-
-    # Replace all new lines / tabs / separators with just one space
-    processed_sentence = re.sub("\r?\n|\t", " ", processed_sentence)
-
-    if hasattr(args, "extra_punctuation") and args.extra_punctuation:
-        processed_sentence = processed_sentence.replace("・", " ")
-
-    processed_sentence = remove_nested_parenthesis(processed_sentence)
-
-    special_chars = r"⚟|⚞|<|>|=|●|→|ー?♪ー?|\u202a|\u202c|➡|&lrm;"
-    processed_sentence = re.sub(special_chars, "", processed_sentence)
-
-    processed_sentence = emoji.sub("", processed_sentence)
-
-    return processed_sentence.strip()
-
-
-def remove_nested_parenthesis(sentence):
-    nb_rep = 1
-    while nb_rep:
-        (sentence, nb_rep) = re.subn(
-            r"\([^\(\)（）\[\]\{\}《》【】]*\)|\[[^\(\)（）\[\]\{\}《》【】]*\]", "", sentence
-        )
-
-    return sentence
-
-
 def extract_anime_title_for_guessit(episode_filepath):
     """
     This method tries to parse the full episode path and get a coherent anime title. This methods does the following
@@ -930,46 +1315,11 @@ def map_anime_title_to_media_folder(anime_title):
     )
 
 
-class CachedAnilist:
-    def __init__(self):
-        self.client = Client()
-        self.cached_results = {}
-
-    def get_anime(self, search_query):
-        if search_query in self.cached_results:
-            return self.cached_results[search_query]
-
-        # Also, have
-        search_results = self.client.search(search_query)
-        logger.debug("Search results", search_results)
-
-        if not search_results:
-            raise Exception(
-                f"Anime with title {search_results} not found. Please check file name"
-            )
-
-        selected_index = 0
-        if len(search_results) > 1:
-            logger.info("Multiple animes found! Please select better match")
-            for i, result in enumerate(search_results):
-                try:
-                    english_title = result.title.english
-                except AttributeError:
-                    english_title = None
-                logger.info(f"[{i}]: {result.title.romaji} - {english_title}")
-
-            selected_index = input("> Please select a number:")
-
-        anime_id = search_results[int(selected_index)].id
-        anime_result = self.client.get_anime(anime_id)
-        self.cached_results[search_query] = anime_result
-
-        return anime_result
-
-
 def command_args():
     parser = argparse.ArgumentParser(
-        description="Split one or several .mkv files onto separate audio segments with images"
+        description="Split one or several .mkv files onto separate audio segments with images",
+        epilog=f"Other commands: {', '.join(SUBCOMMANDS)}. Run `media_sub_splitter <command> --help` for more "
+        f"information",
     )
     parser.add_argument(
         "input", type=pathlib.Path, help="Input folder with .mkv files and subtitles"
@@ -1012,6 +1362,27 @@ def command_args():
         help="Remove other common punctuation symbols like ・. This might cause certain"
         "subtitles to lose fidelity.",
     )
+    parser.add_argument(
+        "--plan",
+        dest="plan",
+        type=pathlib.Path,
+        help=f"Where to save the execution plan with the choices made for every episode. Defaults to "
+        f"{PLAN_FILENAME} on the output folder",
+    )
+    parser.add_argument(
+        "--plan-only",
+        dest="plan_only",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Only discover the episodes and save the execution plan, without processing them",
+    )
+    parser.add_argument(
+        "--from-plan",
+        dest="from_plan",
+        type=pathlib.Path,
+        help="Process the episodes of a previously saved execution plan without asking anything. The input folder "
+        "is ignored",
+    )
     parser.add_argument(
         "-p",
         "--parallel",
@@ -1020,6 +1391,185 @@ def command_args():
         default=False,
         help="Generate segments for episodes in parallel",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        type=positive_int,
+        default=DEFAULT_WORKERS,
+        help="Number of episodes segmented at the same time with --parallel. Ignored with --executor async, "
+        "which is limited by the concurrency of each stage",
+    )
+    parser.add_argument(
+        "--executor",
+        dest="executor",
+        choices=EXECUTORS,
+        default="process",
+        help="Run parallel episodes on separate processes (avoids contention on the GIL), threads, or an async "
+        "pipeline that extracts, translates and renders different episodes at the same time",
+    )
+    parser.add_argument(
+        "--extract-concurrency",
+        dest="extract_concurrency",
+        type=positive_int,
+        default=2,
+        help="Episodes extracting their subtitles at the same time with --executor async",
+    )
+    parser.add_argument(
+        "--translate-concurrency",
+        dest="translate_concurrency",
+        type=positive_int,
+        default=2,
+        help="Episodes waiting for their translations at the same time with --executor async",
+    )
+    parser.add_argument(
+        "--render-concurrency",
+        dest="render_concurrency",
+        type=positive_int,
+        default=DEFAULT_WORKERS,
+        help="Episodes generating their media at the same time with --executor async",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        dest="max_in_flight",
+        type=positive_int,
+        default=None,
+        help="Maximum number of episodes queued or running at the same time with --parallel. Defaults to twice the "
+        "number of workers. Ignored with --executor async",
+    )
+    parser.add_argument(
+        "--media-engine",
+        dest="media_engine",
+        choices=MEDIA_ENGINES,
+        default="ffmpeg",
+        help="Engine used to generate the audio, screenshot and video of the segments. `ffmpeg` extracts all the "
+        "segments of an episode with a few batched ffmpeg calls, `moviepy` generates each segment separately",
+    )
+    parser.add_argument(
+        "--screenshot-engine",
+        dest="screenshot_engine",
+        choices=SCREENSHOT_ENGINES,
+        default="batch",
+        help="How the ffmpeg media engine takes the screenshots. `batch` cuts them on the same ffmpeg calls as the "
+        "audio, `single-pass` decodes the whole video once and encodes the frames with Pillow",
+    )
+    parser.add_argument(
+        "--audio-engine",
+        dest="audio_engine",
+        choices=AUDIO_ENGINES,
+        default="batch",
+        help="How the ffmpeg media engine extracts the audio. `batch` cuts it on the same ffmpeg calls as the "
+        "screenshots, `pcm` decodes the whole audio track once to a temporary wav and encodes every segment from it",
+    )
+    parser.add_argument(
+        "--audio-format",
+        dest="audio_format",
+        choices=AUDIO_FORMATS,
+        default="mp3",
+        help="Format of the audio of the segments. `mp3` is encoded again to aac for the mp4, `aac` and `opus` are "
+        "encoded once and muxed as is on the mp4, `copy` cuts the audio of the episode without encoding it (falls "
+        "back to `aac` when the mp4 can't hold its codec)",
+    )
+    parser.add_argument(
+        "--keyframe-screenshots",
+        dest="keyframe_screenshots",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="With the single-pass screenshot engine, only decode the keyframes and take the one closest to the "
+        "middle of each segment. Much faster, but the screenshot can be a few seconds off",
+    )
+    parser.add_argument(
+        "--translation-memory",
+        dest="translation_memory",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Reuse translations from previous runs, stored on the output folder. Use --no-translation-memory to "
+        "always call DeepL",
+    )
+    parser.add_argument(
+        "--translation-memory-size",
+        dest="translation_memory_size",
+        type=positive_int,
+        default=TRANSLATION_MEMORY_SIZE,
+        help="Maximum number of translations kept on the translation memory",
+    )
+    parser.add_argument(
+        "--prune-translation-memory",
+        dest="prune_translation_memory",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Remove all the stored translations before starting",
+    )
+    parser.add_argument(
+        "--export",
+        dest="export",
+        choices=EXPORT_FORMATS,
+        action="append",
+        help="Also export the rows of every episode on this format, next to its data.tsv. `jsonl` writes one JSON "
+        "object per row with the same columns. Can be repeated",
+    )
+    parser.add_argument(
+        "--index",
+        dest="index",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help=f"Add the segments of every processed episode to the search index ({INDEX_FILENAME} on the output "
+        f"folder). Search it with `media_sub_splitter search <output_folder> <query>`",
+    )
+    parser.add_argument(
+        "--metrics",
+        dest="metrics",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help=f"Save the time spent on every stage and counters (translated characters, rows written...) as "
+        f"{METRICS_FILENAME} on every episode folder, and their sum for the whole run on the output folder",
+    )
+    parser.add_argument(
+        "--metrics-prometheus",
+        dest="metrics_prometheus",
+        type=pathlib.Path,
+        help="Also write the metrics of the run to this file, on the Prometheus text format",
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help=f"Skip the episodes whose inputs didn't change since they were processed, and only generate the media "
+        f"of missing or stale segments, using the {MANIFEST_FILENAME} of every episode folder. Use --no-resume to "
+        f"process everything again",
+    )
+    parser.add_argument(
+        "--anilist-cache",
+        dest="anilist_cache",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help=f"Reuse AniList results from previous runs, stored on {ANILIST_CACHE_FILENAME} on the output folder",
+    )
+    parser.add_argument(
+        "--anilist-cache-ttl",
+        dest="anilist_cache_ttl",
+        type=float,
+        default=ANILIST_CACHE_TTL_DAYS,
+        help="Days before a cached AniList result is fetched again",
+    )
+    parser.add_argument(
+        "--aligner",
+        dest="aligner",
+        choices=ALIGNERS,
+        default="compat",
+        help="How the lines of every language are grouped onto segments. `compat` grows each segment with every "
+        "overlapping line, `overlap` builds the segments from the japanese lines and adds to each one the english "
+        "and spanish lines that overlap it the most",
+    )
+    parser.add_argument(
+        "--language-detection",
+        dest="language_detection",
+        choices=LANGUAGE_DETECTION_MODES,
+        default="sample",
+        help="How the language of subtitles without language tag is detected: sample checks the kana and runs "
+        "langdetect over a sample of lines, full runs langdetect over the whole file",
+    )
     return parser.parse_args()
 
 
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Seconds between saves of the rendered segments, so the manifest is not written again for every segment
+MANIFEST_FLUSH_INTERVAL = 5
+
+# Arguments that change the content of data.tsv, its exports or the rows of the episode on
+# the index. An episode processed with different values is processed again
+EPISODE_ARGS = [
+    "extra_punctuation",
+    "dryrun",
+    "aligner",
+    "audio_format",
+    "export",
+    "index",
+]
+
+# Arguments that change the generated media. Segments rendered with different values
+# are rendered again
+MEDIA_ARGS = [
+    "media_engine",
+    "screenshot_engine",
+    "keyframe_screenshots",
+    "audio_engine",
+    "audio_format",
+]
+
+
+class EpisodeManifest:
+    """
+    Record of the inputs used to process an episode and of every segment whose media was fully generated, stored
+    as manifest.json on the episode folder. It lets a later run skip an episode whose inputs didn't change and only
+    render again the segments that are missing or were generated from a different video or settings.
+
+    Rendered segments are saved periodically, on flush and on finish
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        self.data = {"version": MANIFEST_VERSION, "complete": False, "segments": {}}
+
+        if os.path.exists(filepath):
+            try:
+                with open(filepath, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(
+                    f"Ignoring unreadable manifest {filepath}", exc_info=True
+                )
+            else:
+                if data.get("version") == MANIFEST_VERSION:
+                    self.data = data
+
+    def is_complete(self, fingerprint):
+        """
+        Returns whether the episode was finished with the same fingerprint and the media of every rendered segment
+        is still on the episode folder
+        """
+        if not (self.data["complete"] and self.data.get("fingerprint") == fingerprint):
+            return False
+
+        output_path = os.path.dirname(self.filepath)
+        return all(
+            os.path.exists(os.path.join(output_path, filename))
+            for entry in self.data["segments"].values()
+            for filename in entry["files"]
+        )
+
+    def start(self, fingerprint, media_fingerprint):
+        """
+        Starts processing the episode again. Segments are kept only if they were rendered with the same media
+        fingerprint
+        """
+        with self.lock:
+            if self.data.get("media") != media_fingerprint:
+                self.data["segments"] = {}
+            self.data["fingerprint"] = fingerprint
+            self.data["media"] = media_fingerprint
+            self.data["complete"] = False
+            self.save()
+
+    def is_rendered(self, segment, output_path):
+        entry = self.data["segments"].get(str(segment.segment_id))
+        return entry == segment_entry(segment) and all(
+            os.path.exists(os.path.join(output_path, filename))
+            for filename in entry["files"]
+        )
+
+    def mark_rendered(self, segment):
+        with self.lock:
+            self.data["segments"][str(segment.segment_id)] = segment_entry(segment)
+            self.dirty = True
+            if time.monotonic() - self.saved_at >= MANIFEST_FLUSH_INTERVAL:
+                self.save()
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self.save()
+
+    def finish(self, segment_ids=()):
+        """
+        Marks the episode as complete, unless the media of some of the given segments was not rendered, so the
+        next run processes the episode again and only renders the missing segments
+        """
+        with self.lock:
+            missing = [
+                segment_id
+                for segment_id in segment_ids
+                if str(segment_id) not in self.data["segments"]
+            ]
+            if missing:
+                logger.warning(
+                    f"Missing media for segments {missing}. The episode will be processed again on the next run"
+                )
+                if self.dirty:
+                    self.save()
+                return
+
+            self.data["complete"] = True
+            self.save()
+
+    def save(self):
+        tmp_filepath = f"{self.filepath}.tmp"
+        with open(tmp_filepath, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_filepath, self.filepath)
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+
+def segment_entry(segment):
+    return {
+        "start": segment.start,
+        "end": segment.end,
+        "files": [
+            segment.audio_filename,
+            segment.screenshot_filename,
+            segment.video_filename,
+        ],
+    }
+
+
+def episode_fingerprint(episode_plan, args, translated):
+    """
+    Fingerprint of everything used to generate the data.tsv of an episode: the video file, the content of the
+    external subtitles, the selected subtitle streams and the relevant arguments
+    """
+    return {
+        "video": file_fingerprint(episode_plan["episode_filepath"]),
+        "external_subtitles": {
+            language: hash_file(subtitle_filepath)
+            for language, subtitle_filepath in sorted(
+                episode_plan["external_subtitles"].items()
+            )
+        },
+        "subtitle_streams": episode_plan["subtitle_streams"],
+        "args": {name: getattr(args, name, None) for name in EPISODE_ARGS},
+        "translated": translated,
+    }
+
+
+def media_fingerprint(video_file, args):
+    return {
+        "video": file_fingerprint(video_file),
+        "args": {name: getattr(args, name, None) for name in MEDIA_ARGS},
+    }
+
+
+def file_fingerprint(filepath):
+    stat = os.stat(filepath)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def hash_file(filepath):
+    sha1 = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+
+    return sha1.hexdigest()
@@ -0,0 +1,465 @@
+import logging
+import os
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .audio import (
+    AUDIO_ENCODERS,
+    DEFAULT_AUDIO_OUTPUT,
+    audio_codec_options,
+    extract_audio,
+)
+from .frames import extract_screenshots
+from .metrics import NULL_METRICS
+
+logging.getLogger("moviepy").setLevel(logging.ERROR)
+
+logger = logging.getLogger(__name__)
+
+MEDIA_ENGINES = ["ffmpeg", "moviepy"]
+
+# Number of segments extracted by a single ffmpeg invocation. Every segment adds
+# two outputs (audio + webp) to the extraction call
+SEGMENT_BATCH_SIZE = 40
+
+# Every x264 encoder allocates ~100MB, so the mp4 of each segment is encoded by its
+# own short ffmpeg call, running a few of them at the same time
+MP4_WORKERS = min(4, os.cpu_count() or 1)
+
+SegmentMedia = namedtuple(
+    "SegmentMedia",
+    [
+        "segment_id",
+        "start",
+        "end",
+        "audio_filename",
+        "screenshot_filename",
+        "video_filename",
+    ],
+)
+
+MP4_ENCODING_OPTIONS = [
+    "-vf",
+    "scale=1280:720,setsar=1",
+    "-c:v",
+    "libx264",
+    "-tune",
+    "stillimage",
+    "-b:v",
+    "200k",
+    "-pix_fmt",
+    "yuv420p",
+    "-movflags",
+    "+faststart",
+]
+
+
+def create_renderer(
+    video_file,
+    args,
+    on_rendered=None,
+    metrics=NULL_METRICS,
+    tmp_folder=None,
+    audio_output=DEFAULT_AUDIO_OUTPUT,
+):
+    """
+    Returns the renderer in charge of generating the audio, screenshot and video of every segment, or None if no
+    media has to be generated (no video file or dry run). `on_rendered` is called with every segment whose media was
+    fully generated. Intermediate files, like the decoded audio, are written on `tmp_folder`
+    """
+    if not video_file or getattr(args, "dryrun", False):
+        return None
+
+    if getattr(args, "media_engine", "ffmpeg") == "moviepy":
+        return MoviepyRenderer(video_file, on_rendered, metrics, audio_output)
+
+    return FfmpegRenderer(
+        video_file,
+        screenshot_engine=getattr(args, "screenshot_engine", "batch"),
+        keyframe_screenshots=getattr(args, "keyframe_screenshots", False),
+        audio_engine=getattr(args, "audio_engine", "batch"),
+        audio_output=audio_output,
+        tmp_folder=tmp_folder,
+        on_rendered=on_rendered,
+        metrics=metrics,
+    )
+
+
+class MoviepyRenderer:
+    """
+    Generates the media of each segment as soon as it is requested: moviepy subclip for the audio, moviepy frame for
+    the screenshot and a separate ffmpeg call for the video. `requested` and the set returned by close hold the ids
+    of the segments that were asked for and the ones that got their audio and screenshot
+    """
+
+    def __init__(
+        self,
+        video_file,
+        on_rendered=None,
+        metrics=NULL_METRICS,
+        audio_output=DEFAULT_AUDIO_OUTPUT,
+    ):
+        with metrics.timer("video_open"):
+            # moviepy pulls numpy, imageio and IPython, only load it when it is used
+            import moviepy.editor as mp
+
+            self.video = mp.VideoFileClip(video_file)
+        self.on_rendered = on_rendered
+        self.metrics = metrics
+        self.audio_output = audio_output
+        self.requested = set()
+        self.extracted = set()
+
+    def render(self, segment, output_path):
+        logs = []
+        self.requested.add(segment.segment_id)
+
+        try:
+            subclip = self.video.subclip(segment.start, segment.end)
+            audio_path = os.path.join(output_path, segment.audio_filename)
+            with self.metrics.timer("audio_write"):
+                # moviepy always decodes the audio, so copied audio is encoded to the same codec
+                subclip.audio.write_audiofile(
+                    audio_path,
+                    codec=AUDIO_ENCODERS[self.audio_output.codec],
+                    logger=None,
+                )
+
+            logs.append(f"> Saved audio in {audio_path}")
+
+        except Exception:
+            logger.error(
+                f"Error creating audio '{segment.audio_filename}'", exc_info=True
+            )
+            return None
+
+        try:
+            screenshot_path = os.path.join(output_path, segment.screenshot_filename)
+
+            # Take a screenshot on the middle of the dialog
+            with self.metrics.timer("frame_save"):
+                self.video.save_frame(
+                    screenshot_path, t=(segment.start + segment.end) / 2
+                )
+
+            logs.append(f"> Saved screenshot in {screenshot_path}")
+
+        except Exception:
+            logger.error(
+                f"Error creating screenshot '{segment.screenshot_filename}'",
+                exc_info=True,
+            )
+            return None
+
+        self.extracted.add(segment.segment_id)
+        video_path = os.path.join(output_path, segment.video_filename)
+        try:
+            with self.metrics.timer("mp4_encode"):
+                returncode = subprocess.call(
+                    build_mp4_command([(segment, output_path)], self.audio_output),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                )
+            logs.append(f"> Saved video in {video_path}")
+
+        except Exception:
+            logger.error(f"Error creating video `{video_path}", exc_info=True)
+            return None
+
+        if returncode == 0 and self.on_rendered:
+            self.on_rendered(segment)
+
+        return logs
+
+    def close(self):
+        self.video.close()
+        return self.extracted
+
+
+class FfmpegRenderer:
+    """
+    Queues every segment of the episode and generates all the media on close. Audio and screenshots are extracted
+    with a few ffmpeg invocations that decode the episode once per batch of segments instead of once per segment.
+    With the single-pass screenshot engine or the pcm audio engine, all the screenshots or audios are generated
+    first from a single decode of the whole episode, and the batches only extract the rest. Copied audio is always
+    cut on the batches, since it is never decoded.
+
+    Since nothing is generated until close, close returns the ids of the segments whose audio and screenshot were
+    extracted, so the rows of the failed ones (in `requested`) can be left out
+    """
+
+    def __init__(
+        self,
+        video_file,
+        batch_size=SEGMENT_BATCH_SIZE,
+        screenshot_engine="batch",
+        keyframe_screenshots=False,
+        audio_engine="batch",
+        audio_output=DEFAULT_AUDIO_OUTPUT,
+        tmp_folder=None,
+        on_rendered=None,
+        metrics=NULL_METRICS,
+    ):
+        self.video_file = video_file
+        self.batch_size = batch_size
+        self.screenshot_engine = screenshot_engine
+        self.keyframe_screenshots = keyframe_screenshots
+        self.audio_engine = audio_engine
+        self.audio_output = audio_output
+        self.tmp_folder = tmp_folder
+        self.on_rendered = on_rendered
+        self.metrics = metrics
+        self.pending = []
+        self.requested = set()
+
+    def render(self, segment, output_path):
+        self.pending.append((segment, output_path))
+        self.requested.add(segment.segment_id)
+        return [f"> Queued media for segment {segment.segment_id}"]
+
+    def close(self):
+        pending, self.pending = self.pending, []
+        # Media left by a previous run must not count as extracted if ffmpeg fails
+        remove_media(pending)
+
+        screenshots = self.screenshot_engine == "batch"
+        if pending and not screenshots:
+            with self.metrics.timer("screenshot_extract"):
+                extract_screenshots(
+                    self.video_file,
+                    pending,
+                    keyframes=self.keyframe_screenshots,
+                    metrics=self.metrics,
+                )
+
+        audio = self.audio_engine == "batch" or self.audio_output.copy
+        if pending and not audio:
+            with self.metrics.timer("audio_extract"):
+                extract_audio(
+                    self.video_file,
+                    pending,
+                    tmp_folder=self.tmp_folder,
+                    metrics=self.metrics,
+                    audio_output=self.audio_output,
+                )
+
+        extracted_ids = set()
+        with ThreadPoolExecutor(max_workers=MP4_WORKERS) as executor:
+            for i in range(0, len(pending), self.batch_size):
+                with self.metrics.timer("media_extract"):
+                    extracted = extract_batch(
+                        self.video_file,
+                        pending[i : i + self.batch_size],
+                        screenshots,
+                        audio,
+                        self.audio_output,
+                    )
+                self.metrics.add("segments_extracted", len(extracted))
+                extracted_ids.update(segment.segment_id for segment, _ in extracted)
+
+                # Encode the videos of this batch while the next one is extracted
+                for segment, output_path in extracted:
+                    future = executor.submit(
+                        encode_mp4,
+                        segment,
+                        output_path,
+                        self.metrics,
+                        self.audio_output,
+                    )
+                    if self.on_rendered:
+                        future.add_done_callback(
+                            lambda f, segment=segment: f.result()
+                            and self.on_rendered(segment)
+                        )
+
+        return extracted_ids
+
+
+def remove_media(batch):
+    for segment, output_path in batch:
+        for filename in [segment.audio_filename, segment.screenshot_filename]:
+            filepath = os.path.join(output_path, filename)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+
+def extract_batch(
+    video_file,
+    batch,
+    screenshots=True,
+    audio=True,
+    audio_output=DEFAULT_AUDIO_OUTPUT,
+):
+    """
+    Extracts the audio and screenshot (unless they were already generated) of every segment in the batch and
+    returns the segments where both were generated
+    """
+    if screenshots or audio:
+        logger.info(
+            f"Extracting media for segments {batch[0][0].segment_id}..{batch[-1][0].segment_id}"
+        )
+
+        if not run_ffmpeg(
+            build_extract_command(video_file, batch, screenshots, audio, audio_output)
+        ):
+            logger.error(f"Error extracting audio and screenshots from '{video_file}'")
+
+    extracted = []
+    for segment, output_path in batch:
+        if os.path.exists(
+            os.path.join(output_path, segment.audio_filename)
+        ) and os.path.exists(os.path.join(output_path, segment.screenshot_filename)):
+            extracted.append((segment, output_path))
+        else:
+            logger.error(
+                f"Missing audio or screenshot for segment {segment.segment_id}"
+            )
+
+    return extracted
+
+
+def encode_mp4(
+    segment, output_path, metrics=NULL_METRICS, audio_output=DEFAULT_AUDIO_OUTPUT
+):
+    with metrics.timer("mp4_encode"):
+        encoded = run_ffmpeg(build_mp4_command([(segment, output_path)], audio_output))
+
+    if not encoded:
+        logger.error(
+            f"Error creating video `{os.path.join(output_path, segment.video_filename)}`"
+        )
+        return False
+
+    return True
+
+
+def build_extract_command(
+    video_file,
+    batch,
+    screenshots=True,
+    audio=True,
+    audio_output=DEFAULT_AUDIO_OUTPUT,
+):
+    """
+    Builds a single ffmpeg call that writes the audio and the screenshot of every segment in the batch. The input is
+    seeked to the start of the first segment and each output selects its own range, so the batch range is only
+    decoded once.
+
+    Screenshots are cut with a split/trim filter graph instead of output seeking, since output seeking would encode
+    every frame before the requested timestamp. Without screenshots only the audio is extracted, and the video isn't
+    decoded at all (and the other way around without audio). Copied audio is cut on the packets closest to the
+    range of the segment
+    """
+    batch_start = min(segment.start for segment, _ in batch)
+
+    command = [
+        "ffmpeg",
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-ss",
+        format_seconds(batch_start),
+        "-i",
+        video_file,
+    ]
+
+    if screenshots:
+        screenshot_filters = [
+            f"[0:v:0]split={len(batch)}" + "".join(f"[s{i}]" for i in range(len(batch)))
+        ]
+        for i, (segment, _) in enumerate(batch):
+            # Take a screenshot on the middle of the dialog
+            screenshot_time = format_seconds(
+                (segment.start + segment.end) / 2 - batch_start
+            )
+            screenshot_filters.append(
+                f"[s{i}]trim=start={screenshot_time},trim=end_frame=1[v{i}]"
+            )
+        command += ["-filter_complex", ";".join(screenshot_filters)]
+
+    for i, (segment, output_path) in enumerate(batch):
+        if audio:
+            command += [
+                "-map",
+                "0:a:0",
+                "-ss",
+                format_seconds(segment.start - batch_start),
+                "-to",
+                format_seconds(segment.end - batch_start),
+                "-vn",
+                *audio_codec_options(audio_output),
+                os.path.join(output_path, segment.audio_filename),
+            ]
+        if screenshots:
+            command += [
+                "-map",
+                f"[v{i}]",
+                "-frames:v",
+                "1",
+                "-c:v",
+                "libwebp",
+                "-f",
+                "image2",
+                "-update",
+                "1",
+                os.path.join(output_path, segment.screenshot_filename),
+            ]
+
+    return command
+
+
+def build_mp4_command(batch, audio_output=DEFAULT_AUDIO_OUTPUT):
+    """
+    Builds a single ffmpeg call that generates the still image video of every segment from its screenshot and audio.
+    Keep the batches small: each output holds its own x264 encoder. Encoded mp3 audio is encoded to aac, aac and opus
+    audio and any copied audio is muxed without encoding it again
+    """
+    inputs = []
+    outputs = []
+    for i, (segment, output_path) in enumerate(batch):
+        duration = format_seconds(segment.end - segment.start)
+        inputs += [
+            "-loop",
+            "1",
+            "-framerate",
+            "10",
+            "-t",
+            duration,
+            "-i",
+            os.path.join(output_path, segment.screenshot_filename),
+            "-i",
+            os.path.join(output_path, segment.audio_filename),
+        ]
+        outputs += (
+            ["-map", f"{2 * i}:v", "-map", f"{2 * i + 1}:a"]
+            + MP4_ENCODING_OPTIONS
+            + mp4_audio_options(segment.audio_filename, audio_output)
+            + ["-t", duration, os.path.join(output_path, segment.video_filename)]
+        )
+
+    return ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error"] + inputs + outputs
+
+
+def mp4_audio_options(audio_filename, audio_output=DEFAULT_AUDIO_OUTPUT):
+    if audio_filename.endswith(".mp3") and not audio_output.copy:
+        return []
+
+    # Opus on mp4 is still flagged as experimental by older ffmpeg versions
+    return ["-c:a", "copy", "-strict", "experimental"]
+
+
+def run_ffmpeg(command):
+    result = subprocess.run(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+    )
+    if result.returncode != 0:
+        logger.error(f"ffmpeg failed ({result.returncode}): {result.stderr[-2000:]}")
+        return False
+
+    return True
+
+
+def format_seconds(seconds):
+    return f"{max(seconds, 0):.3f}"
@@ -0,0 +1,272 @@
+import json
+import logging
+import os
+import string
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+ANILIST_CACHE_FILENAME = "anilist_cache.json"
+
+# Days before the cached information of an anime is fetched again from AniList
+ANILIST_CACHE_TTL_DAYS = 30
+
+AnimeTitle = namedtuple("AnimeTitle", ["romaji", "english", "native"])
+AnimeCover = namedtuple("AnimeCover", ["extra_large"])
+AnimeInfo = namedtuple(
+    "AnimeInfo", ["id", "title", "format", "status", "genres", "cover", "banner"]
+)
+
+
+class CachedAnilist:
+    """
+    AniList lookups cached in memory and, when `cache_filepath` is given, on a JSON file that is reused by later
+    runs. Entries older than `ttl_days` are refreshed from AniList, falling back to the stale entry if AniList can't
+    be reached.
+
+    The cache is also seeded with the info.json files found on `seed_folder`, so shows that were already processed
+    are found without going to the network
+    """
+
+    def __init__(
+        self,
+        cache_filepath=None,
+        ttl_days=ANILIST_CACHE_TTL_DAYS,
+        seed_folder=None,
+        client=None,
+    ):
+        if not client:
+            from anilist import Client
+
+            client = Client()
+
+        self.client = client
+        self.cache_filepath = cache_filepath
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.queries = {}
+        self.anime = {}
+
+        if seed_folder:
+            self.seed_from_info_jsons(seed_folder)
+
+        if cache_filepath and os.path.exists(cache_filepath):
+            with open(cache_filepath, encoding="utf-8") as f:
+                cache = json.load(f)
+            self.queries.update(cache["queries"])
+            self.anime.update(cache["anime"])
+
+    def get_anime(self, search_query):
+        cached_query = self.queries.get(normalize_title(search_query))
+        if cached_query and not self.is_stale(cached_query):
+            return self.get_anime_by_id(cached_query["id"])
+
+        try:
+            search_results = self.client.search(search_query)
+        except Exception:
+            if not cached_query:
+                raise
+            logger.warning(
+                f"Could not refresh AniList search '{search_query}'. Using cached result",
+                exc_info=True,
+            )
+            return self.get_anime_by_id(cached_query["id"])
+
+        logger.debug(f"Search results: {search_results}")
+
+        if not search_results:
+            raise Exception(
+                f"Anime with title {search_query} not found. Please check file name"
+            )
+
+        selected_index = 0
+        if len(search_results) > 1:
+            logger.info("Multiple animes found! Please select better match")
+            for i, result in enumerate(search_results):
+                try:
+                    english_title = result.title.english
+                except AttributeError:
+                    english_title = None
+                logger.info(f"[{i}]: {result.title.romaji} - {english_title}")
+
+            selected_index = input("> Please select a number:")
+
+        anime_id = search_results[int(selected_index)].id
+        self.queries[normalize_title(search_query)] = {
+            "id": anime_id,
+            "fetched_at": time.time(),
+        }
+        anime_info = self.get_anime_by_id(anime_id)
+        self.save()
+
+        return anime_info
+
+    def get_anime_many(self, search_queries):
+        """
+        Resolves several titles at once, searching each distinct title only once. Returns a dictionary from each
+        query to its anime
+        """
+        results = {}
+        for search_query in dict.fromkeys(search_queries):
+            try:
+                results[search_query] = self.get_anime(search_query)
+            except Exception:
+                logger.error(f"Could not find anime '{search_query}'", exc_info=True)
+
+        return results
+
+    def get_anime_by_id(self, anime_id):
+        cached_anime = self.anime.get(str(anime_id))
+        if cached_anime and not self.is_stale(cached_anime):
+            return anime_info_from_json(cached_anime["info"])
+
+        try:
+            anime_info = anime_info_from_client(self.client.get_anime(anime_id))
+        except Exception:
+            if not cached_anime:
+                raise
+            logger.warning(
+                f"Could not refresh anime {anime_id} from AniList. Using cached information",
+                exc_info=True,
+            )
+            return anime_info_from_json(cached_anime["info"])
+
+        self.anime[str(anime_id)] = {
+            "info": anime_info._asdict(),
+            "fetched_at": time.time(),
+        }
+        self.save()
+
+        return anime_info
+
+    def is_stale(self, cached_entry):
+        return time.time() - cached_entry["fetched_at"] > self.ttl
+
+    def seed_from_info_jsons(self, output_folder):
+        if not os.path.isdir(output_folder):
+            return
+
+        for folder_name in os.listdir(output_folder):
+            info_json_fullpath = os.path.join(output_folder, folder_name, "info.json")
+            if not os.path.isfile(info_json_fullpath):
+                continue
+
+            try:
+                with open(info_json_fullpath, encoding="utf-8") as f:
+                    info_json = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Could not read {info_json_fullpath}", exc_info=True)
+                continue
+
+            fetched_at = os.path.getmtime(info_json_fullpath)
+            anime_info = AnimeInfo(
+                id=info_json["id"],
+                title=AnimeTitle(
+                    romaji=info_json.get("romaji_name"),
+                    english=info_json.get("english_name"),
+                    native=info_json.get("japanese_name"),
+                ),
+                format=info_json.get("airing_format"),
+                status=info_json.get("airing_status"),
+                genres=info_json.get("genres"),
+                # The folder already has the images, they don't have to be downloaded again
+                cover=AnimeCover(extra_large=None),
+                banner=None,
+            )
+            self.anime[str(anime_info.id)] = {
+                "info": anime_info._asdict(),
+                "fetched_at": fetched_at,
+            }
+            for title in [folder_name, *anime_info.title]:
+                if title:
+                    self.queries[normalize_title(title)] = {
+                        "id": anime_info.id,
+                        "fetched_at": fetched_at,
+                    }
+
+    def save(self):
+        if not self.cache_filepath:
+            return
+
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.cache_filepath)), exist_ok=True
+        )
+        tmp_filepath = f"{self.cache_filepath}.tmp"
+        with open(tmp_filepath, "w", encoding="utf-8") as f:
+            json.dump(
+                {"queries": self.queries, "anime": self.anime},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_filepath, self.cache_filepath)
+
+
+class OfflineAnilistClient:
+    """
+    Local stand-in for the AniList client, searching over a fixed list of AnimeInfo. Used to run without network
+    access
+    """
+
+    def __init__(self, anime_list):
+        self.anime_list = anime_list
+        self.calls = []
+
+    def search(self, query):
+        self.calls.append(("search", query))
+        query = normalize_title(query)
+        return [
+            anime
+            for anime in self.anime_list
+            if any(query in normalize_title(title) for title in anime.title if title)
+        ]
+
+    def get_anime(self, anime_id):
+        self.calls.append(("get_anime", anime_id))
+        return next(anime for anime in self.anime_list if anime.id == anime_id)
+
+
+def normalize_title(title):
+    """
+    Lower case title without punctuation, used to match the same anime written in slightly different ways
+
+    Example:
+        * Input: Bocchi the Rock!
+        * Output: bocchi the rock
+    """
+    return " ".join(
+        title.lower()
+        .replace("-", " ")
+        .translate(str.maketrans("", "", string.punctuation))
+        .split()
+    )
+
+
+def anime_info_from_client(anime):
+    title = anime.title
+    cover = getattr(anime, "cover", None)
+    return AnimeInfo(
+        id=anime.id,
+        title=AnimeTitle(
+            romaji=getattr(title, "romaji", None),
+            english=getattr(title, "english", None),
+            native=getattr(title, "native", None),
+        ),
+        format=getattr(anime, "format", None),
+        status=getattr(anime, "status", None),
+        genres=getattr(anime, "genres", None),
+        cover=AnimeCover(extra_large=getattr(cover, "extra_large", None)),
+        banner=getattr(anime, "banner", None),
+    )
+
+
+def anime_info_from_json(info):
+    return AnimeInfo(
+        id=info["id"],
+        title=AnimeTitle(*info["title"]),
+        format=info["format"],
+        status=info["status"],
+        genres=info["genres"],
+        cover=AnimeCover(*info["cover"]),
+        banner=info["banner"],
+    )
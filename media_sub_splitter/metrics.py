@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+METRICS_FILENAME = "metrics.json"
+
+PROMETHEUS_PREFIX = "media_sub_splitter"
+
+
+def create_metrics(args):
+    """
+    Returns the metrics of an episode or run: a Metrics if they have to be saved, or NULL_METRICS otherwise
+    """
+    if getattr(args, "metrics", False) or getattr(args, "metrics_prometheus", None):
+        return Metrics()
+
+    return NULL_METRICS
+
+
+class Metrics:
+    """
+    Time spent and number of calls of every stage, plus free counters (rows written, translated characters...).
+    Stages can be timed from several threads at the same time
+    """
+
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds, calls=1):
+        with self.lock:
+            stage_seconds, stage_calls = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (stage_seconds + seconds, stage_calls + calls)
+
+    def add(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def update(self, metrics_dict):
+        """
+        Adds the metrics of another Metrics.as_dict(), used to sum the metrics of every episode of the run
+        """
+        for stage, values in metrics_dict["stages"].items():
+            self.record(stage, values["seconds"], values["calls"])
+        for counter, value in metrics_dict["counters"].items():
+            self.add(counter, value)
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "stages": {
+                    stage: {"seconds": seconds, "calls": calls}
+                    for stage, (seconds, calls) in sorted(self.stages.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def write_json(self, filepath):
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def write_prometheus(self, filepath):
+        """
+        Writes the metrics on the Prometheus text format, for example for the textfile collector of node_exporter
+        """
+        metrics_dict = self.as_dict()
+        lines = [
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_seconds_total counter",
+            *(
+                f'{PROMETHEUS_PREFIX}_stage_seconds_total{{stage="{stage}"}} {values["seconds"]}'
+                for stage, values in metrics_dict["stages"].items()
+            ),
+            f"# TYPE {PROMETHEUS_PREFIX}_stage_calls_total counter",
+            *(
+                f'{PROMETHEUS_PREFIX}_stage_calls_total{{stage="{stage}"}} {values["calls"]}'
+                for stage, values in metrics_dict["stages"].items()
+            ),
+        ]
+        for counter, value in metrics_dict["counters"].items():
+            lines += [
+                f"# TYPE {PROMETHEUS_PREFIX}_{counter}_total counter",
+                f"{PROMETHEUS_PREFIX}_{counter}_total {value}",
+            ]
+
+        tmp_filepath = f"{filepath}.tmp"
+        with open(tmp_filepath, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_filepath, filepath)
+
+
+class NullMetrics:
+    """
+    Metrics that record nothing, used when metrics are disabled so the instrumented code doesn't need any check
+    """
+
+    enabled = False
+
+    def timer(self, stage):
+        return NULL_TIMER
+
+    def record(self, stage, seconds, calls=1):
+        pass
+
+    def add(self, counter, value=1):
+        pass
+
+    def update(self, metrics_dict):
+        pass
+
+    def as_dict(self):
+        return None
+
+
+NULL_TIMER = nullcontext()
+
+NULL_METRICS = NullMetrics()
+
+
+class MeteredTranslator:
+    """
+    Wraps a translator to count the calls, sentences and characters sent to it and the time spent on them
+    """
+
+    def __init__(self, translator, metrics):
+        self.translator = translator
+        self.metrics = metrics
+
+    def translate_text(self, text, source_lang=None, target_lang=None):
+        texts = [text] if isinstance(text, str) else text
+        self.metrics.add("translation_calls")
+        self.metrics.add("translation_sentences", len(texts))
+        self.metrics.add("translation_chars", sum(map(len, texts)))
+        with self.metrics.timer("translation_call"):
+            return self.translator.translate_text(
+                text, source_lang=source_lang, target_lang=target_lang
+            )
@@ -0,0 +1,138 @@
+import re
+from functools import lru_cache
+
+import jaconvV2
+
+# Maximum number of distinct plaintext lines remembered. Recurring lines (OP/ED lyrics,
+# catchphrases...) are only normalized once
+NORMALIZED_SENTENCES_CACHE_SIZE = 65536
+
+EMOJI_PATTERN = (
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags (iOS)
+    "]+"
+)
+
+# Ass subtitles include an actor name that sometimes can be used to filter
+# non-dialog subtitles
+filtered_actor = re.compile(r"sign|[_\-\s]?ed|op[_\-\s]?")
+
+# *Top, sign... is usually used for background conversations with an ongoing
+# dialog
+filtered_style = re.compile(r"top|sign|tipo tv|block|alt|cart")
+
+# Sometimes .ass subtitles include the signs subs on the main dialog
+ass_position = re.compile(r"pos\(.*?\)|move\(.*?\)")
+
+new_lines = re.compile("\r?\n|\t")
+
+nested_parenthesis = re.compile(
+    r"\([^\(\)（）\[\]\{\}《》【】]*\)|\[[^\(\)（）\[\]\{\}《》【】]*\]"
+)
+
+# Special characters and emojis removed from the sentences, in a single pass. Single
+# characters go on a character class: str.translate is slower for non-ASCII text
+special_chars = re.compile(
+    rf"[⚟⚞<>=●→\u202a\u202c➡]|ー?♪ー?|&lrm;|{EMOJI_PATTERN}", re.UNICODE
+)
+
+# Sometimes japanese subs don't use the appropriate " symbol for quotes
+invalid_quotes = re.compile(r"``|''")
+
+# On certain cases it makes sense to not add a - since there is another symbol
+# Already indicating the end of the sentence
+redundant_symbols = re.compile(
+    "|".join(
+        [
+            r"(?<=\.\.\.)-",
+            r"(?<=\?)-",
+            r"(?<=!)-",
+            r"(?<=\.)-",
+            r"(?<=,)-",
+            r"(?<=ー)-",
+            r"(?<=-)-",
+            r"(?<=。)\s",
+            r"^-",
+            r"(?<=\s)+\s",
+            r"(?<=\.\.\.)。",
+        ]
+    )
+)
+
+
+def process_subtitle_line(line, args):
+    if line.type != "Dialogue":
+        return ""
+
+    if line.name and is_filtered_actor(line.name):
+        return ""
+
+    if line.style and is_filtered_style(line.style):
+        return ""
+
+    # Skip all lines that have pos() or move() ass method as it is not a real dialog line
+    if ass_position.search(line.text):
+        return ""
+
+    return normalize_sentence(
+        line.plaintext, bool(getattr(args, "extra_punctuation", False))
+    )
+
+
+@lru_cache(maxsize=1024)
+def is_filtered_actor(actor):
+    return bool(filtered_actor.search(actor.lower()))
+
+
+@lru_cache(maxsize=1024)
+def is_filtered_style(style):
+    return bool(filtered_style.search(style.lower()))
+
+
+@lru_cache(maxsize=NORMALIZED_SENTENCES_CACHE_SIZE)
+def normalize_sentence(sentence, extra_punctuation=False):
+    # Normaliza half-width (Hankaku) a full-width (Zenkaku) caracteres
+    sentence = jaconvV2.normalize(sentence, "NFKC")
+
+    # Replace all new lines / tabs / separators with just one space
+    sentence = new_lines.sub(" ", sentence)
+
+    if extra_punctuation:
+        sentence = sentence.replace("・", " ")
+
+    sentence = remove_nested_parenthesis(sentence)
+
+    sentence = special_chars.sub("", sentence)
+
+    return sentence.strip()
+
+
+def remove_nested_parenthesis(sentence):
+    nb_rep = 1
+    while nb_rep and ("(" in sentence or "[" in sentence):
+        (sentence, nb_rep) = nested_parenthesis.subn("", sentence)
+
+    return sentence
+
+
+def join_sentences_to_segment(sentences, ln):
+    join_symbol = "　" if ln == "ja" else " "
+    joined_sentence = join_symbol.join(map(lambda x: x.sentence.strip(), sentences))
+
+    joined_sentence = invalid_quotes.sub('"', joined_sentence)
+
+    actor_sentence = ",".join(
+        sorted(set(map(lambda x: x.actor.replace("\t", "").strip(), sentences)))
+    )
+
+    # Get all the ids that form the segment
+    subs_ids = list(map(lambda s: s.sub_id, sentences))
+
+    return (
+        redundant_symbols.sub("", joined_sentence),
+        actor_sentence,
+        subs_ids,
+    )
@@ -0,0 +1,112 @@
+import csv
+import json
+import os
+
+EXPORT_FORMATS = ["jsonl"]
+
+# Size of the write buffer of the output files
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+def read_rows(tsv_filepath):
+    """
+    Yields every row of a data.tsv as a dictionary, with the same dialect used to write it
+    """
+    with open(tsv_filepath, newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(
+            f, delimiter="\t", quoting=csv.QUOTE_NONE, escapechar="\\"
+        )
+
+
+class PendingRows:
+    """
+    Keeps the rows of an episode in memory, with the same writerow as SegmentRowWriter, until they can be written
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def writerow(self, row):
+        self.rows.append(row)
+
+
+class SegmentRowWriter:
+    """
+    Writes the rows of an episode on buffered temporary files that replace the final ones on close, so a failed
+    episode never leaves a partial TSV behind.
+
+    With `jsonl_filepath` the same rows are also exported as JSON Lines, one object per row
+    """
+
+    def __init__(self, tsv_filepath, fieldnames, jsonl_filepath=None):
+        self.filepaths = [
+            filepath for filepath in [tsv_filepath, jsonl_filepath] if filepath
+        ]
+        self.tsvfile = open(
+            f"{tsv_filepath}.tmp",
+            "w",
+            newline="",
+            encoding="utf-8",
+            buffering=WRITE_BUFFER_SIZE,
+        )
+        self.jsonlfile = (
+            open(
+                f"{jsonl_filepath}.tmp",
+                "w",
+                encoding="utf-8",
+                buffering=WRITE_BUFFER_SIZE,
+            )
+            if jsonl_filepath
+            else None
+        )
+        self.writer = csv.DictWriter(
+            self.tsvfile,
+            fieldnames=fieldnames,
+            delimiter="\t",
+            quoting=csv.QUOTE_NONE,
+            escapechar="\\",
+        )
+        self.writer.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        if self.jsonlfile:
+            self.jsonlfile.write(
+                json.dumps(row, ensure_ascii=False, default=str) + "\n"
+            )
+
+    def close_files(self):
+        for f in [self.tsvfile, self.jsonlfile]:
+            if f:
+                f.close()
+
+    def close(self):
+        try:
+            self.close_files()
+        except Exception:
+            self.remove_tmp_files()
+            raise
+
+        for filepath in self.filepaths:
+            os.replace(f"{filepath}.tmp", filepath)
+
+    def abort(self):
+        self.close_files()
+        self.remove_tmp_files()
+
+    def remove_tmp_files(self):
+        for filepath in self.filepaths:
+            if os.path.exists(f"{filepath}.tmp"):
+                os.remove(f"{filepath}.tmp")
@@ -0,0 +1,213 @@
+import argparse
+import concurrent.futures
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# process/thread: every episode runs whole on a pool of workers. async: every episode goes through a pipeline of
+# stages, so one episode can be translated while another one is extracted or rendered
+EXECUTORS = ["process", "thread", "async"]
+
+DEFAULT_WORKERS = min(6, os.cpu_count() or 1)
+
+# Episodes waiting between two stages of the pipeline
+PIPELINE_QUEUE_SIZE = 2
+
+# Stage of the episode pipeline. `fn` is a coroutine function, and at most `concurrency` episodes are on the stage
+PipelineStage = namedtuple("PipelineStage", ["name", "fn", "concurrency"])
+
+# Returned by a stage to finish the episode without going through the next stages
+Finished = namedtuple("Finished", ["result"])
+
+
+def positive_int(value):
+    """
+    argparse type of the worker and concurrency counts, which would hang or crash the pools with 0
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
+
+
+class EpisodeScheduler:
+    """
+    Runs episodes on a pool of workers, keeping at most `max_in_flight` episodes submitted at the same time so the
+    memory used by the queued subtitles stays capped. The result or the error of every episode is collected, so
+    failures are reported at the end of the run instead of being silently lost.
+
+    With `workers=0` the episodes run inline on submit, with the same error handling
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, executor="process", max_in_flight=None):
+        self.workers = workers
+        self.max_in_flight = max_in_flight or max(workers * 2, 1)
+        self.in_flight = {}
+        self.completed = []
+        self.failed = []
+
+        if not workers:
+            self.executor = None
+        elif executor == "process":
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def submit(self, name, fn, *args, **kwargs):
+        if not self.executor:
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as err:
+                self.record_failure(name, err)
+            else:
+                self.completed.append((name, result))
+            return
+
+        # Wait for some episode to finish before queuing more work
+        while len(self.in_flight) >= self.max_in_flight:
+            self.wait(concurrent.futures.FIRST_COMPLETED)
+
+        self.in_flight[self.executor.submit(fn, *args, **kwargs)] = name
+
+    def wait(self, return_when=concurrent.futures.ALL_COMPLETED):
+        done, _ = concurrent.futures.wait(self.in_flight, return_when=return_when)
+        for future in done:
+            name = self.in_flight.pop(future)
+            err = future.exception()
+            if err:
+                self.record_failure(name, err)
+            else:
+                self.completed.append((name, future.result()))
+
+    def record_failure(self, name, err):
+        logger.error(
+            f"Episode failed: {name}", exc_info=(type(err), err, err.__traceback__)
+        )
+        self.failed.append((name, err))
+
+    def close(self):
+        """
+        Waits for every submitted episode and logs a summary. Returns the list of (name, error) of the episodes
+        that failed
+        """
+        if self.executor:
+            self.wait()
+            self.executor.shutdown()
+
+        log_summary(self.completed, self.failed)
+        return self.failed
+
+
+class EpisodePipeline(EpisodeScheduler):
+    """
+    Runs episodes through a chain of asyncio stages connected by bounded queues, so the network, the disk and the
+    CPU are kept busy by different episodes at the same time. Each stage works on at most `concurrency` episodes,
+    and a full queue holds back the previous stage, so the episodes waiting between stages stay capped.
+
+    The first stage receives the arguments given to submit and every next stage the result of the previous one. The
+    result of the last stage (or the one wrapped on Finished) is the result of the episode
+
+    Example:
+        * pipeline = EpisodePipeline([PipelineStage("extract", extract, 2), PipelineStage("render", render, 1)])
+        * pipeline.submit("episode 1.mkv", episode_plan)
+        * failed = pipeline.close()
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE):
+        # A stage without workers would never take the episodes queued for it
+        for stage in stages:
+            if stage.concurrency < 1:
+                raise ValueError(
+                    f"Concurrency of the {stage.name} stage must be positive: {stage.concurrency}"
+                )
+
+        self.stages = stages
+        self.queue_size = queue_size
+        self.submitted = []
+        self.completed = []
+        self.failed = []
+
+    def submit(self, name, *args):
+        # Episodes start running on close, once every episode of the run is known
+        self.submitted.append((name, args))
+
+    def close(self):
+        """
+        Runs every submitted episode through the pipeline and logs a summary. Returns the list of (name, error) of
+        the episodes that failed
+        """
+        if self.submitted:
+            # asyncio takes a while to import and is only needed by the pipeline
+            import asyncio
+
+            asyncio.run(self.run(self.submitted))
+            self.submitted = []
+
+        log_summary(self.completed, self.failed)
+        return self.failed
+
+    async def run(self, episodes):
+        import asyncio
+
+        # Blocking work of the stages runs on threads, enough for every stage to be busy at the same time
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=sum(stage.concurrency for stage in self.stages)
+            )
+        )
+
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in self.stages]
+        stage_tasks = [
+            asyncio.create_task(self.run_stage(position, queues))
+            for position in range(len(self.stages))
+        ]
+
+        for episode in episodes:
+            await queues[0].put(episode)
+        for _ in range(self.stages[0].concurrency):
+            await queues[0].put(None)
+
+        await asyncio.gather(*stage_tasks)
+
+    async def run_stage(self, position, queues):
+        import asyncio
+
+        stage = self.stages[position]
+        is_last = position == len(self.stages) - 1
+
+        async def worker():
+            while (episode := await queues[position].get()) is not None:
+                name, value = episode
+                try:
+                    result = await (
+                        stage.fn(*value) if position == 0 else stage.fn(value)
+                    )
+                except Exception as err:
+                    self.record_failure(name, err)
+                    continue
+
+                if isinstance(result, Finished):
+                    self.completed.append((name, result.result))
+                elif is_last:
+                    self.completed.append((name, result))
+                else:
+                    await queues[position + 1].put((name, result))
+
+        await asyncio.gather(*(worker() for _ in range(stage.concurrency)))
+
+        # Every worker of the next stage stops once the episodes of this one are done
+        if not is_last:
+            for _ in range(self.stages[position + 1].concurrency):
+                await queues[position + 1].put(None)
+
+
+def log_summary(completed, failed):
+    logger.info(
+        f"Processed {len(completed) + len(failed)} episodes: "
+        f"{len(completed)} finished, {len(failed)} failed"
+    )
+    for name, err in failed:
+        logger.info(f"> Failed: {name} ({err})")
@@ -0,0 +1,277 @@
+import logging
+from collections import namedtuple
+
+from .normalize import process_subtitle_line
+
+logger = logging.getLogger(__name__)
+
+# Processed line of a subtitle file. Times are in milliseconds
+SubtitleLine = namedtuple(
+    "SubtitleLine", ["start", "end", "language", "sentence", "actor", "sub_id"]
+)
+
+# Segment of the episode, with the lines of each language as tuples of SubtitleLine. The japanese lines are never
+# empty, and the id of the segment is the id of its first japanese line. Times are in milliseconds
+PlannedSegment = namedtuple(
+    "PlannedSegment", ["segment_id", "start", "end", "ja", "es", "en"]
+)
+
+SEGMENT_LANGUAGES = ["ja", "es", "en"]
+
+# compat: greedy sweep over the lines sorted by start, growing the segment with every overlapping line (the
+# original grouping, the snapshots are generated with it)
+# overlap: the japanese lines define the segments, and every english or spanish line goes to the segment it
+# overlaps the most
+ALIGNERS = ["compat", "overlap"]
+
+# Lines that start less than this after the end of the segment start a new one, even if they overlap
+SEGMENT_MIN_GAP = 500
+
+
+def plan_segments(subtitles, args):
+    """
+    Splits the subtitles of an episode (as {language: MatchingSubtitle}) onto segments without generating anything,
+    so the segments can be counted, scheduled or rendered on separate stages. Returns a tuple of PlannedSegment
+    """
+    return group_segments(
+        merge_subtitle_lines(subtitles, args), getattr(args, "aligner", "compat")
+    )
+
+
+def merge_subtitle_lines(subtitles, args):
+    """
+    Merges the lines of all the subtitle files onto a single list sorted by start time, in one pass:
+      * Every line gets as `sub_id` its position on the sorted list, counting the lines that are later discarded
+      * Empty lines (after processing the sentence) are discarded
+      * Duplicated lines (same start, end, language and sentence) are discarded, keeping the first one
+    """
+    events = [
+        (language, line) for language, subs in subtitles.items() for line in subs.data
+    ]
+
+    # Stable sort, lines with the same start keep the order of the subtitle files
+    events.sort(key=lambda event: event[1].start)
+
+    merged_lines = []
+    duplicates_set = set()
+    for sub_id, (language, line) in enumerate(events):
+        sentence = process_subtitle_line(line, args)
+        if not sentence:
+            continue
+
+        line_hashkey = (line.start, line.end, language, sentence)
+        if line_hashkey in duplicates_set:
+            continue
+        duplicates_set.add(line_hashkey)
+
+        merged_lines.append(
+            SubtitleLine(
+                start=line.start,
+                end=line.end,
+                language=language,
+                sentence=sentence,
+                actor=line.name,
+                sub_id=sub_id,
+            )
+        )
+
+    return merged_lines
+
+
+def group_segments(sorted_lines, aligner="compat"):
+    """
+    Groups the merged lines onto segments of overlapping lines. Returns a tuple of PlannedSegment with the segments
+    that have japanese and english or spanish sentences
+    """
+    if not sorted_lines:
+        return ()
+
+    if aligner == "overlap":
+        return align_by_overlap(sorted_lines)
+
+    return align_by_sweep(sorted_lines)
+
+
+def align_by_sweep(sorted_lines):
+    """
+    Greedy sweep over the lines sorted by start. A line joins the current segment if it overlaps it and doesn't
+    start right at its end, growing the segment, and starts a new segment otherwise
+    """
+    segments = []
+    segment_start = sorted_lines[0].start - 1
+    segment_end = sorted_lines[0].end + 1
+    segment_sentences = {}
+    # Sentences of each language on the current segment
+    segment_sentence_sets = {}
+
+    for line in sorted_lines:
+        ln = line.language
+
+        # New line when:
+        #   * No overlap
+        #   * Overlap, but gap is smaller than 500
+        if (
+            not (segment_start < line.end and line.start < segment_end)
+            or abs(segment_end - line.start) < SEGMENT_MIN_GAP
+        ):
+            if "ja" in segment_sentences and (
+                "en" in segment_sentences or "es" in segment_sentences
+            ):
+                segments.append(
+                    planned_segment(segment_sentences, segment_start, segment_end)
+                )
+
+            elif segment_sentences:
+                log_ignored_lines(segment_sentences)
+
+            segment_sentences = {ln: [line]}
+            segment_sentence_sets = {ln: {line.sentence}}
+            segment_start = line.start
+            segment_end = line.end
+
+        else:
+            lines = segment_sentences.setdefault(ln, [])
+            sentences = segment_sentence_sets.setdefault(ln, set())
+
+            # Sometimes when two characters are speaking the same line is repeated several times. Detect that
+            # to avoid duplicating the same sentence
+            if not (
+                lines and lines[-1].end == line.start and line.sentence in sentences
+            ):
+                lines.append(line)
+                sentences.add(line.sentence)
+
+            segment_start = min(segment_start, line.start)
+            segment_end = max(segment_end, line.end)
+
+    return tuple(segments)
+
+
+def align_by_overlap(sorted_lines):
+    """
+    Builds the segments from the japanese lines, merging the ones that overlap each other, and assigns every english
+    and spanish line to the segment it overlaps the most. The segments are kept as sorted NumPy arrays of starts and
+    ends, so each line is placed with a binary search instead of walking the timeline. Lines that don't overlap
+    any japanese line are left out
+    """
+    import numpy as np
+
+    japanese_lines = [line for line in sorted_lines if line.language == "ja"]
+    if not japanese_lines:
+        return ()
+
+    starts = np.fromiter((line.start for line in japanese_lines), dtype=np.int64)
+    ends = np.fromiter((line.end for line in japanese_lines), dtype=np.int64)
+
+    # A japanese line opens a new segment if it starts after every previous line ended, unless it repeats the
+    # previous line right when it ends
+    previous_ends = np.maximum.accumulate(ends)
+    repeats_previous = np.fromiter(
+        (
+            previous.end == line.start and previous.sentence == line.sentence
+            for previous, line in zip(japanese_lines, japanese_lines[1:])
+        ),
+        dtype=bool,
+        count=len(japanese_lines) - 1,
+    )
+    opens_segment = np.empty(len(japanese_lines), dtype=bool)
+    opens_segment[0] = True
+    opens_segment[1:] = (starts[1:] >= previous_ends[:-1]) & ~repeats_previous
+    segment_of_line = np.cumsum(opens_segment) - 1
+    segment_starts = starts[opens_segment]
+    segment_ends = np.maximum.reduceat(ends, np.flatnonzero(opens_segment))
+
+    segment_lines = [{"ja": []} for _ in range(len(segment_starts))]
+    for line, segment_index in zip(japanese_lines, segment_of_line.tolist()):
+        segment_lines[segment_index]["ja"].append(line)
+
+    other_lines = [line for line in sorted_lines if line.language != "ja"]
+    if other_lines:
+        line_starts = np.fromiter((line.start for line in other_lines), dtype=np.int64)
+        line_ends = np.fromiter((line.end for line in other_lines), dtype=np.int64)
+
+        # Segments are disjoint and sorted, so the ones overlapping a line are a contiguous range
+        first = np.searchsorted(segment_ends, line_starts, side="right")
+        last = np.searchsorted(segment_starts, line_ends, side="left")
+
+        def overlap(segment_indices):
+            segment_indices = np.clip(segment_indices, 0, len(segment_starts) - 1)
+            return np.minimum(segment_ends[segment_indices], line_ends) - np.maximum(
+                segment_starts[segment_indices], line_starts
+            )
+
+        # Most lines overlap one or two segments, only the first and last ones can be partially overlapped
+        best = np.where(overlap(last - 1) > overlap(first), last - 1, first)
+        for i in np.flatnonzero(last - first > 2).tolist():
+            candidates = np.arange(first[i], last[i])
+            overlaps = np.minimum(segment_ends[candidates], line_ends[i]) - np.maximum(
+                segment_starts[candidates], line_starts[i]
+            )
+            best[i] = candidates[np.argmax(overlaps)]
+
+        for line, segment_index, overlapping in zip(
+            other_lines, best.tolist(), (last > first).tolist()
+        ):
+            if overlapping:
+                segment_lines[segment_index].setdefault(line.language, []).append(line)
+
+    segments = []
+    for segment_sentences in segment_lines:
+        if "en" not in segment_sentences and "es" not in segment_sentences:
+            log_ignored_lines(segment_sentences)
+            continue
+
+        segment_sentences = {
+            language: remove_repeated_lines(lines)
+            for language, lines in segment_sentences.items()
+        }
+        all_lines = [line for lines in segment_sentences.values() for line in lines]
+        segments.append(
+            planned_segment(
+                segment_sentences,
+                min(line.start for line in all_lines),
+                max(line.end for line in all_lines),
+            )
+        )
+
+    return tuple(segments)
+
+
+def remove_repeated_lines(lines):
+    """
+    Drops the lines that repeat a sentence already on the segment right when the previous line ends, which happens
+    when several characters say the same line
+    """
+    kept_lines = []
+    sentences = set()
+    for line in lines:
+        if (
+            kept_lines
+            and kept_lines[-1].end == line.start
+            and line.sentence in sentences
+        ):
+            continue
+        kept_lines.append(line)
+        sentences.add(line.sentence)
+
+    return kept_lines
+
+
+def log_ignored_lines(segment_sentences):
+    if logger.isEnabledFor(logging.DEBUG):
+        sub_ids = sorted(
+            line.sub_id for lines in segment_sentences.values() for line in lines
+        )
+        logger.debug(f"No en/es subtitle match for lines {sub_ids}. Ignoring...")
+
+
+def planned_segment(segment_sentences, segment_start, segment_end):
+    return PlannedSegment(
+        segment_id=segment_sentences["ja"][0].sub_id,
+        start=segment_start,
+        end=segment_end,
+        **{
+            language: tuple(segment_sentences.get(language, ()))
+            for language in SEGMENT_LANGUAGES
+        },
+    )
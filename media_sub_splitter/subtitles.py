@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import re
+from collections import namedtuple
+
+import pysubs2
+
+from .manifest import hash_file
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_LANGUAGES = ["en", "ja", "es"]
+
+SUBTITLE_EXTENSIONS = (".ass", ".srt")
+
+LANGUAGE_CACHE_FILENAME = "subtitle_languages.json"
+
+# sample: kana heuristic, then langdetect over a bounded sample of lines. full: langdetect over every line
+LANGUAGE_DETECTION_MODES = ["sample", "full"]
+
+# Lines of dialogue used to detect the language on the sample mode, spread over the whole file
+LANGUAGE_SAMPLE_LINES = 100
+
+# Share of kana among the letters of the sample to consider the subtitle japanese. Signs and songs of
+# translated subtitles sometimes keep a few lines in japanese
+JAPANESE_KANA_RATIO = 0.1
+
+KANA_REGEX = re.compile(r"[\u3040-\u30ff\uff66-\uff9f]")
+
+# External subtitle file found on an input folder
+SubtitleFile = namedtuple("SubtitleFile", ["filepath", "episode", "language"])
+
+
+class SubtitleIndex:
+    """
+    Index of the external subtitle files of the input folders, as (folder -> episode -> language -> file). Every
+    folder is listed once, guessit runs once per filename and every subtitle file is parsed at most once, no matter
+    how many episodes share the folder
+
+    Example:
+        * subtitle_index.find("Bocchi/Bocchi the Rock - 03.mkv", 3)
+        * Output: {"ja": "Bocchi/Bocchi the Rock - 03.ja.ass", "en": "Bocchi/Bocchi the Rock - 03.en.srt"}
+    """
+
+    def __init__(self, language_detection="sample", cache_filepath=None):
+        self.language_detection = language_detection
+        self.cache_filepath = cache_filepath
+        self.folders = {}
+        self.guessit_results = {}
+        self.events_count = {}
+        self.languages = {}
+
+        if cache_filepath and os.path.exists(cache_filepath):
+            with open(cache_filepath, encoding="utf-8") as f:
+                self.languages = json.load(f)
+
+    def find(self, episode_filepath, episode_number):
+        """
+        Returns the path of the best external subtitle file (the one with more lines) for each supported language
+        """
+        logger.info("> Finding matching subtitles...")
+        folder = os.path.dirname(os.path.abspath(episode_filepath))
+        if folder not in self.folders:
+            self.folders[folder] = self.scan(folder)
+
+        matching_subtitles = {}
+        for subtitle_file in self.folders[folder].get(int(episode_number), []):
+            logger.info(
+                f"> (E{subtitle_file.episode}) Found external subtitle: {subtitle_file.filepath}"
+            )
+            language = subtitle_file.language or self.detect_language(
+                subtitle_file.filepath
+            )
+            if not language:
+                logger.error(
+                    "Impossible to guess the language of the subtitle. Skipping..."
+                )
+                continue
+
+            if language not in SUPPORTED_LANGUAGES:
+                logger.info(
+                    f"Language {language} is currently not supported. Skipping..."
+                )
+                continue
+
+            if language in matching_subtitles and self.count_events(
+                subtitle_file.filepath
+            ) < self.count_events(matching_subtitles[language]):
+                logger.info(
+                    "Already found better matching subtitles for this language. Skipping..."
+                )
+                continue
+
+            logger.info(f">Found [{language}] subtitles: {subtitle_file.filepath}")
+            matching_subtitles[language] = subtitle_file.filepath
+
+        return matching_subtitles
+
+    def scan(self, folder):
+        """
+        Lists the subtitle files of the folder once, grouped by episode number
+        """
+        episodes = {}
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith(SUBTITLE_EXTENSIONS):
+                continue
+
+            subtitle_filepath = os.path.join(folder, filename)
+            episode, language = self.guess_subtitle_info(filename)
+            if episode is None:
+                logger.info(
+                    f"> Could not guess Episode number for subtitle: {subtitle_filepath}"
+                )
+                continue
+
+            episodes.setdefault(episode, []).append(
+                SubtitleFile(subtitle_filepath, episode, language)
+            )
+
+        logger.debug(f"Subtitle files of {folder}: {episodes}")
+        return episodes
+
+    def guess_subtitle_info(self, filename):
+        """
+        Returns the episode number and the language tag (None if the name doesn't have one) of a subtitle file
+        """
+        from guessit import guessit
+
+        subtitle_filename = re.sub(r"\[.*?\]|\(.*?\)", "", filename)
+        if subtitle_filename not in self.guessit_results:
+            self.guessit_results[subtitle_filename] = guessit(subtitle_filename)
+        guessed_subtitle_info = self.guessit_results[subtitle_filename]
+
+        episode = guessed_subtitle_info.get("episode")
+        if episode is None:
+            episode_matches = re.search(r"(?!S)(\D\d\d|\D\d)\D", subtitle_filename)
+            if episode_matches:
+                episode = int(episode_matches.group(1)[1:])
+
+        language = None
+        if "subtitle_language" in guessed_subtitle_info:
+            language = guessed_subtitle_info["subtitle_language"].alpha2
+
+        return episode, language
+
+    def load(self, subtitle_filepath):
+        subtitle_data = pysubs2.load(subtitle_filepath)
+        self.events_count[subtitle_filepath] = len(subtitle_data)
+        return subtitle_data
+
+    def count_events(self, subtitle_filepath):
+        if subtitle_filepath not in self.events_count:
+            self.load(subtitle_filepath)
+
+        return self.events_count[subtitle_filepath]
+
+    def detect_language(self, subtitle_filepath):
+        """
+        Detects the language of a subtitle without language tag. Results are cached by the hash of the file, so
+        the same file is only detected once even if it is renamed or moved
+        """
+        try:
+            cache_key = f"{self.language_detection}:{hash_file(subtitle_filepath)}"
+            if cache_key not in self.languages:
+                subtitle_data = self.load(subtitle_filepath)
+                if self.language_detection == "full":
+                    # Concatenate all the subtitle lines into a single string for better accuracy
+                    lines = [event.text for event in subtitle_data]
+                else:
+                    lines = sample_dialogue_lines(subtitle_data)
+                self.languages[cache_key] = detect_text_language(
+                    lines, use_heuristics=self.language_detection == "sample"
+                )
+
+            language = self.languages[cache_key]
+            logger.info(f"> External subtitle detected language: {language}")
+            return language
+        except Exception as e:
+            logger.error(f"Failed to detect language for subtitle: {e}")
+            return None
+
+    def save(self):
+        if not self.cache_filepath:
+            return
+
+        os.makedirs(
+            os.path.dirname(os.path.abspath(self.cache_filepath)), exist_ok=True
+        )
+        tmp_filepath = f"{self.cache_filepath}.tmp"
+        with open(tmp_filepath, "w", encoding="utf-8") as f:
+            json.dump(self.languages, f, indent=2)
+        os.replace(tmp_filepath, self.cache_filepath)
+
+
+def sample_dialogue_lines(subtitle_data, size=LANGUAGE_SAMPLE_LINES):
+    """
+    Returns up to size lines of dialogue, evenly spread over the subtitle so the opening song or the signs of a
+    single scene don't decide the language. Comments, drawings and formatting tags are left out
+    """
+    lines = [
+        event.plaintext.strip()
+        for event in subtitle_data
+        if not event.is_comment and not event.is_drawing
+    ]
+    lines = [line for line in lines if line]
+    if len(lines) <= size:
+        return lines
+
+    return [lines[i * len(lines) // size] for i in range(size)]
+
+
+def detect_text_language(lines, use_heuristics=True):
+    """
+    Returns the language of the lines. Japanese is told apart by its kana, without running langdetect. Otherwise
+    langdetect runs with a fixed seed, so the same file always gets the same language
+
+    Example:
+        * detect_text_language(["どうしたの？", "なんでもない"])
+        * Output: "ja"
+    """
+    text = " ".join(lines)
+    if use_heuristics:
+        letters = sum(1 for c in text if c.isalpha())
+        if letters and len(KANA_REGEX.findall(text)) / letters >= JAPANESE_KANA_RATIO:
+            return "ja"
+
+    from langdetect import DetectorFactory, detect
+
+    DetectorFactory.seed = 0
+    return detect(text)
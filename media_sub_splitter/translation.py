@@ -0,0 +1,212 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Language of the generated translations -> DeepL target language code
+TRANSLATION_TARGETS = {"es": "ES", "en": "EN-US"}
+
+# DeepL accepts up to 50 texts on each translate_text call
+TRANSLATION_BATCH_SIZE = 50
+
+# Maximum number of translations kept on the translation memory before evicting the
+# least recently used ones
+TRANSLATION_MEMORY_SIZE = 200000
+
+TRANSLATION_MEMORY_FILENAME = "translation_memory.sqlite3"
+
+TextResult = namedtuple("TextResult", ["text", "detected_source_lang"])
+
+
+def translate_sentences(translator, sentences_to_translate):
+    """
+    Translates japanese sentences to several languages at the same time.
+
+    Receives a dictionary with the sentences to translate for each language of TRANSLATION_TARGETS and returns,
+    for each language, a dictionary from the original sentence to its translation. Every distinct sentence is only
+    sent once, in batched calls, and all the languages are translated concurrently
+
+    Example:
+        * Input: {"es": ["こんにちは", "こんにちは"], "en": ["さようなら"]}
+        * Output: {"es": {"こんにちは": "Hola"}, "en": {"さようなら": "Goodbye"}}
+    """
+    with ThreadPoolExecutor(max_workers=len(TRANSLATION_TARGETS)) as executor:
+        futures = {
+            language: executor.submit(
+                translate_batch,
+                translator,
+                list(dict.fromkeys(sentences)),
+                TRANSLATION_TARGETS[language],
+            )
+            for language, sentences in sentences_to_translate.items()
+            if sentences
+        }
+
+    return {language: future.result() for language, future in futures.items()}
+
+
+def translate_batch(translator, sentences, target_lang):
+    translations = {}
+    for i in range(0, len(sentences), TRANSLATION_BATCH_SIZE):
+        batch = sentences[i : i + TRANSLATION_BATCH_SIZE]
+        results = translator.translate_text(
+            batch, source_lang="JA", target_lang=target_lang
+        )
+        translations.update(zip(batch, (result.text for result in results)))
+
+    logger.info(f"Translated {len(translations)} sentences to {target_lang}")
+    return translations
+
+
+class OfflineTranslator:
+    """
+    Local stand-in for deepl.Translator. Returns the original sentence tagged with the target language, so the
+    translation stage can run without network access or API quota
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def translate_text(self, text, source_lang=None, target_lang=None):
+        texts = [text] if isinstance(text, str) else list(text)
+        self.calls.append((target_lang, len(texts)))
+
+        results = [TextResult(f"[{target_lang}] {t}", source_lang) for t in texts]
+        return results[0] if isinstance(text, str) else results
+
+
+class TranslationMemory:
+    """
+    Persistent cache of translations stored on a SQLite database, keyed by (source sentence, target language).
+    When it holds more than `max_entries` translations, the least recently used ones are evicted
+    """
+
+    def __init__(self, filepath, max_entries=TRANSLATION_MEMORY_SIZE):
+        self.filepath = filepath
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def __getstate__(self):
+        # Connections can't be shared between processes, each one opens its own
+        state = self.__dict__.copy()
+        state["lock"] = None
+        state["connection"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def connect(self):
+        if not self.connection:
+            self.connection = sqlite3.connect(
+                self.filepath, timeout=30, check_same_thread=False
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " sentence TEXT NOT NULL,"
+                " target_lang TEXT NOT NULL,"
+                " translation TEXT NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (sentence, target_lang))"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)"
+            )
+            self.connection.commit()
+
+        return self.connection
+
+    def get_many(self, sentences, target_lang):
+        with self.lock:
+            connection = self.connect()
+            translations = {}
+            for sentence in sentences:
+                row = connection.execute(
+                    "SELECT translation FROM translations WHERE sentence = ? AND target_lang = ?",
+                    (sentence, target_lang),
+                ).fetchone()
+                if row:
+                    translations[sentence] = row[0]
+
+            connection.executemany(
+                "UPDATE translations SET last_used = ? WHERE sentence = ? AND target_lang = ?",
+                [(time.time(), sentence, target_lang) for sentence in translations],
+            )
+            connection.commit()
+
+            return translations
+
+    def put_many(self, translations, target_lang):
+        with self.lock:
+            connection = self.connect()
+            connection.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                [
+                    (sentence, target_lang, translation, time.time())
+                    for sentence, translation in translations.items()
+                ],
+            )
+
+            size = connection.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+            if size > self.max_entries:
+                connection.execute(
+                    "DELETE FROM translations WHERE rowid IN "
+                    "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                    (size - self.max_entries,),
+                )
+            connection.commit()
+
+    def prune(self):
+        with self.lock:
+            connection = self.connect()
+            connection.execute("DELETE FROM translations")
+            connection.commit()
+
+
+class CachedTranslator:
+    """
+    Wraps a translator so every translate_text call first looks up the translation memory, and only the sentences
+    that are not there are sent to the translator. The hits and misses are counted on the instance, so every
+    episode counts its own even when it runs on another process
+    """
+
+    def __init__(self, translator, memory):
+        self.translator = translator
+        self.memory = memory
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def translate_text(self, text, source_lang=None, target_lang=None):
+        texts = [text] if isinstance(text, str) else list(text)
+
+        translations = self.memory.get_many(texts, target_lang)
+        with self.lock:
+            self.hits += len(translations)
+            self.misses += len(texts) - len(translations)
+        missing = [t for t in dict.fromkeys(texts) if t not in translations]
+        if missing:
+            results = self.translator.translate_text(
+                missing, source_lang=source_lang, target_lang=target_lang
+            )
+            new_translations = dict(zip(missing, (result.text for result in results)))
+            self.memory.put_many(new_translations, target_lang)
+            translations.update(new_translations)
+
+        results = [TextResult(translations[t], source_lang) for t in texts]
+        return results[0] if isinstance(text, str) else results
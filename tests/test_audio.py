@@ -0,0 +1,59 @@
+import os
+import wave
+
+from media_sub_splitter.audio import AudioOutput, audio_output, read_wav_header
+from media_sub_splitter.media import build_extract_command, build_mp4_command
+
+from .test_media import sample_batch
+
+
+def test_read_wav_header(tmp_path):
+    wav_filepath = os.path.join(tmp_path, "audio.wav")
+    with wave.open(wav_filepath, "wb") as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(44100)
+        f.writeframes(b"\x01\x00\x02\x00" * 100)
+
+    channels, sample_rate, data_offset, data_size = read_wav_header(wav_filepath)
+    assert (channels, sample_rate, data_size) == (2, 44100, 400)
+    with open(wav_filepath, "rb") as f:
+        f.seek(data_offset)
+        assert f.read(4) == b"\x01\x00\x02\x00"
+
+
+def test_extract_command_without_audio_only_takes_screenshots():
+    command = build_extract_command("episode.mkv", sample_batch(), audio=False)
+
+    assert "0:a:0" not in command
+    assert not [arg for arg in command if arg.endswith(".mp3")]
+    assert len([arg for arg in command if arg.endswith(".webp")]) == 3
+
+
+def test_copy_falls_back_to_aac_for_codecs_the_mp4_cant_hold():
+    assert audio_output("copy", "aac") == AudioOutput("aac", copy=True)
+    assert audio_output("copy", "flac") == AudioOutput("aac", copy=False)
+    assert audio_output("copy", None) == AudioOutput("aac", copy=False)
+    assert audio_output("opus", "aac") == AudioOutput("opus", copy=False)
+
+
+def test_copied_audio_is_cut_without_encoding_and_muxed_as_is():
+    batch = [
+        (segment._replace(audio_filename=f"{segment.segment_id}.m4a"), output_path)
+        for segment, output_path in sample_batch()
+    ]
+    command = build_extract_command(
+        "episode.mkv", batch, screenshots=False, audio_output=AudioOutput("aac", True)
+    )
+
+    assert "libmp3lame" not in command
+    assert command.count("copy") == 3
+    assert len([arg for arg in command if arg.endswith(".m4a")]) == 3
+
+    mp4_command = build_mp4_command(batch[:1])
+    assert mp4_command[mp4_command.index("-c:a") + 1] == "copy"
+    # mp3 audio is still encoded to aac for the mp4
+    assert "-c:a" not in build_mp4_command(sample_batch()[:1])
+    # unless it was copied from the episode
+    mp4_command = build_mp4_command(sample_batch()[:1], AudioOutput("mp3", True))
+    assert mp4_command[mp4_command.index("-c:a") + 1] == "copy"
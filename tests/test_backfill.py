@@ -0,0 +1,65 @@
+import os
+import shutil
+from datetime import timedelta
+
+import pytest
+
+from media_sub_splitter.backfill import (
+    backfill,
+    command_args,
+    find_segments,
+    parse_timedelta,
+)
+
+
+def test_parse_timedelta():
+    assert parse_timedelta("0:00:27.500000") == timedelta(seconds=27.5)
+    assert parse_timedelta(str(timedelta(hours=1, seconds=3))) == timedelta(
+        hours=1, seconds=3
+    )
+
+
+def create_episode_folder(tmp_path):
+    episode_folder = os.path.join(tmp_path, "show", "S01", "E01")
+    os.makedirs(episode_folder)
+    shutil.copy(
+        "tests/snapshots/adachi-to-shimamura-S01E01.snapshot.tsv",
+        os.path.join(episode_folder, "data.tsv"),
+    )
+    return episode_folder
+
+
+def test_find_segments_reads_durations_from_tsv(tmp_path):
+    episode_folder = create_episode_folder(tmp_path)
+
+    episode_folder_found, segment = next(find_segments(tmp_path))
+
+    assert episode_folder_found == episode_folder
+    assert segment.segment_id == 6
+    assert (segment.start, segment.end) == (27.5, 33.7)
+    assert segment.video_filename == "6.mp4"
+
+
+def test_backfill_skips_up_to_date_clips(tmp_path, monkeypatch):
+    episode_folder = create_episode_folder(tmp_path)
+    segments = [segment for _, segment in find_segments(tmp_path)]
+    for segment in segments[:3]:
+        for filename in [segment.audio_filename, segment.screenshot_filename]:
+            open(os.path.join(episode_folder, filename), "w").close()
+    open(os.path.join(episode_folder, segments[0].video_filename), "w").close()
+
+    encoded = []
+    monkeypatch.setattr(
+        "media_sub_splitter.backfill.encode_mp4",
+        lambda segment, output_path: encoded.append(segment.segment_id) or True,
+    )
+
+    failed = backfill(tmp_path, workers=2)
+
+    assert sorted(encoded) == sorted(s.segment_id for s in segments[1:3])
+    assert len(failed) == len(segments) - 3
+
+
+def test_backfill_rejects_zero_workers():
+    with pytest.raises(SystemExit):
+        command_args(["output", "--workers", "0"])
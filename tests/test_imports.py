@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+from benchmarks.bench_import_time import LAZY_DEPENDENCIES, MODULE
+
+
+def test_main_does_not_import_heavy_dependencies():
+    # Fresh interpreter, the tests themselves already import some of them
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {MODULE}; print(' '.join(sys.modules))"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = set(result.stdout.split())
+
+    assert "moviepy" not in imported
+    assert [
+        dependency for dependency in LAZY_DEPENDENCIES if dependency in imported
+    ] == []
@@ -0,0 +1,92 @@
+import glob
+import json
+import os
+import shutil
+import sqlite3
+from argparse import Namespace
+
+from media_sub_splitter.index import OutputIndex
+from media_sub_splitter.main import process_episode
+from media_sub_splitter.manifest import MANIFEST_FILENAME
+from media_sub_splitter.rows import read_rows
+from media_sub_splitter.translation import OfflineTranslator
+
+SNAPSHOT_TSV = "tests/snapshots/adachi-to-shimamura-S01E01.snapshot.tsv"
+
+
+def create_output_folder(tmp_path):
+    anime_folder = os.path.join(tmp_path, "adachi-to-shimamura")
+    episode_folder = os.path.join(anime_folder, "S01", "E01")
+    os.makedirs(episode_folder)
+    shutil.copy(SNAPSHOT_TSV, os.path.join(episode_folder, "data.tsv"))
+    with open(os.path.join(anime_folder, "info.json"), "w") as f:
+        json.dump({"id": 117193, "romaji_name": "Adachi to Shimamura"}, f)
+
+    return anime_folder, episode_folder
+
+
+def test_update_episode_replaces_its_segments(tmp_path):
+    anime_folder, episode_folder = create_output_folder(tmp_path)
+    rows = list(read_rows(SNAPSHOT_TSV))
+
+    index = OutputIndex(os.path.join(tmp_path, "index.sqlite3"))
+    for _ in range(2):
+        index.update_episode(
+            anime_folder, 1, 1, os.path.join(episode_folder, "data.tsv")
+        )
+
+    assert index.connection.execute("SELECT COUNT(*) FROM segments").fetchone() == (
+        len(rows),
+    )
+    assert index.connection.execute("SELECT COUNT(*) FROM segments_fts").fetchone() == (
+        len(rows),
+    )
+    assert index.connection.execute(
+        "SELECT anilist_id FROM shows WHERE show = 'adachi-to-shimamura'"
+    ).fetchone() == (117193,)
+
+
+def test_search_by_sentence_and_translation(tmp_path):
+    create_output_folder(tmp_path)
+    row = next(read_rows(SNAPSHOT_TSV))
+
+    index = OutputIndex(os.path.join(tmp_path, "index.sqlite3"))
+    index.rebuild(tmp_path)
+
+    results = index.search(row["CONTENT"][:4])
+    assert (results[0].show, results[0].season, results[0].episode) == (
+        "adachi-to-shimamura",
+        1,
+        1,
+    )
+    assert int(row["ID"]) in [result.segment_id for result in results]
+
+    results = index.search(row["CONTENT_TRANSLATION_ENGLISH"].split()[0][:2])
+    assert results
+
+
+def test_index_errors_do_not_fail_the_episode(tmp_path, monkeypatch):
+    def failing_index(filepath):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr("media_sub_splitter.main.OutputIndex", failing_index)
+    video_filepath = os.path.join(tmp_path, "episode.mkv")
+    open(video_filepath, "w").close()
+    episode_plan = {
+        "episode_filepath": video_filepath,
+        "season": 1,
+        "episode": 1,
+        "external_subtitles": {
+            "ja": "tests/input/bocchi-the-rock/bocchi-the-rock S01E01.ja.srt",
+        },
+        "subtitle_streams": [],
+    }
+    args = Namespace(dryrun=True, resume=True, index=True, output=str(tmp_path))
+
+    process_episode(episode_plan, str(tmp_path), OfflineTranslator(), args)
+
+    [manifest_filepath] = glob.glob(
+        os.path.join(tmp_path, "**", MANIFEST_FILENAME), recursive=True
+    )
+    with open(manifest_filepath) as f:
+        assert json.load(f)["complete"]
@@ -0,0 +1,146 @@
+import os
+from argparse import Namespace
+
+from media_sub_splitter.main import split_video_by_subtitles
+from media_sub_splitter.manifest import EpisodeManifest, episode_fingerprint
+from media_sub_splitter.media import SegmentMedia
+
+from .conftest import read_input_subtitles
+
+SEGMENT = SegmentMedia(
+    segment_id=3,
+    start=1.0,
+    end=2.5,
+    audio_filename="3.mp3",
+    screenshot_filename="3.webp",
+    video_filename="3.mp4",
+)
+
+
+def touch_media(output_path, segment):
+    for filename in [
+        segment.audio_filename,
+        segment.screenshot_filename,
+        segment.video_filename,
+    ]:
+        open(os.path.join(output_path, filename), "w").close()
+
+
+def test_episode_is_complete_only_with_same_fingerprint(tmp_path):
+    video_filepath = os.path.join(tmp_path, "episode.mkv")
+    open(video_filepath, "w").close()
+    episode_plan = {
+        "episode_filepath": video_filepath,
+        "external_subtitles": {},
+        "subtitle_streams": [],
+    }
+    fingerprint = episode_fingerprint(episode_plan, Namespace(), translated=False)
+
+    manifest = EpisodeManifest(os.path.join(tmp_path, "manifest.json"))
+    manifest.start(fingerprint, {})
+    assert not manifest.is_complete(fingerprint)
+    manifest.finish()
+
+    manifest = EpisodeManifest(os.path.join(tmp_path, "manifest.json"))
+    assert manifest.is_complete(fingerprint)
+    assert not manifest.is_complete(
+        episode_fingerprint(episode_plan, Namespace(), translated=True)
+    )
+    assert not manifest.is_complete(
+        episode_fingerprint(episode_plan, Namespace(export=["jsonl"]), translated=False)
+    )
+
+
+def test_segment_is_rendered_until_media_changes(tmp_path):
+    manifest = EpisodeManifest(os.path.join(tmp_path, "manifest.json"))
+    manifest.start({}, {"video": 1})
+    touch_media(tmp_path, SEGMENT)
+    manifest.mark_rendered(SEGMENT)
+
+    # Rendered segments are only saved on flush
+    assert not EpisodeManifest(manifest.filepath).is_rendered(SEGMENT, tmp_path)
+    manifest.flush()
+
+    manifest = EpisodeManifest(os.path.join(tmp_path, "manifest.json"))
+    assert manifest.is_rendered(SEGMENT, tmp_path)
+    assert not manifest.is_rendered(SEGMENT._replace(end=3.0), tmp_path)
+
+    os.remove(os.path.join(tmp_path, SEGMENT.video_filename))
+    assert not manifest.is_rendered(SEGMENT, tmp_path)
+
+    touch_media(tmp_path, SEGMENT)
+    manifest.start({}, {"video": 2})
+    assert not manifest.is_rendered(SEGMENT, tmp_path)
+
+
+class RecordingRenderer:
+    def __init__(self, on_rendered):
+        self.on_rendered = on_rendered
+        self.rendered = []
+        self.requested = set()
+
+    def render(self, segment, output_path):
+        touch_media(output_path, segment)
+        self.rendered.append(segment.segment_id)
+        self.requested.add(segment.segment_id)
+        self.on_rendered(segment)
+        return []
+
+    def close(self):
+        return set(self.rendered)
+
+
+def test_split_video_only_renders_missing_segments(tmp_path, monkeypatch):
+    renderers = []
+
+    def create_renderer(
+        video_file,
+        args,
+        on_rendered=None,
+        metrics=None,
+        tmp_folder=None,
+        audio_output=None,
+    ):
+        renderers.append(RecordingRenderer(on_rendered))
+        return renderers[-1]
+
+    monkeypatch.setattr("media_sub_splitter.main.create_renderer", create_renderer)
+
+    matching_subtitles = next(read_input_subtitles("tests/input/bocchi-the-rock"))
+    manifest_filepath = os.path.join(tmp_path, "manifest.json")
+    for _ in range(2):
+        manifest = EpisodeManifest(manifest_filepath)
+        manifest.start({}, {})
+        split_video_by_subtitles(
+            None,
+            "episode.mkv",
+            matching_subtitles,
+            str(tmp_path),
+            Namespace(),
+            manifest=manifest,
+        )
+
+        if len(renderers) == 1:
+            first_segment = renderers[0].rendered[0]
+            os.remove(os.path.join(tmp_path, f"{first_segment}.mp4"))
+
+    assert len(renderers[0].rendered) > 1
+    assert renderers[1].rendered == [first_segment]
+
+
+def test_episode_with_missing_media_is_not_complete(tmp_path):
+    manifest = EpisodeManifest(os.path.join(tmp_path, "manifest.json"))
+    manifest.start({}, {})
+    touch_media(tmp_path, SEGMENT)
+    manifest.mark_rendered(SEGMENT)
+
+    # A segment whose media failed keeps the episode incomplete
+    manifest.finish([SEGMENT.segment_id, 4])
+    assert not manifest.is_complete({})
+    assert EpisodeManifest(manifest.filepath).is_rendered(SEGMENT, tmp_path)
+
+    manifest.finish([SEGMENT.segment_id])
+    assert manifest.is_complete({})
+
+    os.remove(os.path.join(tmp_path, SEGMENT.video_filename))
+    assert not EpisodeManifest(manifest.filepath).is_complete({})
@@ -0,0 +1,128 @@
+import os
+from argparse import Namespace
+
+from media_sub_splitter.frames import build_screenshots_command
+from media_sub_splitter.main import split_video_by_subtitles
+from media_sub_splitter.media import (
+    FfmpegRenderer,
+    SegmentMedia,
+    build_extract_command,
+    build_mp4_command,
+)
+from media_sub_splitter.rows import read_rows
+
+from .conftest import read_input_subtitles
+
+
+def sample_batch():
+    return [
+        (
+            SegmentMedia(
+                i, 10 + i * 5, 12 + i * 5, f"{i}.mp3", f"{i}.webp", f"{i}.mp4"
+            ),
+            "out",
+        )
+        for i in range(3)
+    ]
+
+
+def test_extract_command_decodes_input_once():
+    command = build_extract_command("episode.mkv", sample_batch())
+
+    assert command.count("-i") == 1
+    assert command[command.index("-ss") + 1] == "10.000"
+    assert [arg for arg in command if arg.endswith(".mp3")] == [
+        "out/0.mp3",
+        "out/1.mp3",
+        "out/2.mp3",
+    ]
+    assert [arg for arg in command if arg.endswith(".webp")] == [
+        "out/0.webp",
+        "out/1.webp",
+        "out/2.webp",
+    ]
+
+    # Screenshots are taken on the middle of each segment, relative to the batch start
+    filter_graph = command[command.index("-filter_complex") + 1]
+    assert "split=3" in filter_graph
+    assert "trim=start=1.000" in filter_graph
+    assert "trim=start=11.000" in filter_graph
+
+
+def test_mp4_command_maps_screenshot_and_audio_of_each_segment():
+    command = build_mp4_command(sample_batch()[:2])
+
+    assert command.count("-i") == 4
+    assert command[-1] == "out/1.mp4"
+    assert ["-map", "2:v", "-map", "3:a"] == command[
+        command.index("2:v") - 1 : command.index("2:v") + 3
+    ]
+
+
+def test_extract_command_without_screenshots_skips_video():
+    command = build_extract_command("episode.mkv", sample_batch(), screenshots=False)
+
+    assert "-filter_complex" not in command
+    assert not [arg for arg in command if arg.endswith(".webp")]
+    assert len([arg for arg in command if arg.endswith(".mp3")]) == 3
+
+
+def test_screenshots_command_selects_every_time_in_one_decode():
+    command = build_screenshots_command("episode.mkv", [11.0, 16.0, 11.0])
+
+    assert command.count("-i") == 1
+    assert "-ss" not in command
+    video_filter = command[command.index("-vf") + 1]
+    assert video_filter.count("lte(11.000,t)") == 1
+    assert video_filter.count("lte(16.000,t)") == 1
+    assert video_filter.endswith(",showinfo")
+
+    command = build_screenshots_command("episode.mkv", [11.0], keyframes=True)
+    assert command[command.index("-skip_frame") + 1] == "nokey"
+    assert command[command.index("-vf") + 1] == "showinfo"
+
+
+class PartialRenderer:
+    """
+    Queues every segment and only extracts the media of the first half on close
+    """
+
+    def __init__(self):
+        self.requested = set()
+
+    def render(self, segment, output_path):
+        self.requested.add(segment.segment_id)
+        return []
+
+    def close(self):
+        return set(sorted(self.requested)[: len(self.requested) // 2])
+
+
+def test_rows_of_segments_without_media_are_left_out(tmp_path, monkeypatch):
+    renderer = PartialRenderer()
+    monkeypatch.setattr(
+        "media_sub_splitter.main.create_renderer", lambda *args, **kwargs: renderer
+    )
+
+    split_video_by_subtitles(
+        None,
+        "episode.mkv",
+        next(read_input_subtitles("tests/input/bocchi-the-rock")),
+        str(tmp_path),
+        Namespace(),
+    )
+
+    row_ids = {int(row["ID"]) for row in read_rows(os.path.join(tmp_path, "data.tsv"))}
+    assert renderer.requested
+    assert row_ids == renderer.close()
+
+
+def test_media_of_a_previous_run_is_not_extracted(tmp_path, monkeypatch):
+    monkeypatch.setattr("media_sub_splitter.media.run_ffmpeg", lambda command: False)
+    renderer = FfmpegRenderer("episode.mkv")
+    for segment, _ in sample_batch():
+        for filename in [segment.audio_filename, segment.screenshot_filename]:
+            open(os.path.join(tmp_path, filename), "w").close()
+        renderer.render(segment, str(tmp_path))
+
+    assert renderer.close() == set()
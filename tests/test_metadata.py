@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+from media_sub_splitter.metadata import (
+    AnimeCover,
+    AnimeInfo,
+    AnimeTitle,
+    CachedAnilist,
+    OfflineAnilistClient,
+    normalize_title,
+)
+
+BOCCHI = AnimeInfo(
+    id=130003,
+    title=AnimeTitle(
+        romaji="Bocchi the Rock!", english="BOCCHI THE ROCK!", native="ぼっち・ざ・ろっく！"
+    ),
+    format="TV",
+    status="FINISHED",
+    genres=["Comedy", "Music"],
+    cover=AnimeCover(extra_large="https://example.com/cover.jpg"),
+    banner="https://example.com/banner.jpg",
+)
+
+
+def test_normalize_title():
+    assert normalize_title("Bocchi the Rock!") == "bocchi the rock"
+    assert normalize_title("bocchi-the-rock") == "bocchi the rock"
+
+
+def test_get_anime_many_searches_each_title_once(tmp_path):
+    client = OfflineAnilistClient([BOCCHI])
+    anilist = CachedAnilist(client=client)
+
+    animes = anilist.get_anime_many(["Bocchi the Rock", "Bocchi the Rock"])
+
+    assert animes["Bocchi the Rock"] == BOCCHI
+    assert client.calls == [("search", "Bocchi the Rock"), ("get_anime", 130003)]
+
+
+def test_cache_is_reused_between_runs(tmp_path):
+    cache_filepath = os.path.join(tmp_path, "anilist_cache.json")
+    CachedAnilist(cache_filepath, client=OfflineAnilistClient([BOCCHI])).get_anime(
+        "Bocchi the Rock"
+    )
+
+    client = OfflineAnilistClient([BOCCHI])
+    anime = CachedAnilist(cache_filepath, client=client).get_anime("bocchi the rock!")
+
+    assert anime == BOCCHI
+    assert client.calls == []
+
+
+def test_stale_entries_are_refreshed(tmp_path):
+    cache_filepath = os.path.join(tmp_path, "anilist_cache.json")
+    CachedAnilist(cache_filepath, client=OfflineAnilistClient([BOCCHI])).get_anime(
+        "Bocchi the Rock"
+    )
+
+    client = OfflineAnilistClient([BOCCHI])
+    anilist = CachedAnilist(cache_filepath, ttl_days=0, client=client)
+    time.sleep(0.01)
+    anilist.get_anime("Bocchi the Rock")
+
+    assert client.calls == [("search", "Bocchi the Rock"), ("get_anime", 130003)]
+
+
+def test_stale_entries_are_used_when_anilist_fails(tmp_path):
+    cache_filepath = os.path.join(tmp_path, "anilist_cache.json")
+    CachedAnilist(cache_filepath, client=OfflineAnilistClient([BOCCHI])).get_anime(
+        "Bocchi the Rock"
+    )
+
+    class FailingClient:
+        def search(self, query):
+            raise ConnectionError()
+
+        def get_anime(self, anime_id):
+            raise ConnectionError()
+
+    anilist = CachedAnilist(cache_filepath, ttl_days=0, client=FailingClient())
+
+    assert anilist.get_anime("Bocchi the Rock") == BOCCHI
+
+
+def test_cache_is_seeded_from_info_json(tmp_path):
+    os.makedirs(os.path.join(tmp_path, "bocchi-the-rock"))
+    with open(os.path.join(tmp_path, "bocchi-the-rock", "info.json"), "w") as f:
+        json.dump(
+            {
+                "id": 130003,
+                "japanese_name": "ぼっち・ざ・ろっく！",
+                "english_name": "BOCCHI THE ROCK!",
+                "romaji_name": "Bocchi the Rock!",
+                "airing_format": "TV",
+                "airing_status": "FINISHED",
+                "genres": ["Comedy", "Music"],
+            },
+            f,
+        )
+
+    client = OfflineAnilistClient([])
+    anime = CachedAnilist(seed_folder=tmp_path, client=client).get_anime(
+        "Bocchi the Rock"
+    )
+
+    assert anime.id == 130003
+    assert anime.title.native == "ぼっち・ざ・ろっく！"
+    assert client.calls == []
@@ -0,0 +1,79 @@
+import os
+from argparse import Namespace
+
+from media_sub_splitter.main import split_video_by_subtitles
+from media_sub_splitter.metrics import (
+    NULL_METRICS,
+    MeteredTranslator,
+    Metrics,
+    create_metrics,
+)
+from media_sub_splitter.translation import OfflineTranslator
+
+from .conftest import read_input_subtitles
+
+
+def test_metrics_are_only_created_when_enabled():
+    assert create_metrics(Namespace()) is NULL_METRICS
+    assert create_metrics(Namespace(metrics=True)).enabled
+
+    with NULL_METRICS.timer("stage"):
+        NULL_METRICS.add("counter")
+    assert NULL_METRICS.as_dict() is None
+
+
+def test_metrics_sum_episodes():
+    run_metrics = Metrics()
+    for _ in range(2):
+        metrics = Metrics()
+        with metrics.timer("merge"):
+            pass
+        metrics.add("rows_written", 3)
+        run_metrics.update(metrics.as_dict())
+
+    metrics_dict = run_metrics.as_dict()
+    assert metrics_dict["stages"]["merge"]["calls"] == 2
+    assert metrics_dict["counters"] == {"rows_written": 6}
+
+
+def test_prometheus_text_format(tmp_path):
+    metrics = Metrics()
+    metrics.record("translation", 1.5)
+    metrics.add("translation_chars", 10)
+
+    filepath = os.path.join(tmp_path, "metrics.prom")
+    metrics.write_prometheus(filepath)
+
+    with open(filepath) as f:
+        lines = f.read().splitlines()
+    assert 'media_sub_splitter_stage_seconds_total{stage="translation"} 1.5' in lines
+    assert 'media_sub_splitter_stage_calls_total{stage="translation"} 1' in lines
+    assert "media_sub_splitter_translation_chars_total 10" in lines
+
+
+def test_split_video_records_stages_and_translations(tmp_path):
+    # Last episode has no spanish subtitles
+    matching_subtitles = list(
+        read_input_subtitles("tests/input/kidou-senshi-gundam-suisei-no-majo")
+    )[-1]
+    metrics = Metrics()
+    translator = MeteredTranslator(OfflineTranslator(), metrics)
+
+    split_video_by_subtitles(
+        translator,
+        None,
+        matching_subtitles,
+        str(tmp_path),
+        Namespace(),
+        metrics=metrics,
+    )
+
+    metrics_dict = metrics.as_dict()
+    assert {"merge", "group", "translation", "rows"} <= set(metrics_dict["stages"])
+    assert (
+        metrics_dict["counters"]["rows_written"] == metrics_dict["counters"]["segments"]
+    )
+    assert metrics_dict["counters"]["translation_calls"] == len(
+        translator.translator.calls
+    )
+    assert metrics_dict["counters"]["translation_chars"] > 0
@@ -0,0 +1,92 @@
+import json
+import os
+from argparse import Namespace
+from datetime import timedelta
+
+import pytest
+
+from media_sub_splitter.main import split_video_by_subtitles
+from media_sub_splitter.rows import SegmentRowWriter
+
+from .conftest import read_input_subtitles
+
+FIELDNAMES = ["ID", "START_TIME", "CONTENT", "CONTENT_SPANISH_MT"]
+
+
+def test_rows_are_written_on_close(tmp_path):
+    tsv_filepath = os.path.join(tmp_path, "data.tsv")
+    jsonl_filepath = os.path.join(tmp_path, "data.jsonl")
+
+    with SegmentRowWriter(tsv_filepath, FIELDNAMES, jsonl_filepath) as writer:
+        writer.writerow(
+            {
+                "ID": 6,
+                "START_TIME": timedelta(seconds=27.5),
+                "CONTENT": "こんにちは",
+                "CONTENT_SPANISH_MT": True,
+            }
+        )
+        assert not os.path.exists(tsv_filepath)
+
+    with open(tsv_filepath, encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            "ID\tSTART_TIME\tCONTENT\tCONTENT_SPANISH_MT",
+            "6\t0:00:27.500000\tこんにちは\tTrue",
+        ]
+
+    with open(jsonl_filepath, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [
+            {
+                "ID": 6,
+                "START_TIME": "0:00:27.500000",
+                "CONTENT": "こんにちは",
+                "CONTENT_SPANISH_MT": True,
+            }
+        ]
+
+
+def test_failed_episode_keeps_previous_tsv(tmp_path):
+    tsv_filepath = os.path.join(tmp_path, "data.tsv")
+    with open(tsv_filepath, "w") as f:
+        f.write("previous")
+
+    with pytest.raises(ValueError):
+        with SegmentRowWriter(tsv_filepath, FIELDNAMES) as writer:
+            writer.writerow({"ID": 1})
+            raise ValueError()
+
+    with open(tsv_filepath) as f:
+        assert f.read() == "previous"
+    assert os.listdir(tmp_path) == ["data.tsv"]
+
+
+def test_failed_media_keeps_previous_tsv(tmp_path, monkeypatch):
+    class FailingRenderer:
+        requested = set()
+
+        def render(self, segment, output_path):
+            return []
+
+        def close(self):
+            raise RuntimeError("ffmpeg failed")
+
+    monkeypatch.setattr(
+        "media_sub_splitter.main.create_renderer",
+        lambda *args, **kwargs: FailingRenderer(),
+    )
+    tsv_filepath = os.path.join(tmp_path, "data.tsv")
+    with open(tsv_filepath, "w") as f:
+        f.write("previous")
+
+    with pytest.raises(RuntimeError):
+        split_video_by_subtitles(
+            None,
+            "episode.mkv",
+            next(read_input_subtitles("tests/input/bocchi-the-rock")),
+            str(tmp_path),
+            Namespace(),
+        )
+
+    with open(tsv_filepath) as f:
+        assert f.read() == "previous"
+    assert os.listdir(tmp_path) == ["data.tsv"]
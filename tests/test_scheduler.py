@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from media_sub_splitter.scheduler import (
+    EpisodePipeline,
+    EpisodeScheduler,
+    Finished,
+    PipelineStage,
+)
+
+
+def square(value):
+    if value < 0:
+        raise ValueError(f"Invalid value {value}")
+    return value * value
+
+
+@pytest.mark.parametrize("executor", ["process", "thread"])
+def test_scheduler_collects_results_and_failures(executor):
+    scheduler = EpisodeScheduler(workers=2, executor=executor)
+    for value in [1, -1, 3]:
+        scheduler.submit(f"episode {value}", square, value)
+
+    failed = scheduler.close()
+
+    assert sorted(scheduler.completed) == [("episode 1", 1), ("episode 3", 9)]
+    assert [name for name, _ in failed] == ["episode -1"]
+    assert isinstance(failed[0][1], ValueError)
+
+
+def test_scheduler_runs_inline_without_workers():
+    scheduler = EpisodeScheduler(workers=0)
+    scheduler.submit("episode 2", square, 2)
+    scheduler.submit("episode -2", square, -2)
+
+    assert scheduler.completed == [("episode 2", 4)]
+    assert [name for name, _ in scheduler.close()] == ["episode -2"]
+
+
+def test_scheduler_bounds_episodes_in_flight():
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def episode():
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+
+    scheduler = EpisodeScheduler(workers=4, executor="thread", max_in_flight=2)
+    for i in range(10):
+        scheduler.submit(f"episode {i}", episode)
+        assert len(scheduler.in_flight) <= 2
+
+    scheduler.close()
+    assert max_running <= 2
+    assert len(scheduler.completed) == 10
+
+
+def test_pipeline_runs_episodes_through_every_stage():
+    async def double(value):
+        if value < 0:
+            raise ValueError(f"Invalid value {value}")
+        if value == 0:
+            return Finished("skipped")
+        return value * 2
+
+    async def increment(value):
+        await asyncio.sleep(0.001)
+        return value + 1
+
+    pipeline = EpisodePipeline(
+        [PipelineStage("double", double, 2), PipelineStage("increment", increment, 1)]
+    )
+    for value in [1, -1, 0, 3]:
+        pipeline.submit(f"episode {value}", value)
+
+    failed = pipeline.close()
+
+    assert sorted(pipeline.completed) == [
+        ("episode 0", "skipped"),
+        ("episode 1", 3),
+        ("episode 3", 7),
+    ]
+    assert [name for name, _ in failed] == ["episode -1"]
+    assert isinstance(failed[0][1], ValueError)
+
+
+def test_pipeline_bounds_episodes_on_each_stage():
+    running = {"extract": 0, "render": 0}
+    max_running = {"extract": 0, "render": 0}
+
+    def stage(name):
+        async def run(value):
+            running[name] += 1
+            max_running[name] = max(max_running[name], running[name])
+            await asyncio.sleep(0.005)
+            running[name] -= 1
+            return value
+
+        return run
+
+    pipeline = EpisodePipeline(
+        [
+            PipelineStage("extract", stage("extract"), 3),
+            PipelineStage("render", stage("render"), 1),
+        ],
+        queue_size=1,
+    )
+    for i in range(10):
+        pipeline.submit(f"episode {i}", i)
+    pipeline.close()
+
+    assert max_running == {"extract": 3, "render": 1}
+    assert sorted(result for _, result in pipeline.completed) == list(range(10))
+
+
+def test_pipeline_rejects_stages_without_workers():
+    async def stage(value):
+        return value
+
+    with pytest.raises(ValueError):
+        EpisodePipeline([PipelineStage("extract", stage, 0)])
@@ -0,0 +1,72 @@
+from argparse import Namespace
+
+from media_sub_splitter.rows import read_rows
+from media_sub_splitter.segments import (
+    ALIGNERS,
+    PlannedSegment,
+    SubtitleLine,
+    group_segments,
+    merge_subtitle_lines,
+    plan_segments,
+)
+
+from .conftest import read_input_subtitles
+
+
+def test_plan_segments_matches_snapshot_rows():
+    matching_subtitles = next(read_input_subtitles("tests/input/adachi-to-shimamura"))
+
+    segments = plan_segments(matching_subtitles, Namespace(extra_punctuation=True))
+
+    assert isinstance(segments, tuple)
+    rows = list(read_rows("tests/snapshots/adachi-to-shimamura-S01E01.snapshot.tsv"))
+    assert [str(segment.segment_id) for segment in segments] == [
+        row["ID"] for row in rows
+    ]
+    for segment, row in zip(segments, rows):
+        assert isinstance(segment, PlannedSegment)
+        assert ",".join(str(line.sub_id) for line in segment.ja) == row["SUBS_JP_IDS"]
+        assert ",".join(str(line.sub_id) for line in segment.es) == row["SUBS_ES_IDS"]
+        assert ",".join(str(line.sub_id) for line in segment.en) == row["SUBS_EN_IDS"]
+        assert segment.es or segment.en
+
+
+def test_plan_segments_without_lines():
+    assert plan_segments({}, Namespace()) == ()
+
+
+def test_overlap_aligner_assigns_lines_to_most_overlapped_segment():
+    matching_subtitles = next(read_input_subtitles("tests/input/bocchi-the-rock"))
+    sorted_lines = merge_subtitle_lines(matching_subtitles, Namespace())
+
+    segments = group_segments(sorted_lines, "overlap")
+
+    japanese_ids = [line.sub_id for segment in segments for line in segment.ja]
+    assert japanese_ids == sorted(japanese_ids)
+
+    def overlap(segment, line):
+        return max(
+            min(ja.end, line.end) - max(ja.start, line.start) for ja in segment.ja
+        )
+
+    for segment in segments:
+        for line in segment.en + segment.es:
+            assert overlap(segment, line) > 0
+            assert overlap(segment, line) == max(
+                overlap(other, line) for other in segments
+            )
+
+
+def test_repeated_lines_are_dropped():
+    lines = [
+        SubtitleLine(0, 1000, "ja", "待って!", "", 0),
+        SubtitleLine(0, 2500, "en", "Wait!", "", 1),
+        SubtitleLine(1000, 2000, "ja", "待って!", "", 2),
+        # The compat aligner never saves the last segment
+        SubtitleLine(5000, 6000, "ja", "行くぞ!", "", 3),
+    ]
+
+    for aligner in ALIGNERS:
+        segment = group_segments(lines, aligner)[0]
+        assert [line.sub_id for line in segment.ja] == [0]
+        assert [line.sub_id for line in segment.en] == [1]
@@ -0,0 +1,149 @@
+import os
+import shutil
+
+import pysubs2
+
+from media_sub_splitter import subtitles
+from media_sub_splitter.subtitles import (
+    SubtitleIndex,
+    detect_text_language,
+    sample_dialogue_lines,
+)
+
+INPUT_FOLDER = "tests/input/adachi-to-shimamura"
+
+
+def copy_episodes(tmp_path, episodes, languages=("en", "es", "ja")):
+    for filename in sorted(os.listdir(INPUT_FOLDER)):
+        episode, language = filename.split(".")[0][-2:], filename.split(".")[1]
+        if int(episode) in episodes and language in languages:
+            shutil.copy(os.path.join(INPUT_FOLDER, filename), tmp_path)
+
+
+def test_find_external_subtitles_of_every_episode(tmp_path):
+    copy_episodes(tmp_path, [1, 2])
+    subtitle_index = SubtitleIndex()
+
+    for episode in [1, 2]:
+        episode_filepath = os.path.join(
+            tmp_path, f"adachi-to-shimamura-S01E{episode:02d}.mkv"
+        )
+        matching_subtitles = subtitle_index.find(episode_filepath, episode)
+        assert {
+            language: os.path.basename(filepath)
+            for language, filepath in matching_subtitles.items()
+        } == {
+            "en": f"adachi-to-shimamura-S01E{episode:02d}.en.ass",
+            "es": f"adachi-to-shimamura-S01E{episode:02d}.es.ass",
+            "ja": f"adachi-to-shimamura-S01E{episode:02d}.ja.srt",
+        }
+
+
+def test_folder_is_scanned_once(tmp_path, monkeypatch):
+    copy_episodes(tmp_path, [1, 2, 3])
+    subtitle_index = SubtitleIndex()
+
+    listed_folders = []
+    listdir = os.listdir
+    monkeypatch.setattr(
+        subtitles.os,
+        "listdir",
+        lambda folder: listed_folders.append(folder) or listdir(folder),
+    )
+    for episode in [1, 2, 3]:
+        subtitle_index.find(os.path.join(tmp_path, f"E{episode:02d}.mkv"), episode)
+
+    assert len(listed_folders) == 1
+    assert len(subtitle_index.guessit_results) == 9
+
+
+def test_subtitles_are_parsed_at_most_once(tmp_path, monkeypatch):
+    copy_episodes(tmp_path, [1], languages=["en"])
+    # Two english subtitles without language tag for the same episode
+    shutil.copy(
+        os.path.join(tmp_path, "adachi-to-shimamura-S01E01.en.ass"),
+        os.path.join(tmp_path, "adachi-to-shimamura-S01E01.ass"),
+    )
+    shutil.move(
+        os.path.join(tmp_path, "adachi-to-shimamura-S01E01.en.ass"),
+        os.path.join(tmp_path, "adachi-to-shimamura-S01E01.full.ass"),
+    )
+
+    loaded_filepaths = []
+    load = pysubs2.load
+    monkeypatch.setattr(
+        subtitles.pysubs2,
+        "load",
+        lambda filepath: loaded_filepaths.append(filepath) or load(filepath),
+    )
+    subtitle_index = SubtitleIndex()
+    matching_subtitles = subtitle_index.find(
+        os.path.join(tmp_path, "adachi-to-shimamura-S01E01.mkv"), 1
+    )
+
+    assert list(matching_subtitles) == ["en"]
+    assert sorted(loaded_filepaths) == sorted(set(loaded_filepaths))
+    assert len(loaded_filepaths) == 2
+
+
+def remove_language_tags(tmp_path):
+    for filename in os.listdir(tmp_path):
+        name, language, extension = filename.split(".")
+        os.rename(
+            os.path.join(tmp_path, filename),
+            os.path.join(tmp_path, f"{name}.{extension}"),
+        )
+
+
+def test_detect_language_of_untagged_subtitles(tmp_path):
+    copy_episodes(tmp_path, [1], languages=["ja", "es"])
+    remove_language_tags(tmp_path)
+
+    subtitle_index = SubtitleIndex()
+    matching_subtitles = subtitle_index.find(
+        os.path.join(tmp_path, "adachi-to-shimamura-S01E01.mkv"), 1
+    )
+
+    assert sorted(matching_subtitles) == ["es", "ja"]
+    assert matching_subtitles["ja"].endswith(".srt")
+
+
+def test_detected_languages_are_cached_by_file_hash(tmp_path, monkeypatch):
+    input_folder = os.path.join(tmp_path, "input")
+    os.makedirs(input_folder)
+    copy_episodes(input_folder, [1], languages=["es"])
+    remove_language_tags(input_folder)
+    cache_filepath = os.path.join(tmp_path, "subtitle_languages.json")
+
+    subtitle_index = SubtitleIndex(cache_filepath=cache_filepath)
+    episode_filepath = os.path.join(input_folder, "adachi-to-shimamura-S01E01.mkv")
+    assert subtitle_index.find(episode_filepath, 1).keys() == {"es"}
+    subtitle_index.save()
+
+    # Renamed file with the same content isn't detected again
+    os.rename(
+        os.path.join(input_folder, "adachi-to-shimamura-S01E01.ass"),
+        os.path.join(input_folder, "adachi-to-shimamura-S01E01.default.ass"),
+    )
+    monkeypatch.setattr(
+        subtitles, "detect_text_language", lambda *args, **kwargs: 1 / 0
+    )
+    assert SubtitleIndex(cache_filepath=cache_filepath).find(
+        episode_filepath, 1
+    ).keys() == {"es"}
+
+
+def test_language_detection_is_deterministic():
+    lines = ["Hola, ¿qué tal?", "Bien, gracias", "Nos vemos mañana"]
+    assert len({detect_text_language(lines) for _ in range(10)}) == 1
+    assert detect_text_language(["{\\an8}私は大丈夫だよ", "Opening"]) == "ja"
+
+
+def test_sample_dialogue_lines_is_bounded():
+    subtitle_data = pysubs2.SSAFile()
+    for i in range(1000):
+        subtitle_data.append(pysubs2.SSAEvent(start=i, end=i + 1, text=f"Line {i}"))
+    subtitle_data.append(pysubs2.SSAEvent(type="Comment", text="Comment"))
+
+    lines = sample_dialogue_lines(subtitle_data, size=10)
+    assert lines == [f"Line {i}" for i in range(0, 1000, 100)]
@@ -0,0 +1,113 @@
+import csv
+import os
+from argparse import Namespace
+
+from media_sub_splitter.main import process_episode, split_video_by_subtitles
+from media_sub_splitter.scheduler import EpisodeScheduler
+from media_sub_splitter.translation import (
+    CachedTranslator,
+    TranslationMemory,
+    TRANSLATION_BATCH_SIZE,
+    OfflineTranslator,
+    translate_sentences,
+)
+
+from .conftest import read_input_subtitles
+
+
+def test_translate_sentences_deduplicates_and_batches():
+    translator = OfflineTranslator()
+    sentences = [f"文{i}" for i in range(TRANSLATION_BATCH_SIZE + 1)]
+
+    translations = translate_sentences(
+        translator, {"es": sentences + sentences, "en": ["文0"]}
+    )
+
+    assert translations["es"]["文3"] == "[ES] 文3"
+    assert translations["en"] == {"文0": "[EN-US] 文0"}
+    assert sorted(translator.calls) == [
+        ("EN-US", 1),
+        ("ES", 1),
+        ("ES", TRANSLATION_BATCH_SIZE),
+    ]
+
+
+def test_split_video_fills_missing_translations(tmp_path):
+    tmp_output_folder = str(tmp_path)
+    tmp_tsv_filename = "translation.input.tsv"
+
+    # Episode without spanish subtitles
+    matching_subtitles = list(
+        read_input_subtitles("tests/input/kidou-senshi-gundam-suisei-no-majo")
+    )[-1]
+    assert "es" not in matching_subtitles
+
+    translator = OfflineTranslator()
+    split_video_by_subtitles(
+        translator=translator,
+        video_file=None,
+        subtitles=matching_subtitles,
+        episode_folder_output_path=tmp_output_folder,
+        args=Namespace(),
+        output_tsv_name=tmp_tsv_filename,
+    )
+
+    with open(os.path.join(tmp_output_folder, tmp_tsv_filename)) as tsvfile:
+        rows = list(csv.DictReader(tsvfile, delimiter="\t", quoting=csv.QUOTE_NONE))
+
+    assert rows
+    assert all(row["CONTENT_SPANISH_MT"] == "True" for row in rows)
+    assert all(
+        row["CONTENT_TRANSLATION_SPANISH"] == f"[ES] {row['CONTENT']}" for row in rows
+    )
+    assert all(target == "ES" for target, _ in translator.calls)
+    assert len(translator.calls) <= len(rows) // TRANSLATION_BATCH_SIZE + 1
+
+
+def test_cached_translator_only_translates_misses(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"), max_entries=2)
+    translator = OfflineTranslator()
+    cached_translator = CachedTranslator(translator, memory)
+
+    results = cached_translator.translate_text(["一", "二"], "JA", "ES")
+    assert [result.text for result in results] == ["[ES] 一", "[ES] 二"]
+
+    # Reopen the memory to check the translations were persisted
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"), max_entries=2)
+    cached_translator = CachedTranslator(translator, memory)
+    assert cached_translator.translate_text("一", "JA", "ES").text == "[ES] 一"
+    assert cached_translator.translate_text("三", "JA", "ES").text == "[ES] 三"
+
+    assert translator.calls == [("ES", 2), ("ES", 1)]
+    assert (cached_translator.hits, cached_translator.misses) == (1, 1)
+
+    # Least recently used translation was evicted
+    assert memory.get_many(["一", "二", "三"], "ES") == {"一": "[ES] 一", "三": "[ES] 三"}
+
+
+def test_translation_memory_hits_are_counted_on_worker_processes(tmp_path):
+    memory = TranslationMemory(str(tmp_path / "memory.sqlite3"))
+    translator = CachedTranslator(OfflineTranslator(), memory)
+    episode_plan = {
+        "episode_filepath": "episode.mkv",
+        "season": 1,
+        "episode": 1,
+        "external_subtitles": {
+            "ja": "tests/input/bocchi-the-rock/bocchi-the-rock S01E01.ja.srt",
+            "en": "tests/input/bocchi-the-rock/bocchi-the-rock S01E01.en.ass",
+        },
+        "subtitle_streams": [],
+    }
+    args = Namespace(dryrun=True, resume=False, index=False, output=str(tmp_path))
+
+    for _ in range(2):
+        scheduler = EpisodeScheduler(workers=1, executor="process")
+        scheduler.submit(
+            "episode", process_episode, episode_plan, str(tmp_path), translator, args
+        )
+        scheduler.close()
+
+    # The first run fills the memory and the second one only hits it
+    [(_, result)] = scheduler.completed
+    assert result.translation_memory_hits > 0
+    assert result.translation_memory_misses == 0